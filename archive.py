@@ -0,0 +1,120 @@
+"""
+Archive tier for FarmConnect jobs
+
+Jobs that are no longer open are moved out of the live collections after a
+while (see BaseDataStore.archive_jobs) together with their matches. They are
+kept in gzip-compressed partitions, one per month of the job's creation date
+(data/archive/jobs-2024-06.json.gz), plus a small index.json that maps job IDs
+and farmer phones to partitions so a lookup only opens the partitions it needs.
+"""
+import copy
+import gzip
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - locking falls back to threads within one process
+    fcntl = None
+
+
+class JobArchive:
+    """Compressed, month-partitioned store for archived jobs and their matches"""
+
+    def __init__(self, data_dir='data'):
+        self.archive_dir = os.path.join(data_dir, 'archive')
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.index_file = os.path.join(self.archive_dir, 'index.json')
+        self._lock = threading.Lock()
+        self._cache = {}  # filepath -> ((mtime_ns, inode), parsed contents)
+
+    def _partition_file(self, partition: str) -> str:
+        """Path of the archive file for one month (YYYY-MM)"""
+        return os.path.join(self.archive_dir, f'jobs-{partition}.json.gz')
+
+    def _read(self, filepath, default):
+        """Parse an archive file, reusing the last parse while the file is unchanged"""
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return default
+        signature = (stat.st_mtime_ns, stat.st_ino)
+        cached = self._cache.get(filepath)
+        if cached and cached[0] == signature:
+            return cached[1]
+        opener = gzip.open if filepath.endswith('.gz') else open
+        with opener(filepath, 'rb') as f:
+            data = json.loads(f.read())
+        self._cache[filepath] = (signature, data)
+        return data
+
+    def _write(self, filepath, data):
+        """Atomically replace an archive file"""
+        raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        tmp_path = f'{filepath}.{os.getpid()}.{threading.get_ident()}.tmp'
+        if filepath.endswith('.gz'):
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(raw)
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(raw)
+        os.replace(tmp_path, filepath)
+
+    def _index(self) -> Dict:
+        """{'jobs': {job_id: partition}, 'farmers': {phone: [partitions]}}"""
+        return self._read(self.index_file, {'jobs': {}, 'farmers': {}})
+
+    def add(self, jobs: Dict[str, Dict], matches: Dict[str, Dict]):
+        """Archive jobs (keyed by job ID) and their matches; re-adding a record replaces it"""
+        by_partition = {}
+        for job_id, job in jobs.items():
+            partition = job.get('created_at', '')[:7] or 'undated'
+            by_partition.setdefault(partition, ({}, {}))[0][job_id] = job
+        partitions = {job_id: partition for partition, (part_jobs, _) in by_partition.items() for job_id in part_jobs}
+        for match_id, match in matches.items():
+            by_partition[partitions[match['job_id']]][1][match_id] = match
+
+        with self._lock, open(os.path.join(self.archive_dir, 'archive.lock'), 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            index = self._index()
+            index = {'jobs': dict(index['jobs']), 'farmers': dict(index['farmers'])}
+            for partition, (part_jobs, part_matches) in by_partition.items():
+                filepath = self._partition_file(partition)
+                current = self._read(filepath, {'jobs': {}, 'matches': {}})
+                self._write(filepath, {
+                    'jobs': {**current['jobs'], **part_jobs},
+                    'matches': {**current['matches'], **part_matches},
+                })
+                index['jobs'].update(dict.fromkeys(part_jobs, partition))
+                for match in part_matches.values():
+                    known = index['farmers'].get(match['farmer_phone'], [])
+                    if partition not in known:
+                        index['farmers'][match['farmer_phone']] = known + [partition]
+            # Index last: a crash before this leaves unindexed (harmless) copies, never dangling entries
+            self._write(self.index_file, index)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Get an archived job by ID"""
+        partition = self._index()['jobs'].get(job_id)
+        if partition is None:
+            return None
+        return copy.deepcopy(self._read(self._partition_file(partition), {'jobs': {}})['jobs'].get(job_id))
+
+    def get_job_matches(self, job_id: str) -> List[Dict]:
+        """Get the archived matches of an archived job"""
+        partition = self._index()['jobs'].get(job_id)
+        if partition is None:
+            return []
+        matches = self._read(self._partition_file(partition), {'matches': {}})['matches']
+        return [copy.deepcopy(match) for match in matches.values() if match['job_id'] == job_id]
+
+    def get_farmer_matches(self, farmer_phone: str) -> List[Dict]:
+        """Get a farmer's archived matches, oldest partition first"""
+        found = []
+        for partition in sorted(self._index()['farmers'].get(farmer_phone, [])):
+            matches = self._read(self._partition_file(partition), {'matches': {}})['matches']
+            found.extend(copy.deepcopy(match) for match in matches.values() if match['farmer_phone'] == farmer_phone)
+        return found
@@ -0,0 +1,167 @@
+"""
+Asyncio wrapper around the FarmConnect data stores
+
+AsyncDataStore exposes the DataStore operations as coroutines so the webhook
+can be served from an event loop. Blocking storage calls run on a bounded
+thread pool; identical reads that are in flight at the same time share one
+call until a write to its collection completes, and writes to the same collection
+are queued on an asyncio.Lock so they don't tie up pool threads waiting on the file
+lock. Writes that change more than
+one collection (a match and its job's counters) hold the lock of each.
+"""
+import asyncio
+import copy
+from contextlib import AsyncExitStack
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from data_store import BaseDataStore, COLLECTIONS, PAGE_SIZE, get_data_store
+
+
+class AsyncDataStore:
+    """Coroutine API over any storage backend"""
+
+    def __init__(self, store: Optional[BaseDataStore] = None, max_workers: int = 8):
+        self.store = store or get_data_store()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='datastore')
+        self._inflight = {}  # (method, collection generation, args) -> asyncio.Future of a read in progress
+        self._generations = dict.fromkeys(COLLECTIONS, 0)  # bumped when a write to the collection completes
+        self._write_locks = {collection: asyncio.Lock() for collection in COLLECTIONS}
+
+    async def _call(self, func: Callable, *args):
+        """Run a blocking store call on the executor"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _read(self, collection: str, method: str, *args):
+        """Run a read, sharing the result with identical reads in flight since the collection's last write"""
+        key = (method, self._generations[collection], *(tuple(arg) if isinstance(arg, list) else arg for arg in args))
+        future = self._inflight.get(key)
+        if future is not None:
+            # Records are mutable, so every waiter after the first gets its own copy
+            return copy.deepcopy(await asyncio.shield(future))
+
+        future = asyncio.ensure_future(self._call(getattr(self.store, method), *args))
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _write(self, collections: Tuple[str, ...], method: str, *args):
+        """Run a write after earlier writes to the same collections from this event loop"""
+        async with AsyncExitStack() as stack:
+            # Fixed lock order so two writes spanning collections can't deadlock
+            for collection in sorted(collections):
+                await stack.enter_async_context(self._write_locks[collection])
+            try:
+                return await self._call(getattr(self.store, method), *args)
+            finally:
+                self._written(collections)
+
+    def _written(self, collections):
+        """Start later reads of the collections afresh rather than joining reads from before a write"""
+        for collection in collections:
+            self._generations[collection] += 1
+
+    async def run_in_transaction(self, func: Callable, *args):
+        """Run a blocking function (e.g. FarmConnectBot.route_message) as one store transaction"""
+        try:
+            return await self._call(self.store.run_in_transaction, func, *args)
+        finally:
+            self._written(COLLECTIONS)
+
+    def close(self):
+        """Shut down the executor once queued calls have finished"""
+        self._executor.shutdown(wait=True)
+
+    # User Management
+    async def get_user(self, phone_number: str) -> Optional[Dict]:
+        """Get user by phone number"""
+        return await self._read('users', 'get_user', phone_number)
+
+    async def create_user(self, phone_number: str, user_type: str) -> Dict:
+        """Create new user (farmer or farm_owner)"""
+        return await self._write(('users',), 'create_user', phone_number, user_type)
+
+    async def update_user(self, phone_number: str, updates: Dict):
+        """Update user information"""
+        return await self._write(('users',), 'update_user', phone_number, updates)
+
+    async def update_user_profile(self, phone_number: str, profile_data: Dict) -> bool:
+        """Update user profile"""
+        return await self._write(('users',), 'update_user_profile', phone_number, profile_data)
+
+    # Job Management
+    async def create_job(self, job_data: Dict) -> str:
+        """Create new job posting"""
+        return await self._write(('jobs',), 'create_job', job_data)
+
+    async def get_job(self, job_id: str, include_archived: bool = False) -> Optional[Dict]:
+        """Get job by ID (falling back to the archive if include_archived)"""
+        return await self._read('jobs', 'get_job', job_id, include_archived)
+
+    async def get_jobs(self, job_ids: List[str]) -> List[Dict]:
+        """Get several jobs in one batch, in the order given (unknown IDs are skipped)"""
+        return await self._read('jobs', 'get_jobs', job_ids)
+
+    async def get_open_jobs(self) -> List[Dict]:
+        """Get all open jobs"""
+        return await self._read('jobs', 'get_open_jobs')
+
+    async def get_jobs_by_owner(self, owner_phone: str) -> List[Dict]:
+        """Get all jobs posted by a farm owner"""
+        return await self._read('jobs', 'get_jobs_by_owner', owner_phone)
+
+    async def get_open_jobs_page(self, cursor: Optional[str] = None,
+                                 limit: int = PAGE_SIZE) -> Tuple[List[Dict], Optional[str]]:
+        """One page of open jobs and the cursor for the next page"""
+        return await self._read('jobs', 'get_open_jobs_page', cursor, limit)
+
+    async def get_jobs_by_owner_page(self, owner_phone: str, cursor: Optional[str] = None,
+                                     limit: int = PAGE_SIZE) -> Tuple[List[Dict], Optional[str]]:
+        """One page of a farm owner's jobs and the cursor for the next page"""
+        return await self._read('jobs', 'get_jobs_by_owner_page', owner_phone, cursor, limit)
+
+    async def update_job(self, job_id: str, updates: Dict):
+        """Update job information"""
+        return await self._write(('jobs',), 'update_job', job_id, updates)
+
+    # Conversation State Management
+    async def get_conversation_state(self, phone_number: str, include_expired: bool = False) -> Optional[Dict]:
+        """Get conversation state for user (None once it has expired, unless include_expired)"""
+        return await self._read('conversations', 'get_conversation_state', phone_number, include_expired)
+
+    async def set_conversation_state(self, phone_number: str, state: str, data: Dict = None):
+        """Set conversation state for user"""
+        return await self._write(('conversations',), 'set_conversation_state', phone_number, state, data)
+
+    async def clear_conversation_state(self, phone_number: str):
+        """Clear conversation state"""
+        return await self._write(('conversations',), 'clear_conversation_state', phone_number)
+
+    # Job Matching
+    async def create_match(self, job_id: str, farmer_phone: str, status: str = 'pending') -> Optional[str]:
+        """Create job match (or return the farmer's existing one); None if accepted into a filled job"""
+        return await self._write(('jobs', 'matches'), 'create_match', job_id, farmer_phone, status)
+
+    async def get_farmer_matches(self, farmer_phone: str, include_archived: bool = False) -> List[Dict]:
+        """Get all matches for a farmer (archived ones first if include_archived)"""
+        return await self._read('matches', 'get_farmer_matches', farmer_phone, include_archived)
+
+    async def get_farmer_matches_page(self, farmer_phone: str, cursor: Optional[str] = None, limit: int = PAGE_SIZE,
+                                      include_archived: bool = False) -> Tuple[List[Dict], Optional[str]]:
+        """One page of a farmer's matches and the cursor for the next page"""
+        return await self._read('matches', 'get_farmer_matches_page', farmer_phone, cursor, limit, include_archived)
+
+    async def get_job_matches(self, job_id: str) -> List[Dict]:
+        """Get all matches for a job"""
+        return await self._read('matches', 'get_job_matches', job_id)
+
+    async def get_match(self, farmer_phone: str, job_id: str) -> Optional[Dict]:
+        """A farmer's match for a job, if they have applied"""
+        return await self._read('matches', 'get_match', farmer_phone, job_id)
+
+    async def update_match(self, match_id: str, updates: Dict) -> bool:
+        """Update match status (and its job's counters); False if missing or accepted into a filled job"""
+        return await self._write(('jobs', 'matches'), 'update_match', match_id, updates)
@@ -0,0 +1,111 @@
+"""
+Benchmark the storage backends on the bot's hot operations
+
+Loads each backend with N users, jobs (a quarter of them open), matches and
+conversation states, then reports operations per second for the calls a message
+typically makes. Each operation runs until it has done `repeat` calls or spent
+`budget` seconds, so slow backend/size combinations still finish.
+
+    python benchmarks/backends.py [sizes ...] [--backends json,sqlite,...]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_store import DataStore
+from log_store import LogDataStore
+from memory_store import MemoryDataStore
+from sqlite_store import SQLiteDataStore
+
+BACKENDS = {
+    'json': lambda data_dir: DataStore(data_dir, cache=False),
+    'json-cached': lambda data_dir: DataStore(data_dir),
+    'log': lambda data_dir: LogDataStore(data_dir, compact_interval=None),
+    'sqlite': lambda data_dir: SQLiteDataStore(data_dir),
+    'memory': lambda data_dir: MemoryDataStore(data_dir),
+}
+
+OPERATIONS = ('get_user', 'set_conversation_state', 'create_match', 'get_open_jobs', 'get_job_matches')
+
+
+def phone(i):
+    """Phone number of the i-th user"""
+    return f'whatsapp:+1555{i:07d}'
+
+
+def populate(store, count):
+    """Load count records into every collection"""
+    created_at = '2024-06-01T08:00:00.000000'
+    store.import_records('users', ((phone(i), {
+        'phone': phone(i), 'type': 'farmer', 'created_at': created_at, 'registered': True,
+        'profile': {'name': f'Farmer {i}', 'location': 'Fresno, CA', 'work_types': 'Harvesting'},
+    }) for i in range(count)))
+    store.import_records('jobs', ((f'JOB_{i}', {
+        'job_id': f'JOB_{i}', 'created_at': created_at, 'status': 'open' if i % 4 == 0 else 'closed',
+        'work_type': 'Harvesting', 'workers_needed': 3, 'payment_type': 'per hour', 'payment_amount': 18.5,
+        'location': 'Fresno, CA', 'owner_phone': phone(i % 1000), 'farm_name': 'Sunrise Farm',
+    }) for i in range(count)))
+    store.import_records('matches', ((f'MATCH_{i}', {
+        'match_id': f'MATCH_{i}', 'job_id': f'JOB_{i % max(1, count // 5)}', 'farmer_phone': phone(i),
+        'status': 'pending', 'created_at': created_at,
+    }) for i in range(count)))
+    store.import_records('conversations', ((phone(i), {
+        'state': 'viewing_jobs', 'data': {'current_index': 0}, 'updated_at': datetime.now().isoformat(),
+    }) for i in range(count)))
+
+
+def ops_per_second(func, repeat, budget):
+    """Calls per second of func, stopping after repeat calls or budget seconds"""
+    done = 0
+    start = time.perf_counter()
+    while done < repeat:
+        func(done)
+        done += 1
+        if time.perf_counter() - start > budget:
+            break
+    return done / (time.perf_counter() - start)
+
+
+def run(backend, count, repeat, budget):
+    """ops/sec of every operation for one backend and size"""
+    rng = random.Random(count)
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = BACKENDS[backend](data_dir)
+        populate(store, count)
+        calls = {
+            'get_user': lambda n: store.get_user(phone(rng.randrange(count))),
+            'set_conversation_state': lambda n: store.set_conversation_state(
+                phone(rng.randrange(count)), 'viewing_jobs', {'current_index': n}),
+            'create_match': lambda n: store.create_match(f'JOB_{rng.randrange(count)}', phone(rng.randrange(count))),
+            'get_open_jobs': lambda n: store.get_open_jobs(),
+            'get_job_matches': lambda n: store.get_job_matches(f'JOB_{rng.randrange(max(1, count // 5))}'),
+        }
+        results = {name: ops_per_second(calls[name], repeat, budget) for name in OPERATIONS}
+        if hasattr(store, 'close'):
+            store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the storage backends')
+    parser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=1000, help='maximum calls per operation')
+    parser.add_argument('--budget', type=float, default=2.0, help='maximum seconds per operation')
+    args = parser.parse_args()
+
+    print(f"{'backend':<13}{'records':>9}" + ''.join(f'{name:>24}' for name in OPERATIONS))
+    for count in args.sizes:
+        for backend in args.backends.split(','):
+            results = run(backend, count, args.repeat, args.budget)
+            print(f'{backend:<13}{count:>9}' + ''.join(f'{results[name]:>24,.0f}' for name in OPERATIONS))
+
+
+if __name__ == '__main__':
+    main()
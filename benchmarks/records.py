@@ -0,0 +1,94 @@
+"""
+Benchmark typed records against plain dicts
+
+Reports the memory a jobs collection takes as dicts and as records.Job objects
+(measured with tracemalloc), what a MemoryDataStore holding it takes now that the
+stores cache records, and the cost of the from_dict/to_dict codecs the stores
+convert with at the edge.
+
+    python benchmarks/records.py [job_count]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_store import MemoryDataStore
+from records import Job
+from serialization import per_op
+
+
+def make_jobs(count):
+    """Jobs with the fields the bot's job-posting flow writes"""
+    return {
+        f'JOB_{i}': {
+            'job_id': f'JOB_{i}',
+            'created_at': '2024-06-01T08:00:00.000000',
+            'status': 'open' if i % 4 == 0 else 'closed',
+            'work_type': 'Harvesting',
+            'workers_needed': 3,
+            'work_hours': '7am-3pm',
+            'payment_type': 'per hour',
+            'payment_amount': 18.5,
+            'location': 'Fresno, CA',
+            'transportation': 'provided',
+            'meeting_point': 'Main gate',
+            'description': 'Pick and pack tomatoes, early start, bring water',
+            'owner_phone': f'whatsapp:+1555555{i % 1000:04d}',
+            'owner_name': 'Maria',
+            'farm_name': 'Sunrise Farm',
+            'hours': 'flexible',
+        }
+        for i in range(count)
+    }
+
+
+def allocated(build):
+    """Bytes still allocated by the object build() returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main(count):
+    jobs = make_jobs(count)
+    # Build the records from copies of the dicts so shared strings aren't counted twice
+    as_dicts = allocated(lambda: [dict(job) for job in jobs.values()])
+    as_records = allocated(lambda: [Job.from_dict(job) for job in jobs.values()])
+
+    def filled_store():
+        store = MemoryDataStore(tempfile.mkdtemp())
+        for key, job in jobs.items():
+            store._put_record('jobs', key, job)
+        return store
+    in_store = allocated(filled_store)
+
+    records = [Job.from_dict(job) for job in jobs.values()]
+    start = time.perf_counter()
+    for job in jobs.values():
+        Job.from_dict(job)
+    decode = (time.perf_counter() - start) / count * 1e6
+    start = time.perf_counter()
+    for record in records:
+        record.to_dict()
+    encode = (time.perf_counter() - start) / count * 1e6
+    field_read = per_op(lambda: records[0].pay_rate, 100000) * 1e3
+    dict_read = per_op(lambda: jobs['JOB_0'].get('pay_rate'), 100000) * 1e3
+
+    print(f"{count} jobs")
+    print(f"dicts:   {as_dicts:>12,} bytes ({as_dicts / count:.0f} per job)")
+    print(f"records: {as_records:>12,} bytes ({as_records / count:.0f} per job)")
+    print(f"store:   {in_store:>12,} bytes ({in_store / count:.0f} per job, records plus indexes)")
+    print(f"from_dict {decode:.2f} us, to_dict {encode:.2f} us per job")
+    print(f"field read {field_read:.0f} ns (record attribute) vs {dict_read:.0f} ns (dict.get)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,75 @@
+"""
+Benchmark the DataStore serialization formats
+
+Reports the size of a jobs collection in each format, the time to encode and
+decode it, the end-to-end cost of DataStore.update_job (one file rewrite plus
+its offset index) and of a get_job that misses the cache (offset index + mmap
+for the JSON formats, a full parse for msgpack).
+
+    python benchmarks/serialization.py [job_count]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serializers
+from data_store import DataStore
+
+
+def make_jobs(count):
+    """A jobs collection shaped like the ones the bot creates"""
+    return {
+        f'JOB_{i}': {
+            'job_id': f'JOB_{i}',
+            'created_at': '2024-06-01T08:00:00.000000',
+            'status': 'open' if i % 4 == 0 else 'closed',
+            'owner_phone': f'whatsapp:+1555555{i % 1000:04d}',
+            'work_type': 'Harvesting',
+            'pay_rate': 18.5,
+            'pay_type': 'per hour',
+            'location': 'Fresno, CA',
+            'workers_needed': 3,
+            'description': 'Pick and pack tomatoes, early start, bring water',
+        }
+        for i in range(count)
+    }
+
+
+def per_op(func, repeat):
+    """Average microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(count):
+    jobs = make_jobs(count)
+    formats = [fmt for fmt in serializers.FORMATS
+               if not (fmt == 'orjson' and serializers.orjson is None)
+               and not (fmt == 'msgpack' and serializers.msgpack is None)]
+    repeat = max(5, 20000 // count)
+
+    print(f"{count} jobs")
+    print(f"{'format':<10}{'bytes':>12}{'encode us':>12}{'decode us':>12}{'update_job us':>15}{'get_job us':>12}")
+    for fmt in formats:
+        raw = serializers.dumps(jobs, fmt)
+        encode = per_op(lambda: serializers.dumps(jobs, fmt), repeat)
+        decode = per_op(lambda: serializers.loads(raw), repeat)
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            store = DataStore(data_dir, serializer=fmt)
+            with open(os.path.join(data_dir, 'jobs.json'), 'wb') as f:
+                f.write(raw)
+            update = per_op(lambda: store.update_job('JOB_0', {'workers_needed': 2}), repeat)
+            reader = DataStore(data_dir, serializer=fmt)
+            point_read = per_op(lambda: (reader.invalidate_cache(), reader.get_job('JOB_5')), repeat * 100)
+
+        print(f"{fmt:<10}{len(raw):>12}{encode:>12.0f}{decode:>12.0f}{update:>15.0f}{point_read:>12.0f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -2,8 +2,9 @@
 FarmConnect WhatsApp Chatbot Logic
 Handles conversation flows for farmers and farm owners
 """
-from data_store import DataStore
+from data_store import effective_rate, get_data_store
 from typing import Optional, Tuple
+import heapq
 import os
 from twilio.rest import Client
 from dotenv import load_dotenv
@@ -13,7 +14,7 @@ load_dotenv()
 
 class FarmConnectBot:
     def __init__(self):
-        self.store = DataStore()
+        self.store = get_data_store()
         # Initialize Twilio client for sending messages
         account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
         auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
@@ -27,10 +28,20 @@ class FarmConnectBot:
     def handle_message(self, from_number: str, message_body: str, media_url: Optional[str] = None) -> str:
         """
         Main message handler - routes to appropriate flow based on user state
+
+        Runs as one store transaction, so each data file is written at most once per message
         """
-        
+        return self.store.run_in_transaction(self.route_message, from_number, message_body, media_url)
+
+    def route_message(self, from_number: str, message_body: str, media_url: Optional[str] = None) -> str:
+        """Route a message based on the user's registration and conversation state"""
         user = self.store.get_user(from_number)
-        conv_state = self.store.get_conversation_state(from_number)
+        conv_state = self.store.get_conversation_state(from_number, include_expired=True)
+
+        # Abandoned mid-flow - start over from the menu instead of resuming a stale step
+        if conv_state and self.store.conversation_expired(conv_state):
+            self.store.clear_conversation_state(from_number)
+            conv_state = None
 
         # Check conversation state first (handles both new and existing users)
         if conv_state:
@@ -200,6 +211,10 @@ class FarmConnectBot:
         elif state == 'chatting':
             return self.handle_chat_message(from_number, message, data)
 
+        # Paged listings
+        elif state in ('viewing_applications', 'viewing_owner_jobs'):
+            return self.handle_listing_reply(from_number, state, message, data)
+
         return "I didn't understand that. Please try again or type 'menu' for main menu."
 
     # ========== FARMER REGISTRATION ==========
@@ -577,8 +592,8 @@ Type your details or 'skip':"""
         job_id = self.store.create_job(data)
         self.store.clear_conversation_state(from_number)
 
-        # Notify matching farmers
-        self.notify_matching_farmers(job_id, data)
+        # Matching farmers are notified from the job_created event (see reply_whatsapp.py),
+        # so nobody hears about a job whose transaction was rolled back
 
         # Format payment display
         pay_display = f"${data['payment_amount']} {data['payment_type']}"
@@ -780,23 +795,12 @@ Reply with 1 or 2 (or type 'menu' to return to main menu):"""
             if not job:
                 return "Job not found. Please try again or type 'menu'."
 
+            if self.store.get_match(from_number, current_job_id):
+                return self.already_applied_reply(from_number)
+            # The owner is notified once this commits (see on_match_created)
             match_id = self.store.create_match(current_job_id, from_number, 'accepted')
-            user = self.store.get_user(from_number)
-
-            # Notify farm owner
-            owner_phone = job.get('owner_phone')
-            if owner_phone:
-                self.send_message(
-                    owner_phone,
-                    f"""🎉 *New Job Application!*
-
-{user['profile'].get('name', 'A worker')} has applied for your job: {job['work_type']}
-
-Location: {job['location']}
-Pay Rate: ${job['pay_rate']}/hour
-
-Type '4' from the menu to chat with applicants."""
-                )
+            if match_id is None:
+                return self.job_filled_reply(from_number)
 
             self.store.clear_conversation_state(from_number)
 
@@ -824,11 +828,7 @@ The farm owner has been notified and will contact you soon.
             next_index = current_index + 1
 
             # Get all jobs to show next one
-            all_matched_jobs = []
-            for job_id in job_ids:
-                job = self.store.get_job(job_id)
-                if job:
-                    all_matched_jobs.append(job)
+            all_matched_jobs = self.store.get_jobs(job_ids)
 
             return self.show_single_job_recommendation(from_number, all_matched_jobs, next_index)
 
@@ -855,48 +855,33 @@ The farm owner has been notified and will contact you soon.
         # Fallback to rule-based matching
         return self._rule_based_match(jobs, prefs)
 
-    def _rule_based_match(self, jobs: list, prefs: dict) -> list:
-        """Rule-based job matching algorithm - matches by work type and sorts by salary"""
-        matched = []
-
-        for job in jobs:
-            # Check work type (simple keyword match)
-            pref_types = prefs.get('work_types', '').lower()
-            job_type = job.get('work_type', '').lower()
-
-            # If user selected "All types of work", match everything
-            if 'all types of work' in pref_types:
-                matched.append(job)
-                continue
-
-            # If preferences exist, check if they match
-            if pref_types:
-                # Check if any preferred type matches the job type
-                type_match = False
-                for pref_type in pref_types.split(','):
-                    pref_type = pref_type.strip()
-                    if pref_type in job_type or job_type in pref_type:
-                        type_match = True
-                        break
-
-                if not type_match:
-                    continue
-
-            matched.append(job)
-
-        # Sort by effective pay rate (highest first)
-        def get_sort_key(job):
-            if job.get('payment_type') == 'per day':
-                return job.get('payment_amount', 0) / 8
-            elif job.get('payment_type') == 'per hour':
-                return job.get('payment_amount', 0)
-            else:
-                return job.get('pay_rate', 0)
+    def _rule_based_match(self, jobs: list, prefs: dict, limit: int = 5) -> list:
+        """Rule-based job matching algorithm - matches by work type, keeps the limit best paid (O(n log limit))"""
+        pref_types = (prefs.get('work_types') or '').lower()
+        # If user selected "All types of work" (or nothing), match everything
+        match_all = not pref_types or 'all types of work' in pref_types
+        wanted = [pref_type.strip() for pref_type in pref_types.split(',')]
+
+        type_matches = {}  # work type -> matches the preferences; jobs share a handful of types
+
+        def type_match(job):
+            work_type = job.get('work_type', '')
+            found = type_matches.get(work_type)
+            if found is None:
+                # Simple keyword match either way round
+                job_type = work_type.lower()
+                found = type_matches[work_type] = any(
+                    pref_type in job_type or job_type in pref_type for pref_type in wanted)
+            return found
+
+        matched = jobs if match_all else filter(type_match, jobs)
 
-        matched.sort(key=get_sort_key, reverse=True)
+        # Highest effective pay first (precomputed on the job; jobs from before it was stored compute it here)
+        def rate(job):
+            cached = job.get('effective_rate')
+            return effective_rate(job) if cached is None else cached
 
-        # Return top 5 matches only
-        return matched[:5]
+        return heapq.nlargest(limit, matched, key=rate)
 
     def handle_job_selection_from_list(self, from_number: str, message: str, data: dict) -> str:
         """Handle user selecting a job from the list of 5 recommendations"""
@@ -1001,33 +986,12 @@ Reply with 1 or 2:"""
             if not job:
                 return "Job not found. Please try again or type 'menu'."
 
+            if self.store.get_match(from_number, job_id):
+                return self.already_applied_reply(from_number)
+            # The owner is notified once this commits (see on_match_created)
             match_id = self.store.create_match(job_id, from_number, 'accepted')
-            user = self.store.get_user(from_number)
-
-            # Notify farm owner
-            owner_phone = job.get('owner_phone')
-            if owner_phone and self.twilio_client:
-                # Format payment display for notification
-                if job.get('payment_type') == 'per day':
-                    pay_display = f"${job.get('payment_amount', 'N/A')}/day"
-                elif job.get('payment_type') == 'per hour':
-                    pay_display = f"${job.get('payment_amount', 'N/A')}/hour"
-                elif job.get('pay_rate'):
-                    pay_display = f"${job.get('pay_rate')}/hour"
-                else:
-                    pay_display = "Contact for details"
-
-                self.send_message(
-                    owner_phone,
-                    f"""🎉 *New Job Application!*
-
-{user['profile'].get('name', 'A worker')} has applied for your job: {job.get('work_type', 'Farm Work')}
-
-Location: {job.get('location', 'N/A')}
-Pay: {pay_display}
-
-Type '3' from the menu to view applicants."""
-                )
+            if match_id is None:
+                return self.job_filled_reply(from_number)
 
             self.store.clear_conversation_state(from_number)
 
@@ -1046,7 +1010,7 @@ The farm owner has been notified and will contact you soon.
         elif message == '2':
             # Go back to job list
             # Recreate the job list display
-            matched_jobs = [self.store.get_job(jid) for jid in all_jobs if self.store.get_job(jid)]
+            matched_jobs = self.store.get_jobs(all_jobs)
 
             return self.show_multiple_job_recommendations(from_number, matched_jobs)
 
@@ -1094,27 +1058,26 @@ Reply with 1 or 2:"""
                 return self.show_main_menu(from_number, user)
             return "Please enter a valid job number."
 
+    def job_filled_reply(self, from_number: str) -> str:
+        """Tell a farmer the job they applied for has no spots left (back to the menu)"""
+        return "😔 Sorry, this job has just been filled.\n\n" + self.show_farmer_menu(from_number)
+
+    def already_applied_reply(self, from_number: str) -> str:
+        """Answer a repeated application (double tap or retried webhook) without notifying the owner again"""
+        return "✅ You've already applied for this job.\n\n" + self.show_farmer_menu(from_number)
+
     def handle_job_action(self, from_number: str, message: str, data: dict) -> str:
         """Handle apply/decline action"""
         job_id = data.get('job_id')
 
         if message.strip() == '1':
             # Accept job
+            if self.store.get_match(from_number, job_id):
+                return self.already_applied_reply(from_number)
+            # The owner is notified once this commits (see on_match_created)
             match_id = self.store.create_match(job_id, from_number, 'accepted')
-            job = self.store.get_job(job_id)
-            user = self.store.get_user(from_number)
-
-            # Notify farm owner
-            owner_phone = job.get('owner_phone')
-            if owner_phone:
-                self.send_message(
-                    owner_phone,
-                    f"""🎉 New Job Application!
-
-{user['profile'].get('name', 'A worker')} has applied for your job: {job['work_type']}
-
-Type '4' from the menu to chat with applicants."""
-                )
+            if match_id is None:
+                return self.job_filled_reply(from_number)
 
             self.store.clear_conversation_state(from_number)
             user = self.store.get_user(from_number)
@@ -1183,8 +1146,58 @@ Type your message to send. Type 'endchat' to return to main menu."""
         # For now, just notify farmers who might be interested
         pass  # Will implement notification logic
 
+    def on_job_created(self, event: dict):
+        """Change-event subscriber for new jobs"""
+        self.notify_matching_farmers(event['key'], event['record'])
+
+    def on_match_created(self, event: dict):
+        """
+        Change-event subscriber for new applications: notify the farm owner.
+
+        Sent after the commit rather than from the apply handlers, whose transaction
+        may be retried - each retry would message the owner again.
+        """
+        match = event['record']
+        job = self.store.get_job(match['job_id'])
+        owner_phone = job.get('owner_phone') if job else None
+        if not owner_phone:
+            return
+        farmer = self.store.get_user(match['farmer_phone'])
+        name = farmer['profile'].get('name', 'A worker') if farmer else 'A worker'
+
+        # Format payment display for notification
+        if job.get('payment_type') == 'per day':
+            pay_display = f"${job.get('payment_amount', 'N/A')}/day"
+        elif job.get('payment_type') == 'per hour':
+            pay_display = f"${job.get('payment_amount', 'N/A')}/hour"
+        elif job.get('pay_rate'):
+            pay_display = f"${job.get('pay_rate')}/hour"
+        else:
+            pay_display = "Contact for details"
+
+        self.send_message(
+            owner_phone,
+            f"""🎉 *New Job Application!*
+
+{name} has applied for your job: {job.get('work_type', 'Farm Work')}
+
+Location: {job.get('location', 'N/A')}
+Pay: {pay_display}
+
+Type '3' from the menu to view applicants."""
+        )
+
     def send_message(self, to_phone: str, message: str):
-        """Send WhatsApp message via Twilio"""
+        """
+        Send WhatsApp message via Twilio once the current store transaction commits.
+
+        A message handler's transaction may be retried or rolled back; deferring the
+        send means it goes out once, and no network call runs inside the transaction.
+        """
+        self.store.after_commit(self._deliver, to_phone, message)
+
+    def _deliver(self, to_phone: str, message: str):
+        """Send WhatsApp message via Twilio now"""
         if not self.twilio_client:
             print(f"Would send to {to_phone}: {message}")
             return
@@ -1219,16 +1232,7 @@ What would you like to update?
 
 Reply with number (1-6):"""
             elif choice == '3':
-                matches = self.store.get_farmer_matches(from_number)
-                if not matches:
-                    return "You haven't applied to any jobs yet.\n\n" + self.show_farmer_menu(from_number)
-                msg = "📋 *Your Job Applications:*\n\n"
-                for match in matches:
-                    job = self.store.get_job(match['job_id'])
-                    if job:
-                        msg += f"• {job['work_type']} - Status: {match['status']}\n"
-                msg += "\n" + self.show_farmer_menu(from_number)
-                return msg
+                return self.view_farmer_applications(from_number)
             elif choice == '5':
                 return self.show_help()
         else:  # farm owner
@@ -1378,28 +1382,65 @@ New location: {location.strip()}
 
 {self.show_farmer_menu(from_number)}"""
 
-    def view_owner_jobs(self, from_number: str) -> str:
-        """View jobs posted by farm owner"""
-        all_jobs = self.store._read_json(self.store.jobs_file)
-        owner_jobs = [j for j in all_jobs.values() if j.get('owner_phone') == from_number]
+    def view_farmer_applications(self, from_number: str, cursor: Optional[str] = None) -> str:
+        """View one page of a farmer's job applications"""
+        matches, next_cursor = self.store.get_farmer_matches_page(from_number, cursor, include_archived=True)
+        if not matches and cursor is None:
+            return "You haven't applied to any jobs yet.\n\n" + self.show_farmer_menu(from_number)
+
+        msg = "📋 *Your Job Applications:*\n\n"
+        for match in matches:
+            job = self.store.get_job(match['job_id'], include_archived=True)
+            if job:
+                msg += f"• {job['work_type']} - Status: {match['status']}\n"
+        msg += "\n" + self.show_farmer_menu(from_number)
+        return self.with_more_prompt(from_number, msg, 'viewing_applications', next_cursor)
+
+    def with_more_prompt(self, from_number: str, msg: str, state: str, next_cursor: Optional[str]) -> str:
+        """Offer the next page of a listing, remembering where it continues"""
+        if not next_cursor:
+            return msg
+        # Set after the menu text - showing a menu clears the conversation state
+        self.store.set_conversation_state(from_number, state, {'cursor': next_cursor})
+        return msg + "\n\nReply 'more' to see more."
+
+    def handle_listing_reply(self, from_number: str, state: str, message: str, data: dict) -> str:
+        """Show the next page of a listing, or treat the reply as a menu choice"""
+        if message.strip().lower() == 'more':
+            if state == 'viewing_applications':
+                return self.view_farmer_applications(from_number, data.get('cursor'))
+            return self.view_owner_jobs(from_number, data.get('cursor'))
+
+        self.store.clear_conversation_state(from_number)
+        user = self.store.get_user(from_number)
+        return self.handle_menu_selection(from_number, user, message.strip())
 
-        if not owner_jobs:
+    def view_owner_jobs(self, from_number: str, cursor: Optional[str] = None) -> str:
+        """View one page of the jobs posted by a farm owner"""
+        owner_jobs, next_cursor = self.store.get_jobs_by_owner_page(from_number, cursor)
+
+        if not owner_jobs and cursor is None:
             return "You haven't posted any jobs yet.\n\n" + self.show_owner_menu(from_number)
 
         msg = "📋 *Your Job Postings:*\n\n"
         
         for job in owner_jobs:
-            matches = self.store.get_job_matches(job['job_id'])
+            counts = job.get('application_counts')
+            if counts is None:
+                # Posted before jobs kept counters and not yet backfilled (rebuild_counts.py)
+                counts = {'total': len(self.store.get_job_matches(job['job_id']))}
+            by_status = ', '.join(f"{n} {status}" for status, n in sorted(counts.items()) if status != 'total')
+            applications = f"{counts['total']} ({by_status})" if by_status else str(counts['total'])
             msg += f"""*{job['work_type']}*
                     Pay: ${job['pay_rate']}/hr
                     Status: {job['status']}
-                    Applications: {len(matches)}
+                    Applications: {applications}
                     ━━━━━━━━━━━
 
                     """
             
         msg += self.show_owner_menu(from_number)
-        return msg
+        return self.with_more_prompt(from_number, msg, 'viewing_owner_jobs', next_cursor)
 
     def show_help(self) -> str:
         """
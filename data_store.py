@@ -1,163 +1,1337 @@
 """
 Data storage module for FarmConnect chatbot using JSON files
 """
-import json
+import bisect
+import copy
+import heapq
+import mmap
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+import zlib
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-class DataStore:
-    def __init__(self, data_dir='data'):
-        self.data_dir = data_dir
-        os.makedirs(data_dir, exist_ok=True)
+import serializers
+from archive import JobArchive
+from events import EVENT_TYPES, EventLog
+from ids import new_id
+from records import RECORD_TYPES, ConversationState, Record
 
-        self.users_file = os.path.join(data_dir, 'users.json')
-        self.jobs_file = os.path.join(data_dir, 'jobs.json')
-        self.conversations_file = os.path.join(data_dir, 'conversations.json')
-        self.matches_file = os.path.join(data_dir, 'matches.json')
+try:
+    import fcntl
+except ImportError:  # Windows - locking falls back to threads within one process
+    fcntl = None
 
-        # Initialize files if they don't exist
-        self._init_file(self.users_file, {})
-        self._init_file(self.jobs_file, {})
-        self._init_file(self.conversations_file, {})
-        self._init_file(self.matches_file, {})
+COLLECTIONS = ('users', 'jobs', 'conversations', 'matches')
 
-    def _init_file(self, filepath, default_data):
-        """Initialize JSON file with default data if it doesn't exist"""
-        if not os.path.exists(filepath):
-            with open(filepath, 'w') as f:
-                json.dump(default_data, f, indent=2)
+# Marks a key deleted inside a transaction's change set
+DELETED = object()
 
-    def _read_json(self, filepath):
-        """Read JSON file"""
+# Seconds before an untouched conversation state is treated as abandoned (0 disables)
+CONVERSATION_TTL = 24 * 60 * 60
+
+# Days after creation before a job that is no longer open moves to the archive
+ARCHIVE_AFTER_DAYS = 90
+
+
+# Records per page for the paginated lookups (get_open_jobs_page, ...)
+PAGE_SIZE = 5
+
+# A farmer's application to a job - unique, see create_match()
+FARMER_JOB = ('farmer_phone', 'job_id')
+
+# Fields with a secondary index, per collection (a tuple of fields is a composite index)
+INDEXED_FIELDS = {
+    'jobs': ('status', 'owner_phone'),
+    'matches': ('farmer_phone', 'job_id', FARMER_JOB),
+}
+
+
+def effective_rate(job: Dict) -> float:
+    """
+    Pay of a job as an hourly figure, for ranking: a day rate over 8 hours, hourly and
+    per-task amounts as posted (a task's duration isn't known), else the legacy pay_rate.
+    """
+    payment_type = job.get('payment_type')
+    if payment_type == 'per day':
+        return (job.get('payment_amount') or 0) / 8
+    if payment_type in ('per hour', 'per task'):
+        return job.get('payment_amount') or 0
+    return job.get('pay_rate') or 0
+
+
+def field_value(record: Dict, field):
+    """A record's value for an index field; for a composite field the tuple of values (None if any is missing)"""
+    if isinstance(field, tuple):
+        values = tuple(record.get(name) for name in field)
+        return None if None in values else values
+    return record.get(field)
+
+
+def copy_record(record: Optional[Dict]) -> Optional[Dict]:
+    """Deep copy of a record; much faster than copy.deepcopy() for the mostly flat records stored here"""
+    if record is None:
+        return None
+    return {key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+            for key, value in record.items()}
+
+
+class ConflictError(Exception):
+    """A transaction's records were changed by another writer before it committed"""
+
+
+def page_position(key: str, record: Dict) -> Tuple[str, str]:
+    """Where a record sorts in pages: creation time, then key (records without created_at first)"""
+    return (record.get('created_at') or '', key)
+
+
+def encode_cursor(position: Tuple[str, str]) -> str:
+    """Opaque page cursor for the position of the last record on a page"""
+    return '|'.join(position)
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Position a cursor continues after (None for the first page)"""
+    if cursor is None:
+        return None
+    created_at, _, key = cursor.rpartition('|')
+    return created_at, key
+
+
+class FieldIndex:
+    """Secondary index: field value -> positions (see page_position) of the records holding it, sorted"""
+
+    def __init__(self, field, records: Dict[str, Dict] = None):
+        self.field = field
+        self._positions = {}  # value -> sorted list of (created_at, key)
+        for key, record in (records or {}).items():
+            value = field_value(record, field)
+            if value is not None:
+                self._positions.setdefault(value, []).append(page_position(key, record))
+        for positions in self._positions.values():
+            positions.sort()
+
+    def _add(self, key: str, record: Dict):
+        value = field_value(record, self.field)
+        if value is not None:
+            positions = self._positions.setdefault(value, [])
+            position = page_position(key, record)
+            at = bisect.bisect_left(positions, position)
+            if at == len(positions) or positions[at] != position:
+                positions.insert(at, position)
+
+    def _remove(self, key: str, record: Dict):
+        value = field_value(record, self.field)
+        positions = self._positions.get(value)
+        if positions is not None:
+            position = page_position(key, record)
+            at = bisect.bisect_left(positions, position)
+            if at < len(positions) and positions[at] == position:
+                del positions[at]
+            if not positions:
+                del self._positions[value]
+
+    def update(self, key: str, old: Optional[Dict], new: Optional[Dict]):
+        """Reindex a record after a change (old is None for inserts, new is None for deletes)"""
+        if (old is not None and new is not None and field_value(old, self.field) == field_value(new, self.field)
+                and old.get('created_at') == new.get('created_at')):
+            return
+        if old is not None:
+            self._remove(key, old)
+        if new is not None:
+            self._add(key, new)
+
+    def keys(self, value) -> List[str]:
+        """Indexed keys for value, in page order"""
+        return [key for _, key in self._positions.get(value, ())]
+
+    def lookup(self, records: Dict[str, Dict], value, extra_keys=()) -> List[Dict]:
+        """
+        Records whose field equals value, read from records (the caller's view).
+
+        extra_keys are keys changed in an open transaction that the index doesn't know yet;
+        every candidate is re-checked, so keys from a newer or older view are filtered out.
+        """
+        # list() of a list doesn't release the GIL, so this is safe against concurrent updates
+        keys = [key for _, key in list(self._positions.get(value, ()))]
+        if extra_keys:
+            known = set(keys)
+            keys.extend(key for key in extra_keys if key not in known)
+        found = []
+        for key in keys:
+            record = records.get(key)
+            if record is not None and field_value(record, self.field) == value:
+                found.append(record)
+        return found
+
+    def _positions_after(self, value, after: Optional[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        """Indexed positions for value past after, fetched a few at a time"""
+        while True:
+            positions = self._positions.get(value)
+            if not positions:
+                return
+            # Re-find the place for every chunk - the list may have changed in between
+            start = 0 if after is None else bisect.bisect_right(positions, after)
+            chunk = positions[start:start + 32]
+            if not chunk:
+                return
+            yield from chunk
+            after = chunk[-1]
+
+    def page(self, records: Dict[str, Dict], value, after: Optional[Tuple[str, str]], limit: int,
+             extra_keys=()) -> List[Tuple[str, Dict]]:
+        """
+        Up to limit (key, record) pairs whose field equals value, in page order past the
+        position after (from the start if None). Like lookup(), but only examines the keys
+        it returns plus any that fail the re-check.
+        """
+        extra = []
+        for key in extra_keys:
+            record = records.get(key)
+            if record is not None:
+                position = page_position(key, record)
+                if after is None or position > after:
+                    extra.append(position)
+        extra.sort()
+        found, seen = [], set()
+        for position in heapq.merge(self._positions_after(value, after), extra):
+            key = position[1]
+            if key in seen:
+                continue  # both indexed and changed in the transaction
+            record = records.get(key)
+            # An indexed position from another view of the record is skipped; its current one is in extra
+            if (record is not None and field_value(record, self.field) == value
+                    and page_position(key, record) == position):
+                seen.add(key)
+                found.append((key, record))
+                if len(found) == limit:
+                    break
+        return found
+
+
+class BaseDataStore:
+    """
+    Storage-independent DataStore API.
+
+    Subclasses only provide the record-level hooks (_get_record, _put_record, ...)
+    for one storage engine; the chatbot-facing methods are shared by all backends.
+    """
+
+    durable_events = True  # also append committed events to <data_dir>/events.log
+
+    def __init__(self):
+        self._tx = threading.local()  # per-thread transaction state
+        self.conversation_ttl = float(os.environ.get('FARMCONNECT_CONVERSATION_TTL', CONVERSATION_TTL))
+        self.archive_after_days = float(os.environ.get('FARMCONNECT_ARCHIVE_DAYS', ARCHIVE_AFTER_DAYS))
+        self._archive = None
+        self._event_log = None
+        self._subscribers = []  # (callback, event types or None for all)
+        # Return records.User/Job/Match/ConversationState from reads instead of dicts.
+        # Opt-in per store only: the bot indexes what it reads like dicts.
+        self.record_types = False
+        self._background_stop = threading.Event()
+
+    # Transactions
+    @contextmanager
+    def transaction(self):
+        """
+        Group all mutations made inside the block into one unit of work.
+
+        Changes are buffered and flushed once per collection when the block exits,
+        or discarded if it raises. Nested transactions join the outer one.
+        """
+        depth = getattr(self._tx, 'depth', 0)
+        self._tx.depth = depth + 1
+        if depth:
+            try:
+                yield self
+            finally:
+                self._tx.depth -= 1
+            return
+
+        self._begin()
+        self._tx.events = []
+        self._tx.after_commit = []
         try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+            yield self
+        except BaseException:
+            self._tx.depth = 0
+            self._tx.events = self._tx.after_commit = None
+            self._rollback()
+            raise
+        self._tx.depth = 0
+        events, self._tx.events = self._tx.events, None
+        calls, self._tx.after_commit = self._tx.after_commit, None
+        self._commit()
+        # Only after the commit: subscribers must never see changes that were rolled back
+        self._publish(events)
+        for func, args in calls:
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"After-commit call {getattr(func, '__name__', func)} failed: {e}")
 
-    def _write_json(self, filepath, data):
-        """Write to JSON file"""
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+    def run_in_transaction(self, func: Callable, *args, retries: int = 3, **kwargs):
+        """Call func inside transaction(), retrying if a concurrent writer touched the same records"""
+        for attempt in range(retries):
+            try:
+                with self.transaction():
+                    return func(*args, **kwargs)
+            except ConflictError:
+                if attempt == retries - 1:
+                    raise
+                print(f"Transaction conflict, retrying ({attempt + 1}/{retries - 1})")
+
+    def after_commit(self, func: Callable, *args):
+        """
+        Call func(*args) once the current transaction commits, or now outside one.
+
+        For side effects that can't be rolled back (e.g. sending a message): a
+        transaction that is rolled back or retried drops its pending calls.
+        """
+        pending = getattr(self._tx, 'after_commit', None)
+        if pending is None:
+            func(*args)
+        else:
+            pending.append((func, args))
+
+    @property
+    def in_transaction(self) -> bool:
+        """True while the current thread is inside transaction()"""
+        return getattr(self._tx, 'depth', 0) > 0
+
+    def _begin(self):
+        """Start buffering changes for this thread"""
+
+    def _commit(self):
+        """Flush this thread's buffered changes"""
+
+    def _rollback(self):
+        """Discard this thread's buffered changes"""
+
+    # Change events
+    @property
+    def event_log(self) -> EventLog:
+        """Durable log of change events in <data_dir>/events.log"""
+        if self._event_log is None:
+            self._event_log = EventLog(self.data_dir)
+        return self._event_log
+
+    def subscribe(self, callback: Callable[[Dict], None], event_types=None):
+        """Call callback(event) after each committed change of the given types (all by default)"""
+        if event_types is not None:
+            unknown = set(event_types) - set(EVENT_TYPES)
+            if unknown:
+                raise ValueError(f"Unknown event types: {', '.join(sorted(unknown))}")
+            event_types = frozenset(event_types)
+        self._subscribers.append((callback, event_types))
+
+    def unsubscribe(self, callback: Callable[[Dict], None]):
+        """Stop calling a subscribed callback"""
+        self._subscribers = [(cb, types) for cb, types in self._subscribers if cb != callback]
+
+    def _emit(self, event_type: str, key: str, record: Dict, changes: Optional[Dict] = None):
+        """Queue an event until the transaction commits, or publish it now outside one"""
+        event = {
+            'type': event_type,
+            'key': key,
+            'record': copy_record(record),
+            'changes': copy.deepcopy(changes),
+            'at': datetime.now().isoformat(),
+        }
+        pending = getattr(self._tx, 'events', None)
+        if pending is not None:
+            pending.append(event)
+        else:
+            self._publish([event])
+
+    def _publish(self, events: List[Dict]):
+        """Append committed events to the durable log (if the store keeps one), then notify subscribers"""
+        if not events:
+            return
+        if self.durable_events:
+            self.event_log.append(events)
+        for event in events:
+            for callback, event_types in list(self._subscribers):
+                if event_types is not None and event['type'] not in event_types:
+                    continue
+                try:
+                    callback(event)
+                except Exception as e:
+                    # The change is already committed - a failing subscriber mustn't fail the caller
+                    print(f"Event subscriber failed on {event['type']}: {e}")
+
+    # Bulk access
+    def iter_records(self, collection: str) -> Iterator[Tuple[str, Dict]]:
+        """Yield every (key, record) of a collection - backends stream them where they can"""
+        yield from self._all_records(collection).items()
+
+    def import_records(self, collection: str, records: Iterable[Tuple[str, Dict]]):
+        """Write (key, record) pairs as-is in one transaction, e.g. when migrating between backends"""
+        with self.transaction():
+            for key, record in records:
+                self._put_record(collection, key, record)
+
+    # Storage hooks
+    def _get_record(self, collection: str, key: str) -> Optional[Dict]:
+        """Get one record by key"""
+        raise NotImplementedError
+
+    def _get_records(self, collection: str, keys: List[str]) -> Dict[str, Dict]:
+        """Get several records by key in one call (missing keys are left out)"""
+        found = {}
+        for key in keys:
+            record = self._get_record(collection, key)
+            if record is not None:
+                found[key] = record
+        return found
+
+    def _all_records(self, collection: str) -> Dict[str, Dict]:
+        """Get all records of a collection keyed by id"""
+        raise NotImplementedError
+
+    def _find_records(self, collection: str, field, value) -> List[Dict]:
+        """Get all records whose field (or tuple of fields) equals value"""
+        return [record for record in self._all_records(collection).values() if field_value(record, field) == value]
+
+    def _find_unique(self, collection: str, field, value) -> Optional[Dict]:
+        """
+        The record holding a value of a unique field (or tuple of fields), if any.
+
+        Backends that commit optimistically check a miss again at commit: if another
+        writer committed a record with the value in the meantime, the commit raises
+        ConflictError and the retry finds that record.
+        """
+        found = self._find_records(collection, field, value)
+        if found:
+            return found[0]
+        absent = getattr(self._tx, 'absent', None)
+        if absent is not None:
+            absent.append((collection, field, value))
+        return None
+
+    def _page_records(self, collection: str, field: str, value, after: Optional[Tuple[str, str]],
+                      limit: int) -> List[Tuple[str, Dict]]:
+        """Up to limit (key, record) pairs whose field equals value, in page order past the position after"""
+        found = sorted(((key, record) for key, record in self._all_records(collection).items()
+                        if field_value(record, field) == value
+                        and (after is None or page_position(key, record) > after)),
+                       key=lambda item: page_position(*item))
+        return found[:limit]
+
+    def _put_record(self, collection: str, key: str, record: Dict):
+        """Insert or replace one record"""
+        raise NotImplementedError
+
+    def _modify_record(self, collection: str, key: str, mutate: Callable[[Dict], None]) -> Optional[Dict]:
+        """Apply mutate() to an existing record in place and save it; returns None if missing"""
+        raise NotImplementedError
+
+    def _delete_record(self, collection: str, key: str) -> bool:
+        """Delete one record; returns False if it did not exist"""
+        raise NotImplementedError
+
+    def _typed(self, collection: str, result):
+        """Convert a read's record (or list of records) to the collection's record type if enabled"""
+        if not self.record_types or result is None:
+            return result
+        from_dict = RECORD_TYPES[collection].from_dict
+        if isinstance(result, list):
+            return [from_dict(record) for record in result]
+        return from_dict(result)
+
+    def _page(self, collection: str, field: str, value, cursor: Optional[str],
+              limit: int) -> Tuple[List[Dict], Optional[str]]:
+        """One page of a field lookup and the cursor of the next page (None on the last page)"""
+        found = self._page_records(collection, field, value, decode_cursor(cursor), limit + 1)
+        next_cursor = encode_cursor(page_position(*found[limit - 1])) if len(found) > limit else None
+        return self._typed(collection, [record for _, record in found[:limit]]), next_cursor
 
     # User Management
     def get_user(self, phone_number: str) -> Optional[Dict]:
         """Get user by phone number"""
-        users = self._read_json(self.users_file)
-        return users.get(phone_number)
+        return self._typed('users', self._get_record('users', phone_number))
 
     def create_user(self, phone_number: str, user_type: str) -> Dict:
         """Create new user (farmer or farm_owner)"""
-        users = self._read_json(self.users_file)
-        users[phone_number] = {
+        user = {
             'phone': phone_number,
             'type': user_type,
             'created_at': datetime.now().isoformat(),
             'registered': False,
             'profile': {}
         }
-        self._write_json(self.users_file, users)
-        return users[phone_number]
+        self._put_record('users', phone_number, user)
+        return self._typed('users', user)
 
     def update_user(self, phone_number: str, updates: Dict):
         """Update user information"""
-        users = self._read_json(self.users_file)
-        if phone_number in users:
-            users[phone_number].update(updates)
-            self._write_json(self.users_file, users)
+        self._modify_record('users', phone_number, lambda user: user.update(updates))
 
     def update_user_profile(self, phone_number: str, profile_data: Dict):
         """Update user profile"""
-        users = self._read_json(self.users_file)
-        if phone_number in users:
-            users[phone_number]['profile'].update(profile_data)
-            self._write_json(self.users_file, users)
-            return True
-        return False
+        user = self._modify_record('users', phone_number, lambda user: user['profile'].update(profile_data))
+        if user is None:
+            return False
+        self._emit('user_profile_updated', phone_number, user, changes=profile_data)
+        return True
 
     # Job Management
     def create_job(self, job_data: Dict) -> str:
         """Create new job posting"""
-        jobs = self._read_json(self.jobs_file)
-        job_id = f"JOB_{len(jobs) + 1}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        jobs[job_id] = {
+        job_id = new_id('JOB')
+        job = {
             'job_id': job_id,
             'created_at': datetime.now().isoformat(),
             'status': 'open',
+            'application_counts': {'total': 0},
             **job_data
         }
-        self._write_json(self.jobs_file, jobs)
+        job['effective_rate'] = effective_rate(job)
+        self._put_record('jobs', job_id, job)
+        self._emit('job_created', job_id, job)
         return job_id
 
-    def get_job(self, job_id: str) -> Optional[Dict]:
-        """Get job by ID"""
-        jobs = self._read_json(self.jobs_file)
-        return jobs.get(job_id)
+    def create_jobs_bulk(self, jobs: Iterable[Dict], batch_size: int = 10000) -> List[str]:
+        """
+        Create many jobs, one transaction per batch_size jobs; returns the new job IDs in order.
+
+        Each batch costs one write per collection file (a create_job() loop rewrites
+        jobs.json per job), and job_created events are published as each batch commits.
+        """
+        job_ids = []
+        batch = []
+        for job in jobs:
+            batch.append(job)
+            if len(batch) >= batch_size:
+                job_ids.extend(self._create_job_batch(batch))
+                batch = []
+        if batch:
+            job_ids.extend(self._create_job_batch(batch))
+        return job_ids
+
+    def _create_job_batch(self, jobs: List[Dict]) -> List[str]:
+        """Create a list of jobs in one transaction"""
+        with self.transaction():
+            return [self.create_job(job) for job in jobs]
+
+    def get_job(self, job_id: str, include_archived: bool = False) -> Optional[Dict]:
+        """Get job by ID (falling back to the archive if include_archived)"""
+        job = self._get_record('jobs', job_id)
+        if job is None and include_archived:
+            job = self.archive.get_job(job_id)
+        return self._typed('jobs', job)
+
+    def get_jobs(self, job_ids: List[str]) -> List[Dict]:
+        """Get several jobs in one batch, in the order given (unknown IDs are skipped)"""
+        found = self._get_records('jobs', job_ids)
+        return self._typed('jobs', [found[job_id] for job_id in job_ids if job_id in found])
 
     def get_open_jobs(self) -> List[Dict]:
         """Get all open jobs"""
-        jobs = self._read_json(self.jobs_file)
-        return [job for job in jobs.values() if job.get('status') == 'open']
+        return self._typed('jobs', self._find_records('jobs', 'status', 'open'))
+
+    def get_jobs_by_owner(self, owner_phone: str) -> List[Dict]:
+        """Get all jobs posted by a farm owner"""
+        return self._typed('jobs', self._find_records('jobs', 'owner_phone', owner_phone))
+
+    def get_open_jobs_page(self, cursor: Optional[str] = None,
+                           limit: int = PAGE_SIZE) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of open jobs, oldest first, and an opaque cursor for the next page
+        (None on the last page). Pass the cursor back to continue.
+        """
+        return self._page('jobs', 'status', 'open', cursor, limit)
+
+    def get_jobs_by_owner_page(self, owner_phone: str, cursor: Optional[str] = None,
+                               limit: int = PAGE_SIZE) -> Tuple[List[Dict], Optional[str]]:
+        """One page of a farm owner's jobs, oldest first, and the cursor for the next page"""
+        return self._page('jobs', 'owner_phone', owner_phone, cursor, limit)
 
     def update_job(self, job_id: str, updates: Dict):
         """Update job information"""
-        jobs = self._read_json(self.jobs_file)
-        if job_id in jobs:
-            jobs[job_id].update(updates)
-            self._write_json(self.jobs_file, jobs)
+        def update(job):
+            job.update(updates)
+            job['effective_rate'] = effective_rate(job)
+
+        job = self._modify_record('jobs', job_id, update)
+        if job is not None:
+            self._emit('job_updated', job_id, job, changes=updates)
 
     # Conversation State Management
-    def get_conversation_state(self, phone_number: str) -> Optional[Dict]:
-        """Get conversation state for user"""
-        conversations = self._read_json(self.conversations_file)
-        return conversations.get(phone_number)
+    def get_conversation_state(self, phone_number: str, include_expired: bool = False) -> Optional[Dict]:
+        """Get conversation state for user (None once it has expired, unless include_expired)"""
+        state = self._get_record('conversations', phone_number)
+        if state and not include_expired and self.conversation_expired(state):
+            return None
+        return self._typed('conversations', state)
+
+    def conversation_expired(self, state) -> bool:
+        """True if a conversation state (dict or ConversationState) hasn't been updated within conversation_ttl"""
+        updated_at = state.get('updated_at') if isinstance(state, dict) else state.updated_at
+        if not self.conversation_ttl or not updated_at:
+            return False
+        age = datetime.now() - datetime.fromisoformat(updated_at)
+        return age.total_seconds() > self.conversation_ttl
 
     def set_conversation_state(self, phone_number: str, state: str, data: Dict = None):
         """Set conversation state for user"""
-        conversations = self._read_json(self.conversations_file)
-        conversations[phone_number] = {
+        self._put_record('conversations', phone_number, {
             'state': state,
             'data': data or {},
             'updated_at': datetime.now().isoformat()
-        }
-        self._write_json(self.conversations_file, conversations)
+        })
 
     def clear_conversation_state(self, phone_number: str):
         """Clear conversation state"""
-        conversations = self._read_json(self.conversations_file)
-        if phone_number in conversations:
-            del conversations[phone_number]
-            self._write_json(self.conversations_file, conversations)
+        self._delete_record('conversations', phone_number)
+
+    def sweep_conversations(self) -> int:
+        """Delete every expired conversation state in one transaction; returns how many"""
+        def sweep():
+            expired = [phone for phone, state in self._all_records('conversations').items()
+                       if self.conversation_expired(state)]
+            for phone in expired:
+                self._delete_record('conversations', phone)
+            return len(expired)
+
+        return self.run_in_transaction(sweep)
+
+    def start_conversation_sweeper(self, interval: float = 60 * 60) -> threading.Thread:
+        """Run sweep_conversations every interval seconds on a daemon thread"""
+        return self._run_periodically('conversation-sweeper', interval, self.sweep_conversations)
+
+    def _run_periodically(self, name: str, interval: float, task: Callable[[], int]) -> threading.Thread:
+        """Call task every interval seconds on a daemon thread until stop_background_tasks()"""
+        def loop():
+            while not self._background_stop.wait(interval):
+                try:
+                    done = task()
+                except (OSError, ConflictError) as e:
+                    print(f"{name} failed: {e}")
+                    continue
+                if done:
+                    print(f"{name}: processed {done} records")
+
+        thread = threading.Thread(target=loop, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def stop_background_tasks(self):
+        """Stop the threads started by start_conversation_sweeper / start_job_archiver"""
+        self._background_stop.set()
 
     # Job Matching
-    def create_match(self, job_id: str, farmer_phone: str, status: str = 'pending'):
-        """Create job match"""
-        matches = self._read_json(self.matches_file)
-        match_id = f"MATCH_{len(matches) + 1}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        matches[match_id] = {
-            'match_id': match_id,
-            'job_id': job_id,
-            'farmer_phone': farmer_phone,
-            'status': status,
-            'created_at': datetime.now().isoformat()
-        }
-        self._write_json(self.matches_file, matches)
-        return match_id
+    def create_match(self, job_id: str, farmer_phone: str, status: str = 'pending') -> Optional[str]:
+        """
+        Create job match (and count it on the job, atomically); None if accepted into a filled job.
 
-    def get_farmer_matches(self, farmer_phone: str) -> List[Dict]:
-        """Get all matches for a farmer"""
-        matches = self._read_json(self.matches_file)
-        return [match for match in matches.values() if match['farmer_phone'] == farmer_phone]
+        A farmer has at most one match per job: if one exists (a double tap, a retried
+        webhook) its ID is returned and nothing changes. The check is a lookup in the
+        (farmer_phone, job_id) index; of two concurrent creations the later commit
+        conflicts and its retry finds the match (see _find_unique).
+        """
+        def create():
+            existing = self._find_unique('matches', FARMER_JOB, (farmer_phone, job_id))
+            if existing:
+                return existing['match_id']
+            if not self._move_application(job_id, None, status):
+                return None
+            match_id = new_id('MATCH')
+            match = {
+                'match_id': match_id,
+                'job_id': job_id,
+                'farmer_phone': farmer_phone,
+                'status': status,
+                'created_at': datetime.now().isoformat()
+            }
+            self._put_record('matches', match_id, match)
+            self._emit('match_created', match_id, match)
+            return match_id
+
+        return self.run_in_transaction(create)
+
+    def get_farmer_matches(self, farmer_phone: str, include_archived: bool = False) -> List[Dict]:
+        """Get all matches for a farmer (archived ones first if include_archived)"""
+        matches = self._find_records('matches', 'farmer_phone', farmer_phone)
+        if include_archived:
+            live = {match['match_id'] for match in matches}
+            matches = [match for match in self.archive.get_farmer_matches(farmer_phone)
+                       if match['match_id'] not in live] + matches
+        return self._typed('matches', matches)
+
+    def get_farmer_matches_page(self, farmer_phone: str, cursor: Optional[str] = None, limit: int = PAGE_SIZE,
+                                include_archived: bool = False) -> Tuple[List[Dict], Optional[str]]:
+        """One page of a farmer's matches, oldest first (archived ones included if asked), and the next cursor"""
+        after = decode_cursor(cursor)
+        found = self._page_records('matches', 'farmer_phone', farmer_phone, after, limit + 1)
+        if include_archived:
+            merged = {match['match_id']: match for match in self.archive.get_farmer_matches(farmer_phone)
+                      if after is None or page_position(match['match_id'], match) > after}
+            merged.update(found)
+            found = sorted(merged.items(), key=lambda item: page_position(*item))[:limit + 1]
+        next_cursor = encode_cursor(page_position(*found[limit - 1])) if len(found) > limit else None
+        return self._typed('matches', [record for _, record in found[:limit]]), next_cursor
 
     def get_job_matches(self, job_id: str) -> List[Dict]:
         """Get all matches for a job"""
-        matches = self._read_json(self.matches_file)
-        return [match for match in matches.values() if match['job_id'] == job_id]
-
-    def update_match(self, match_id: str, updates: Dict):
-        """Update match status"""
-        matches = self._read_json(self.matches_file)
-        if match_id in matches:
-            matches[match_id].update(updates)
-            self._write_json(self.matches_file, matches)
+        return self._typed('matches', self._find_records('matches', 'job_id', job_id))
+
+    def get_match(self, farmer_phone: str, job_id: str) -> Optional[Dict]:
+        """A farmer's match for a job, if they have applied"""
+        found = self._find_records('matches', FARMER_JOB, (farmer_phone, job_id))
+        return self._typed('matches', found[0]) if found else None
+
+    def update_match(self, match_id: str, updates: Dict) -> bool:
+        """Update match status (and its job's counters, atomically); False if missing or accepted into a filled job"""
+        def update():
+            old = self._get_record('matches', match_id)
+            if old is None:
+                return False
+            new = {**old, **updates}
+            if new.get('job_id') == old.get('job_id'):
+                if new.get('status') != old.get('status') and not self._move_application(
+                        old.get('job_id'), old.get('status'), new.get('status')):
+                    return False
+            else:
+                if not self._move_application(new.get('job_id'), None, new.get('status')):
+                    return False
+                self._move_application(old.get('job_id'), old.get('status'), None)
+            self._modify_record('matches', match_id, lambda match: match.update(updates))
+            return True
+
+        return self.run_in_transaction(update)
+
+    def _move_application(self, job_id: str, old_status: Optional[str], new_status: Optional[str]) -> bool:
+        """
+        Move one application between its job's counters (old_status None: new, new_status None: removed).
+
+        Entering 'accepted' takes one of the job's workers_needed spots and the last one
+        marks the job 'filled'; leaving it gives the spot back. Returns False, changing
+        nothing, if there is no spot left. Callers run this inside a transaction, so two
+        writers taking the same spot conflict at commit and the retry sees the new count.
+        """
+        job = self._get_record('jobs', job_id)
+        if job is None:
+            return True
+        taken = (new_status == 'accepted') - (old_status == 'accepted')
+        spots = job.get('workers_needed')
+        changes = {}
+        if taken and isinstance(spots, int):
+            if taken > 0 and (spots < 1 or job.get('status') != 'open'):
+                return False
+            changes['workers_needed'] = spots - taken
+            if spots - taken == 0:
+                changes['status'] = 'filled'
+            elif job.get('status') == 'filled':
+                changes['status'] = 'open'
+            job.update(changes)
+
+        counts = job.get('application_counts')
+        if counts is not None:  # None: job predates the counters - rebuild_application_counts() fills them in
+            counts['total'] = counts.get('total', 0) + (old_status is None) - (new_status is None)
+            for status, delta in ((old_status, -1), (new_status, 1)):
+                if status is not None:
+                    counts[status] = counts.get(status, 0) + delta
+                    if not counts[status]:
+                        del counts[status]
+        elif not changes:
+            return True
+
+        self._put_record('jobs', job_id, job)
+        if changes:
+            self._emit('job_updated', job_id, job, changes=changes)
+        return True
+
+    def rebuild_application_counts(self) -> int:
+        """Recompute every job's application counters from the matches in one transaction; returns jobs fixed"""
+        def rebuild():
+            counts = {}
+            for match in self._all_records('matches').values():
+                job_counts = counts.setdefault(match['job_id'], {'total': 0})
+                job_counts['total'] += 1
+                job_counts[match['status']] = job_counts.get(match['status'], 0) + 1
+
+            fixed = 0
+            for job_id, job in self._all_records('jobs').items():
+                expected = counts.get(job_id, {'total': 0})
+                if job.get('application_counts') != expected:
+                    self._modify_record('jobs', job_id, lambda job, expected=expected: job.update(
+                        application_counts=expected))
+                    fixed += 1
+            return fixed
+
+        return self.run_in_transaction(rebuild)
+
+    # Archive
+    @property
+    def archive(self) -> JobArchive:
+        """Archive of old jobs and matches in <data_dir>/archive"""
+        if self._archive is None:
+            self._archive = JobArchive(self.data_dir)
+        return self._archive
+
+    def archive_jobs(self, older_than_days: Optional[float] = None) -> int:
+        """Move jobs that are no longer open and older than the cutoff, with their matches, to the archive"""
+        days = self.archive_after_days if older_than_days is None else older_than_days
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+
+        def move():
+            jobs = {job_id: job for job_id, job in self._all_records('jobs').items()
+                    if job.get('status') != 'open' and job.get('created_at', '') < cutoff}
+            matches = {match['match_id']: match for job_id in jobs
+                       for match in self._find_records('matches', 'job_id', job_id)}
+            if not jobs:
+                return 0
+            # Archive first: if the commit fails, the records are still live and re-archiving is harmless
+            self.archive.add(jobs, matches)
+            for match_id in matches:
+                self._delete_record('matches', match_id)
+            for job_id in jobs:
+                self._delete_record('jobs', job_id)
+            return len(jobs)
+
+        return self.run_in_transaction(move)
+
+    def start_job_archiver(self, interval: float = 24 * 60 * 60) -> threading.Thread:
+        """Run archive_jobs every interval seconds on a daemon thread"""
+        return self._run_periodically('job-archiver', interval, self.archive_jobs)
+
+
+class DataStore(BaseDataStore):
+    """
+    JSON file backend - one file per collection, rewritten on every change.
+
+    Parsed collections are cached in memory and written through on mutation.
+    A cached collection is reused only while its file's (mtime, size, inode)
+    signature is unchanged, so edits by another process or by hand are still picked up.
+
+    Writers take an exclusive per-file lock (<file>.lock, fcntl.flock) that
+    also holds the file's generation number, so several threads or worker processes
+    can share one data directory. Single writes serialize on the lock; a transaction
+    that loses a race on the same record raises ConflictError and can be retried.
+
+    Conversation state is written on every message, so it is split by a hash of the
+    phone number into conversation_shards files (data/conversations/<i>-of-<n>.json);
+    users only contend when their phones land in the same shard.
+
+    users.json and jobs.json are written with an offset index (<file>.idx) giving the
+    byte range of every record. Point lookups on a file that isn't loaded (e.g. after
+    another process wrote it) mmap the file and decode just the records they need.
+
+    With record_types=True, reads return the slotted types from records.py
+    instead of dicts.
+    """
+
+    def __init__(self, data_dir='data', cache=True, serializer: Optional[str] = None,
+                 conversation_shards: int = 16, record_types: bool = False):
+        super().__init__()
+        self.record_types = record_types
+        self.data_dir = data_dir
+        self.cache = cache
+        self.conversation_shards = conversation_shards
+        # Format for writes (see serializers.py); reads accept every format
+        self.serializer = serializer or os.environ.get('FARMCONNECT_FORMAT', 'json')
+        serializers.dumps({}, self.serializer)  # fail fast on unknown or unavailable formats
+        self._cache = {}  # filepath -> (file signature, parsed records)
+        self._parsing = {}  # filepath -> lock held while the file is parsed into the cache
+        self._indexes = {}  # filepath -> (records dict the indexes describe, {field: FieldIndex})
+        self._held = threading.local()  # locks held by the current thread
+        os.makedirs(data_dir, exist_ok=True)
+
+        self.users_file = os.path.join(data_dir, 'users.json')
+        self.jobs_file = os.path.join(data_dir, 'jobs.json')
+        self.matches_file = os.path.join(data_dir, 'matches.json')
+        self.conversations_dir = os.path.join(data_dir, 'conversations')
+        os.makedirs(self.conversations_dir, exist_ok=True)
+        self._thread_locks = {filepath: threading.Lock() for filepath in self.data_files()}
+        self._offset_indexed = {self.users_file, self.jobs_file}
+        self._offsets = {}  # index filepath -> (file signature, parsed offset index)
+
+        # Initialize files if they don't exist (shards are created on first write)
+        self._init_file(self.users_file, {})
+        self._init_file(self.jobs_file, {})
+        self._init_file(self.matches_file, {})
+        self._migrate_conversations()
+
+    def _init_file(self, filepath, default_data):
+        """Initialize JSON file with default data if it doesn't exist"""
+        if not os.path.exists(filepath):
+            with open(filepath, 'wb') as f:
+                f.write(serializers.dumps(default_data, self.serializer))
+
+    def _read_json(self, filepath):
+        """Read a collection file (JSON or any other supported format)"""
+        try:
+            with open(filepath, 'rb') as f:
+                return serializers.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_json(self, filepath, data):
+        """Write a collection file (via a temp file + rename, so readers never see a partial file)"""
+        tmp_path = f'{filepath}.{os.getpid()}.{threading.get_ident()}.tmp'
+        raw, offsets = serializers.dumps_indexed(data, self.serializer)
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, filepath)
+        if filepath in self._offset_indexed:
+            self._write_offsets(filepath, offsets)
+
+    # Offset index
+    def _write_offsets(self, filepath, offsets: Optional[Dict]):
+        """Store each record's byte range next to a just-written collection file (<file>.idx)"""
+        index_path = f'{filepath}.idx'
+        if offsets is None:
+            # Format without byte ranges (msgpack) - an old index would just be ignored, but drop it
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            return
+        stat = os.stat(filepath)
+        index = {'signature': [stat.st_mtime_ns, stat.st_size, stat.st_ino], 'offsets': offsets}
+        tmp_path = f'{index_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(serializers.dumps(index, 'compact'))
+        os.replace(tmp_path, index_path)
+
+    def _read_offsets(self, filepath) -> Optional[Dict]:
+        """Parsed offset index of a collection file, or None if there is none"""
+        index_path = f'{filepath}.idx'
+        signature = self._file_signature(index_path)
+        if signature is None:
+            return None
+        cached = self._offsets.get(index_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(index_path, 'rb') as f:
+                index = serializers.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+        self._offsets[index_path] = (signature, index)
+        return index
+
+    def _read_records(self, filepath, keys: List[str]) -> Optional[Dict[str, Dict]]:
+        """Decode only the given records through the offset index; None if the index is missing or stale"""
+        index = self._read_offsets(filepath)
+        if index is None:
+            return None
+        try:
+            with open(filepath, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if [stat.st_mtime_ns, stat.st_size, stat.st_ino] != index['signature'] or not stat.st_size:
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    found = {}
+                    for key in keys:
+                        span = index['offsets'].get(key)
+                        if span is not None:
+                            found[key] = serializers.loads(data[span[0]:span[1]])
+                    return found
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _lookup(self, filepath, keys: List[str]) -> Dict[str, Dict]:
+        """Records for keys as seen by this thread, decoded one by one if the file isn't loaded"""
+        working = getattr(self._tx, 'files', None)
+        if working is not None:
+            loaded = filepath in working
+        else:
+            cached = self._cache.get(filepath) if self.cache else None
+            loaded = cached is not None and cached[0] == self._file_signature(filepath)
+        if not loaded and filepath in self._offset_indexed:
+            generation = self._generation(filepath) if working is not None else None
+            found = self._read_records(filepath, keys)
+            if found is not None:
+                if working is not None:
+                    # Part of the commit base if this transaction later writes the file (see _load)
+                    generation, seen = self._tx.reads.setdefault(filepath, (generation, {}))
+                    from_dict = RECORD_TYPES[self._file_collection(filepath)].from_dict
+                    for key in keys:
+                        if key not in seen:
+                            seen[key] = from_dict(found[key]) if key in found else None
+                return found
+
+        records = self._load(filepath)
+        return {key: records[key].to_dict() for key in keys if key in records}
+
+    def rewrite_files(self):
+        """Rewrite every collection file in this store's serializer format"""
+        for filepath in self.data_files():
+            if os.path.exists(filepath):
+                with self._locked(filepath) as fd:
+                    self._write_changes(filepath, fd, {})
+
+    def data_files(self) -> List[str]:
+        """Paths of every file backing the store (conversation shards may not exist yet)"""
+        return [filepath for collection in COLLECTIONS for filepath in self._collection_files(collection)]
+
+    def _collection_file(self, collection: str) -> str:
+        """Path of the JSON file holding an unsharded collection"""
+        return os.path.join(self.data_dir, f'{collection}.json')
+
+    def _collection_files(self, collection: str) -> List[str]:
+        """Paths of all files holding a collection"""
+        if collection != 'conversations':
+            return [self._collection_file(collection)]
+        return [self._shard_file(shard) for shard in range(self.conversation_shards)]
+
+    def _shard_file(self, shard: int) -> str:
+        """Path of one conversation shard - the shard count is part of the name"""
+        return os.path.join(self.conversations_dir, f'{shard:03d}-of-{self.conversation_shards:03d}.json')
+
+    def _file_collection(self, filepath) -> str:
+        """Name of the collection a file holds"""
+        if os.path.dirname(filepath) == self.conversations_dir:
+            return 'conversations'
+        return os.path.splitext(os.path.basename(filepath))[0]
+
+    def _record_file(self, collection: str, key: str) -> str:
+        """Path of the file that holds (or will hold) a record"""
+        if collection != 'conversations':
+            return self._collection_file(collection)
+        # crc32 rather than hash(): it has to agree across processes
+        return self._shard_file(zlib.crc32(key.encode('utf-8')) % self.conversation_shards)
+
+    def _migrate_conversations(self):
+        """Move states from conversations.json or shards of another count into the current shards"""
+        current = set(self._collection_files('conversations'))
+        legacy = [self._collection_file('conversations')] + sorted(
+            os.path.join(self.conversations_dir, name) for name in os.listdir(self.conversations_dir)
+            if name.endswith('.json') and os.path.join(self.conversations_dir, name) not in current
+        )
+        for path in legacy:
+            if not os.path.exists(path):
+                continue
+            self._thread_locks[path] = threading.Lock()
+            with self._locked(path):
+                moved = {}
+                for key, record in self._read_json(path).items():
+                    moved.setdefault(self._record_file('conversations', key), {})[key] = \
+                        ConversationState.from_dict(record)
+                for filepath, records in moved.items():
+                    with self._locked(filepath) as fd:
+                        existing = self._load_committed(filepath)
+                        # States already in the current shards are newer
+                        self._write_changes(filepath, fd, {
+                            key: record for key, record in records.items() if key not in existing
+                        })
+                if os.path.exists(path):
+                    os.remove(path)
+            if os.path.exists(f'{path}.lock'):
+                os.remove(f'{path}.lock')
+
+    # Locking
+    @contextmanager
+    def _locked(self, filepath):
+        """Exclusive per-collection lock shared by threads and processes; yields the lock file fd"""
+        held = getattr(self._held, 'fds', None)
+        if held is None:
+            held = self._held.fds = {}
+        if filepath in held:
+            yield held[filepath]
+            return
+
+        with self._thread_locks[filepath]:
+            fd = os.open(f'{filepath}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                held[filepath] = fd
+                yield fd
+            finally:
+                held.pop(filepath, None)
+                os.close(fd)  # also releases the flock
+
+    def _read_generation(self, fd) -> int:
+        """Generation number stored in a held lock file"""
+        os.lseek(fd, 0, os.SEEK_SET)
+        return int(os.read(fd, 32) or 0)
+
+    def _write_generation(self, fd, generation: int):
+        """Store a new generation number in a held lock file"""
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, str(generation).encode())
+
+    def generation(self, collection: str) -> int:
+        """Number of committed writes to a collection's files (0 if never written)"""
+        return sum(self._generation(filepath) for filepath in self._collection_files(collection))
+
+    def _generation(self, filepath) -> int:
+        """Generation of a collection file, read without taking the lock"""
+        try:
+            with open(f'{filepath}.lock', 'rb') as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            # ValueError: caught mid-update - callers only compare generations, and a mismatch is safe
+            return 0
+
+    # Cache
+    def _file_signature(self, filepath):
+        """(mtime, size, inode) of a file, used to detect changes made behind the cache"""
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _load(self, filepath) -> Dict[str, Record]:
+        """Records of a collection as seen by this thread (its transaction's working copy, if any)"""
+        working = getattr(self._tx, 'files', None)
+        if working is None:
+            return self._load_committed(filepath)
+        if filepath not in working:
+            # Generation first: if a write lands in between, commit sees a mismatch and checks the keys
+            generation = self._generation(filepath)
+            committed = self._load_committed(filepath)
+            base = committed
+            reads = self._tx.reads.pop(filepath, None)
+            if reads:
+                # Records read one by one earlier count as of that read, so changes since then conflict
+                generation, seen = reads
+                base = {**committed, **seen}
+            self._tx.bases[filepath] = (generation, base)
+            # Records are replaced rather than mutated in place, so a shallow copy isolates the transaction
+            working[filepath] = dict(committed)
+        return working[filepath]
+
+    def _load_committed(self, filepath) -> Dict[str, Record]:
+        """Records of a collection file as slotted records - shared with the cache, never mutate it"""
+        if not self.cache:
+            return self._parse(filepath)
+
+        signature = self._file_signature(filepath)
+        cached = self._cache.get(filepath)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        # Concurrent misses on a collection share one parse: the rest wait, then find it cached
+        with self._parsing.setdefault(filepath, threading.Lock()):
+            signature = self._file_signature(filepath)
+            cached = self._cache.get(filepath)
+            if cached and cached[0] == signature:
+                return cached[1]
+            records = self._parse(filepath)
+            self._cache[filepath] = (signature, records)
+            return records
+
+    def _parse(self, filepath) -> Dict[str, Record]:
+        """Read a collection file into the slotted records the cache holds (see records.py)"""
+        from_dict = RECORD_TYPES[self._file_collection(filepath)].from_dict
+        return {key: from_dict(record) for key, record in self._read_json(filepath).items()}
+
+    def _store(self, filepath, records: Dict[str, Record]):
+        """Write a collection file and keep the cache in step with it"""
+        try:
+            self._write_json(filepath, {key: record.to_dict() for key, record in records.items()})
+        except BaseException:
+            self._cache.pop(filepath, None)
+            raise
+        if self.cache:
+            self._cache[filepath] = (self._file_signature(filepath), records)
+
+    def _write_changes(self, filepath, fd, updates: Dict[str, Record]):
+        """Apply changed keys to the latest file contents; caller holds the collection lock"""
+        old = self._load_committed(filepath)
+        # Copy-on-write: the cached dict may be in use by readers on other threads
+        records = dict(old)
+        for key, record in updates.items():
+            if record is DELETED:
+                records.pop(key, None)
+            else:
+                records[key] = record
+        self._store(filepath, records)
+        self._write_generation(fd, self._read_generation(fd) + 1)
+
+        # Carry the secondary indexes over to the new version instead of rebuilding them
+        entry = self._indexes.get(filepath)
+        if entry is not None and entry[0] is old:
+            for index in entry[1].values():
+                for key, record in updates.items():
+                    index.update(key, old.get(key), None if record is DELETED else record)
+            self._indexes[filepath] = (records, entry[1])
+
+    def _field_index(self, collection: str, field: str, committed: Dict[str, Record]) -> FieldIndex:
+        """Secondary index over the committed collection, rebuilt when the file was reloaded"""
+        filepath = self._collection_file(collection)
+        entry = self._indexes.get(filepath)
+        if entry is None or entry[0] is not committed:
+            entry = (committed, {name: FieldIndex(name, committed) for name in INDEXED_FIELDS[collection]})
+            self._indexes[filepath] = entry
+        return entry[1][field]
+
+    def _change(self, filepath, key: str, record):
+        """Put (or DELETE) one record - written now, or buffered until commit inside a transaction"""
+        if record is not DELETED:
+            # Cached as a slotted record; from_dict() copies, so the caller keeps its dict
+            record = RECORD_TYPES[self._file_collection(filepath)].from_dict(record)
+        changes = getattr(self._tx, 'changes', None)
+        if changes is None:
+            with self._locked(filepath) as fd:
+                self._write_changes(filepath, fd, {key: record})
+            return
+
+        records = self._load(filepath)
+        if record is DELETED:
+            records.pop(key, None)
+        else:
+            records[key] = record
+        changes.setdefault(filepath, {})[key] = record
+
+    def invalidate_cache(self):
+        """Drop all cached collections"""
+        self._cache.clear()
+
+    # Transactions
+    def _begin(self):
+        self._tx.files = {}
+        self._tx.bases = {}
+        self._tx.reads = {}
+        self._tx.changes = {}
+        self._tx.absent = []
+
+    def _commit(self):
+        changes, bases, absent = self._tx.changes, self._tx.bases, self._tx.absent
+        self._rollback()
+        watched = {}  # file -> unique values this transaction found missing there (see _find_unique)
+        for collection, field, value in absent if changes else ():
+            for filepath in self._collection_files(collection):
+                watched.setdefault(filepath, []).append((collection, field, value))
+
+        with ExitStack() as stack:
+            # Fixed lock order so two committing transactions can't deadlock
+            locks = {filepath: stack.enter_context(self._locked(filepath))
+                     for filepath in sorted(set(changes) | set(watched))}
+
+            for filepath, missing in watched.items():
+                # Checked whatever the generation: the lookup's index may predate the transaction's base
+                latest = self._load_committed(filepath)
+                for collection, field, value in missing:
+                    if field in INDEXED_FIELDS.get(collection, ()):
+                        added = self._field_index(collection, field, latest).keys(value)
+                    else:
+                        added = [key for key, record in latest.items() if field_value(record, field) == value]
+                    if added:
+                        raise ConflictError(f"{os.path.basename(filepath)}: {added[0]} was added concurrently")
+
+            for filepath, updates in changes.items():
+                base_generation, base_records = bases[filepath]
+                if self._read_generation(locks[filepath]) == base_generation:
+                    continue
+                # Someone committed since we read - only a conflict if they touched our records
+                latest = self._load_committed(filepath)
+                for key in updates:
+                    if latest.get(key) != base_records.get(key):
+                        raise ConflictError(f"{os.path.basename(filepath)}: {key} was modified concurrently")
+
+            for filepath, updates in changes.items():
+                self._write_changes(filepath, locks[filepath], updates)
+
+    def _rollback(self):
+        self._tx.files = self._tx.bases = self._tx.reads = self._tx.changes = self._tx.absent = None
+
+    def iter_records(self, collection):
+        """Stream the committed records of a collection from its files without loading them whole"""
+        for filepath in self._collection_files(collection):
+            if os.path.exists(filepath):
+                yield from serializers.iter_records(filepath)
+
+    # Storage hooks
+    def _get_record(self, collection, key):
+        return self._lookup(self._record_file(collection, key), [key]).get(key)
+
+    def _get_records(self, collection, keys):
+        by_file = {}
+        for key in keys:
+            by_file.setdefault(self._record_file(collection, key), []).append(key)
+        found = {}
+        for filepath, file_keys in by_file.items():
+            found.update(self._lookup(filepath, file_keys))
+        return found
+
+    def _all_records(self, collection):
+        records = {}
+        for filepath in self._collection_files(collection):
+            records.update((key, record.to_dict()) for key, record in self._load(filepath).items())
+        return records
+
+    def _indexed_view(self, collection: str, field: str):
+        """(index, this thread's records, keys changed in its transaction) for an indexed field"""
+        filepath = self._collection_file(collection)
+        committed = self._load_committed(filepath)
+        records = committed if not self.in_transaction else self._load(filepath)
+        changed = (getattr(self._tx, 'changes', None) or {}).get(filepath, ())
+        return self._field_index(collection, field, committed), records, changed
+
+    def _find_records(self, collection, field, value):
+        if field in INDEXED_FIELDS.get(collection, ()):
+            index, records, changed = self._indexed_view(collection, field)
+            found = index.lookup(records, value, changed)
+        else:
+            found = [record for filepath in self._collection_files(collection)
+                     for record in self._load(filepath).values() if field_value(record, field) == value]
+        return [record.to_dict() for record in found]
+
+    def _page_records(self, collection, field, value, after, limit):
+        if field not in INDEXED_FIELDS.get(collection, ()):
+            return super()._page_records(collection, field, value, after, limit)
+        index, records, changed = self._indexed_view(collection, field)
+        return [(key, record.to_dict()) for key, record in index.page(records, value, after, limit, changed)]
+
+    def _put_record(self, collection, key, record):
+        self._change(self._record_file(collection, key), key, record)
+
+    def _modify_record(self, collection, key, mutate):
+        filepath = self._record_file(collection, key)
+        if self.in_transaction:
+            current = self._load(filepath).get(key)
+            if current is None:
+                return None
+            record = current.to_dict()
+            mutate(record)
+            self._change(filepath, key, record)
+            return record
+
+        # Read-modify-write under the lock so concurrent updates can't be lost
+        with self._locked(filepath) as fd:
+            current = self._load_committed(filepath).get(key)
+            if current is None:
+                return None
+            record = current.to_dict()
+            mutate(record)
+            self._change(filepath, key, record)
+            return record
+
+    def _delete_record(self, collection, key):
+        filepath = self._record_file(collection, key)
+        if key not in self._load(filepath):
+            return False
+        self._change(filepath, key, DELETED)
+        return True
+
+
+def get_data_store(data_dir: str = 'data', backend: Optional[str] = None) -> BaseDataStore:
+    """
+    Factory function to get the configured storage backend.
+
+    The backend defaults to the FARMCONNECT_STORAGE environment variable:
+    'json' (default, easy to inspect during development), 'sqlite', 'log' or
+    'memory' (nothing persisted - tests and benchmarks).
+    """
+    backend = (backend or os.environ.get('FARMCONNECT_STORAGE', 'json')).lower()
+
+    if backend == 'json':
+        return DataStore(data_dir)
+    if backend == 'sqlite':
+        from sqlite_store import SQLiteDataStore
+        return SQLiteDataStore(data_dir)
+    if backend == 'log':
+        from log_store import LogDataStore
+        return LogDataStore(data_dir)
+    if backend == 'memory':
+        from memory_store import MemoryDataStore
+        return MemoryDataStore(data_dir)
+
+    raise ValueError(f"Unknown storage backend: {backend}")
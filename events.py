@@ -0,0 +1,148 @@
+"""
+Change events for FarmConnect data
+
+The data stores emit an event after every committed job_created, job_updated,
+match_created and user_profile_updated change. Events go to in-process
+subscribers (BaseDataStore.subscribe) and are appended to a durable log,
+data/events.log, one JSON line per event.
+
+An event's offset is the byte position just after its line, counted from the
+first event ever logged. A consumer remembers the last offset it processed and
+resumes from there:
+
+    log = EventLog('data')
+    log.consume('notifier', handle_event)   # processes everything new since the last run
+
+The log is trimmed once it grows past max_bytes: events every consumer has
+processed are dropped, and so are the oldest ones if that still leaves more than
+half of max_bytes (a consumer that far behind resumes at the oldest event kept).
+A trimmed file starts with a {"base": offset} line giving the offset of its first
+event, so offsets stay valid.
+"""
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - appends from one process are still whole lines
+    fcntl = None
+
+EVENT_TYPES = ('job_created', 'job_updated', 'match_created', 'user_profile_updated')
+
+# Size at which events.log is trimmed (see module docstring)
+EVENT_LOG_MAX_BYTES = 16 * 1024 * 1024
+
+
+class EventLog:
+    """Append-only, resumable log of change events"""
+
+    def __init__(self, data_dir='data', max_bytes: int = EVENT_LOG_MAX_BYTES):
+        self.path = os.path.join(data_dir, 'events.log')
+        self.offsets_dir = os.path.join(data_dir, 'event_offsets')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def append(self, events: List[Dict]):
+        """Append events as one write, so concurrent writers never interleave lines"""
+        raw = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events).encode('utf-8')
+        with self._lock:
+            with self._open_locked() as f:
+                f.write(raw)
+                f.flush()
+                # Trimming replaces the file, which needs the lock that only fcntl gives
+                if fcntl and os.fstat(f.fileno()).st_size > self.max_bytes:
+                    self._trim()
+
+    def _open_locked(self):
+        """The current log file, opened for appending under its lock"""
+        while True:
+            f = open(self.path, 'ab')
+            if not fcntl:
+                return f
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # A trim may have replaced the file while we waited - then lock the new one
+            if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                return f
+            f.close()
+
+    @staticmethod
+    def _header(f) -> Tuple[int, int]:
+        """(offset of the file's first event, length of its header line); files never trimmed have none"""
+        f.seek(0)
+        line = f.readline()
+        if line.startswith(b'{"base":') and line.endswith(b'\n'):
+            return json.loads(line)['base'], len(line)
+        return 0, 0
+
+    def _trim(self):
+        """Rewrite the log without the events it no longer needs to keep; caller holds the file lock"""
+        with open(self.path, 'rb') as f:
+            base, header = self._header(f)
+            end = base + os.fstat(f.fileno()).st_size - header
+            processed = min((self.load_offset(consumer) for consumer in self.consumers()), default=base)
+            start = max(processed, end - self.max_bytes // 2)
+            if start <= base:
+                return
+            # Start at a line boundary (consumer offsets always are one)
+            f.seek(header + start - base - 1)
+            f.readline()
+            start = base + f.tell() - header
+            tail = f.read()
+
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as out:
+            out.write(json.dumps({'base': start}).encode('utf-8') + b'\n')
+            out.write(tail)
+        os.replace(tmp_path, self.path)
+
+    def consumers(self) -> List[str]:
+        """Names of the consumers that have saved an offset"""
+        try:
+            names = os.listdir(self.offsets_dir)
+        except FileNotFoundError:
+            return []
+        return [name for name in names if not name.endswith('.tmp')]
+
+    def read(self, offset: int = 0) -> Iterator[Tuple[int, Dict]]:
+        """Yield (offset after the event, event) for every complete event after offset (or the oldest kept)"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            base, header = self._header(f)
+            offset = max(offset, base)
+            f.seek(header + offset - base)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    return  # still being written
+                offset += len(line)
+                yield offset, json.loads(line)
+
+    def load_offset(self, consumer: str) -> int:
+        """Offset a consumer has processed up to (0 if it never ran)"""
+        try:
+            with open(os.path.join(self.offsets_dir, consumer), 'r') as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def save_offset(self, consumer: str, offset: int):
+        """Record how far a consumer has processed"""
+        os.makedirs(self.offsets_dir, exist_ok=True)
+        path = os.path.join(self.offsets_dir, consumer)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, path)
+
+    def consume(self, consumer: str, handler: Callable[[Dict], None]) -> int:
+        """Pass every event a consumer hasn't seen to handler, saving progress after each; returns how many"""
+        count = 0
+        for offset, event in self.read(self.load_offset(consumer)):
+            handler(event)
+            self.save_offset(consumer, offset)
+            count += 1
+        return count
@@ -0,0 +1,44 @@
+"""
+Record ID allocation for FarmConnect
+
+IDs are ULID-style: a 48-bit millisecond timestamp and 80 random bits in
+Crockford base32, after a type prefix (JOB_01HZX3...). Allocation needs no
+storage access, IDs sort by creation time, and two processes would need the
+same millisecond and the same 80 random bits to collide.
+"""
+import base64
+import os
+import threading
+import time
+
+# Crockford base32 - no I, L, O or U
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# base64.b32encode() output (RFC 4648 alphabet) -> Crockford
+_FROM_RFC4648 = bytes.maketrans(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567', ALPHABET.encode('ascii'))
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+def new_id(prefix: str) -> str:
+    """Allocate a unique, time-ordered ID such as JOB_01HZX3T8K2Q4V6W8Y0A2C4E6G8"""
+    global _last_ms, _last_random
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms <= _last_ms:
+            # Same millisecond (or the clock stepped back) - keep IDs from this process increasing
+            now_ms = _last_ms
+            random_part = (_last_random + 1) % (1 << 80)
+            if random_part == 0:
+                now_ms += 1
+        else:
+            random_part = int.from_bytes(os.urandom(10), 'big')
+        _last_ms, _last_random = now_ms, random_part
+
+    # The 26 characters are the timestamp and random bits as one 130-bit number; b32encode
+    # works in 40-bit groups, so encode 160 bits and drop the 6 leading (zero) characters
+    encoded = base64.b32encode(((now_ms << 80) | random_part).to_bytes(20, 'big'))
+    return f"{prefix}_{encoded.translate(_FROM_RFC4648)[6:].decode('ascii')}"
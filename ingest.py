@@ -0,0 +1,175 @@
+"""
+Bulk ingest of job postings from partner feeds
+
+Reads a CSV (header row) or JSONL (one object per line) feed, validates and
+normalizes the rows into the job format the bot writes in a pool of worker
+processes, and creates the valid jobs with create_jobs_bulk() in batched
+transactions. Rejected rows are reported with their line number.
+
+    python ingest.py feed.csv [--data-dir data] [--workers 4] [--batch-size 10000]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from data_store import BaseDataStore, get_data_store
+from migrate import batches
+
+REQUIRED_FIELDS = ('work_type', 'workers_needed', 'location', 'owner_phone')
+
+# Accepted spellings of the payment types the bot offers
+PAYMENT_TYPES = {
+    'per hour': 'per hour', 'hour': 'per hour', 'hourly': 'per hour',
+    'per day': 'per day', 'day': 'per day', 'daily': 'per day',
+    'per task': 'per task', 'task': 'per task', 'per piece': 'per task', 'piece': 'per task',
+}
+
+# Allocated by the store, never taken from a feed
+RESERVED_FIELDS = ('job_id', 'created_at', 'status', 'application_counts', 'effective_rate')
+
+
+def read_feed(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, object]]:
+    """Yield (line number, row) from a feed - a dict per CSV row, the raw text per JSONL line"""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        elif fmt == 'jsonl':
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield number, line
+        else:
+            raise ValueError(f"Unknown feed format: {fmt}")
+
+
+def _number(job: Dict, field: str, convert):
+    """Parse a numeric field in place, rejecting values that aren't positive"""
+    try:
+        value = convert(str(job[field]).replace('$', '').replace(',', '').strip())
+    except ValueError:
+        raise ValueError(f"{field} is not a number: {job[field]!r}")
+    if value <= 0:
+        raise ValueError(f"{field} must be positive")
+    job[field] = value
+
+
+def normalize_job(raw: Dict) -> Dict:
+    """Validate one feed row and convert it to the job format the bot writes; raises ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError("row is not an object")
+    job = {}
+    for key, value in raw.items():
+        if key is None:
+            raise ValueError("more values than header columns")
+        key = key.strip().lower().replace(' ', '_')
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in ('', None) and key not in RESERVED_FIELDS:
+            job[key] = value
+
+    missing = [field for field in REQUIRED_FIELDS if field not in job]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    _number(job, 'workers_needed', int)
+
+    if 'payment_amount' in job:
+        _number(job, 'payment_amount', float)
+        payment_type = PAYMENT_TYPES.get(str(job.get('payment_type', '')).lower())
+        if payment_type is None:
+            raise ValueError(f"unknown payment_type: {job.get('payment_type')!r}")
+        job['payment_type'] = payment_type
+    elif 'pay_rate' in job:
+        _number(job, 'pay_rate', float)  # legacy hourly rate
+    else:
+        raise ValueError("missing payment_amount or pay_rate")
+
+    # Same matching fallback as jobs posted through the bot
+    job.setdefault('hours', 'full-time' if job.get('payment_type') == 'per day' else 'flexible')
+    return job
+
+
+def normalize_rows(rows: List[Tuple[int, object]]) -> List[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Worker body: (line, job, None) for valid rows and (line, None, reason) for rejected ones"""
+    results = []
+    for line, row in rows:
+        try:
+            if isinstance(row, str):
+                try:
+                    row = json.loads(row)
+                except ValueError as e:
+                    raise ValueError(f"invalid JSON: {e}")
+            results.append((line, normalize_job(row), None))
+        except ValueError as e:
+            results.append((line, None, str(e)))
+    return results
+
+
+def _in_order(pool: ProcessPoolExecutor, chunks: Iterable[List], ahead: int) -> Iterator[List]:
+    """Results of normalize_rows for each chunk, in order, with at most ahead chunks in flight"""
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(normalize_rows, chunk))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def ingest(store: BaseDataStore, path: str, fmt: Optional[str] = None, workers: Optional[int] = None,
+           batch_size: int = 10000, chunk_size: int = 1000) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """Validate a feed and create its valid jobs; returns (new job IDs, [(line, reason) of rejected rows])"""
+    workers = workers or os.cpu_count() or 1
+    rejected = []
+
+    def valid_jobs(results):
+        for chunk in results:
+            for line, job, error in chunk:
+                if error is None:
+                    yield job
+                else:
+                    rejected.append((line, error))
+
+    chunks = batches(read_feed(path, fmt), chunk_size)
+    if workers == 1:
+        job_ids = store.create_jobs_bulk(valid_jobs(map(normalize_rows, chunks)), batch_size)
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            job_ids = store.create_jobs_bulk(valid_jobs(_in_order(pool, chunks, workers * 2)), batch_size)
+    return job_ids, rejected
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create job postings from a CSV or JSONL feed")
+    parser.add_argument('feed')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="default: from the file extension")
+    parser.add_argument('--workers', type=int, help="validation processes (default: CPU count)")
+    parser.add_argument('--batch-size', type=int, default=10000, help="jobs per transaction")
+    args = parser.parse_args()
+
+    store = get_data_store(args.data_dir)
+    start = time.perf_counter()
+    try:
+        job_ids, rejected = ingest(store, args.feed, args.format, args.workers, args.batch_size)
+    finally:
+        if hasattr(store, 'close'):
+            store.close()
+    elapsed = time.perf_counter() - start
+
+    rate = len(job_ids) / elapsed if elapsed else 0
+    print(f"Created {len(job_ids)} jobs in {elapsed:.2f}s ({rate:,.0f} jobs/s)")
+    if rejected:
+        print(f"Rejected {len(rejected)} rows:")
+        for line, reason in rejected[:20]:
+            print(f"  line {line}: {reason}")
+        if len(rejected) > 20:
+            print(f"  ... and {len(rejected) - 20} more")
+    sys.exit(1 if rejected else 0)
@@ -0,0 +1,193 @@
+"""
+Log-structured storage backend for FarmConnect chatbot
+
+Every mutation appends one compact JSON line to a per-collection log
+(data/<collection>.log) instead of rewriting the whole collection file.
+The current state, transactions and indexes are MemoryDataStore's, so only one
+process may open a data directory at a time (use the json or sqlite backend for
+multiple workers). A background compactor periodically writes a point-in-time
+snapshot (data/<collection>.snapshot.json) and truncates the log behind it, so
+startup loads the snapshot and only replays the log tail.
+"""
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from data_store import COLLECTIONS, DELETED
+from memory_store import MemoryDataStore
+from records import RECORD_TYPES, Record
+
+
+class LogDataStore(MemoryDataStore):
+    """Append-only log backend - writes cost O(record) instead of O(file)"""
+
+    durable_events = True
+
+    def __init__(self, data_dir='data', fsync=False, compact_interval: Optional[float] = 300):
+        self.data_dir = data_dir
+        self.fsync = fsync
+        os.makedirs(data_dir, exist_ok=True)
+        self._process_lock = self._lock_data_dir()
+
+        self._compact_lock = threading.Lock()
+        self._seq = {}
+        self._pending = {}  # log entries written since the last snapshot
+        super().__init__(data_dir)  # loads each collection through _initial_records
+        self._logs = {collection: open(self._log_file(collection), 'a', encoding='utf-8')
+                      for collection in COLLECTIONS}
+
+        self._stop = threading.Event()
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, args=(compact_interval,), name='log-compactor', daemon=True
+            )
+            self._compactor.start()
+
+    def _lock_data_dir(self):
+        """Hold an exclusive lock on the data directory - a second process would fork the state"""
+        lock = open(os.path.join(self.data_dir, 'log_store.lock'), 'w')
+        if fcntl:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                raise RuntimeError(f"{self.data_dir} is already in use by another LogDataStore")
+        return lock
+
+    def _log_file(self, collection: str) -> str:
+        """Path of the append-only log for a collection"""
+        return os.path.join(self.data_dir, f'{collection}.log')
+
+    def _snapshot_file(self, collection: str) -> str:
+        """Path of the latest snapshot for a collection"""
+        return os.path.join(self.data_dir, f'{collection}.snapshot.json')
+
+    def _load(self, collection: str) -> Tuple[Dict[str, Dict], int, int]:
+        """Load the snapshot and replay the log tail; returns (records, last seq, tail entries)"""
+        records, seq = {}, 0
+        try:
+            with open(self._snapshot_file(collection), 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            records, seq = snapshot['records'], snapshot['seq']
+        except FileNotFoundError:
+            pass
+
+        filepath = self._log_file(collection)
+        if not os.path.exists(filepath):
+            return records, seq, 0
+
+        snapshot_seq, replayed, valid_bytes = seq, 0, 0
+        with open(filepath, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Crash mid-append - everything from here on is unusable
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                valid_bytes += len(line)
+                # Entries already folded into the snapshot (crash before the log was truncated)
+                if snapshot_seq and entry.get('seq', 0) <= snapshot_seq:
+                    continue
+                if entry['op'] == 'put':
+                    records[entry['key']] = entry['record']
+                elif entry['op'] == 'del':
+                    records.pop(entry['key'], None)
+                seq = max(seq, entry.get('seq', seq + 1))
+                replayed += 1
+
+        if valid_bytes < os.path.getsize(filepath):
+            with open(filepath, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return records, seq, replayed
+
+    def _initial_records(self, collection: str) -> Dict[str, Record]:
+        records, self._seq[collection], self._pending[collection] = self._load(collection)
+        from_dict = RECORD_TYPES[collection].from_dict
+        return {key: from_dict(record) for key, record in records.items()}
+
+    def _apply(self, collection: str, changes: Dict[str, Record]):
+        """Append one log entry per changed key in a single write, then update the in-memory state"""
+        with self._lock:
+            lines = []
+            for key, record in changes.items():
+                self._seq[collection] += 1
+                if record is DELETED:
+                    entry = {'op': 'del', 'key': key, 'seq': self._seq[collection]}
+                else:
+                    entry = {'op': 'put', 'key': key, 'record': record.to_dict(), 'seq': self._seq[collection]}
+                lines.append(json.dumps(entry, separators=(',', ':')) + '\n')
+
+            log = self._logs[collection]
+            log.write(''.join(lines))
+            log.flush()
+            if self.fsync:
+                os.fsync(log.fileno())
+            self._pending[collection] += len(lines)
+            super()._apply(collection, changes)
+
+    # Compaction
+    def compact(self, collection: Optional[str] = None):
+        """Snapshot collections (all by default) and truncate their logs behind the snapshot"""
+        with self._compact_lock:
+            for name in ([collection] if collection else COLLECTIONS):
+                self._compact(name)
+
+    def _compact(self, collection: str):
+        """Snapshot one collection without holding the write lock during the dump"""
+        with self._lock:
+            if not self._pending[collection]:
+                return
+            # Records are replaced, never mutated in place, so a shallow copy is a consistent snapshot
+            records = dict(self._state[collection])
+            seq = self._seq[collection]
+            log_file = self._log_file(collection)
+            offset = os.path.getsize(log_file)
+
+        snapshot_file = self._snapshot_file(collection)
+        with open(snapshot_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'seq': seq, 'records': {key: record.to_dict() for key, record in records.items()}},
+                      f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(snapshot_file + '.tmp', snapshot_file)
+
+        # Keep only the entries appended while the snapshot was being written
+        with self._lock:
+            self._logs[collection].close()
+            with open(log_file, 'rb') as f:
+                f.seek(offset)
+                tail = f.read()
+            with open(log_file + '.tmp', 'wb') as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(log_file + '.tmp', log_file)
+            self._logs[collection] = open(log_file, 'a', encoding='utf-8')
+            self._pending[collection] = tail.count(b'\n')
+
+    def _compact_loop(self, interval: float):
+        """Background thread body - compact every interval seconds until closed"""
+        while not self._stop.wait(interval):
+            try:
+                self.compact()
+            except OSError as e:
+                print(f"Log compaction failed: {e}")
+
+    def close(self):
+        """Stop the compactor and close the log files"""
+        self._stop.set()
+        if self._compactor:
+            self._compactor.join()
+        with self._lock:
+            for log in self._logs.values():
+                log.close()
+        self._process_lock.close()
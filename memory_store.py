@@ -0,0 +1,157 @@
+"""
+In-memory storage backend for FarmConnect chatbot
+
+Keeps every collection in process memory, as the slotted records of records.py
+(reads return dicts built from them), and persists nothing, which makes it
+the fastest backend and a convenient one for tests and benchmarks. The archive
+still lives under data_dir; change events only reach in-process subscribers.
+
+LogDataStore builds on it, persisting each applied change to a log.
+"""
+import threading
+from typing import Dict, Optional
+
+from data_store import BaseDataStore, COLLECTIONS, ConflictError, DELETED, INDEXED_FIELDS, FieldIndex, field_value
+from records import RECORD_TYPES, Record
+
+
+class MemoryDataStore(BaseDataStore):
+    """Volatile backend - all data is lost when the process exits"""
+
+    durable_events = False
+
+    def __init__(self, data_dir='data'):
+        super().__init__()
+        self.data_dir = data_dir
+        self._lock = threading.RLock()
+        self._state = {collection: self._initial_records(collection) for collection in COLLECTIONS}
+        self._indexes = {
+            collection: {field: FieldIndex(field, self._state[collection])
+                         for field in INDEXED_FIELDS.get(collection, ())}
+            for collection in COLLECTIONS
+        }
+
+    def _initial_records(self, collection: str) -> Dict[str, Record]:
+        """Records a collection starts with (none - subclasses load persisted ones)"""
+        return {}
+
+    def _apply(self, collection: str, changes: Dict[str, Record]):
+        """Write changed records (or DELETED) to the shared state"""
+        with self._lock:
+            state = self._state[collection]
+            indexes = self._indexes[collection].values()
+            for key, record in changes.items():
+                new = None if record is DELETED else record
+                for index in indexes:
+                    index.update(key, state.get(key), new)
+                if new is None:
+                    state.pop(key, None)
+                else:
+                    state[key] = new
+
+    def _records(self, collection: str) -> Dict[str, Record]:
+        """Records as seen by this thread (its transaction's working copy, if any)"""
+        working = getattr(self._tx, 'state', None)
+        if working is None:
+            return self._state[collection]
+        if collection not in working:
+            # Records are replaced rather than mutated in place, so a shallow copy isolates the transaction
+            with self._lock:
+                working[collection] = dict(self._state[collection])
+        return working[collection]
+
+    def _change(self, collection: str, key: str, record):
+        """Record a put (or DELETED) - applied now, or buffered until commit inside a transaction"""
+        if record is not DELETED:
+            # Held as a slotted record (see records.py); from_dict() copies, so the caller keeps its dict
+            record = RECORD_TYPES[collection].from_dict(record)
+        changes = getattr(self._tx, 'changes', None)
+        if changes is None:
+            self._apply(collection, {key: record})
+            return
+        records = self._records(collection)
+        # What this transaction saw before its first change to the key - checked again at commit
+        self._tx.bases.setdefault(collection, {}).setdefault(key, records.get(key))
+        if record is DELETED:
+            records.pop(key, None)
+        else:
+            records[key] = record
+        changes.setdefault(collection, {})[key] = record
+
+    # Transactions
+    def _begin(self):
+        self._tx.state = {}
+        self._tx.changes = {}
+        self._tx.bases = {}
+        self._tx.absent = []
+
+    def _commit(self):
+        changes, bases, absent = self._tx.changes, self._tx.bases, self._tx.absent
+        self._rollback()
+        with self._lock:
+            # Unique values this transaction found missing (see _find_unique) must still be missing
+            for collection, field, value in absent if changes else ():
+                index = self._indexes[collection].get(field)
+                if index is not None:
+                    added = index.keys(value)
+                else:
+                    added = [key for key, record in self._state[collection].items()
+                             if field_value(record, field) == value]
+                if added:
+                    raise ConflictError(f"{collection}: {added[0]} was added concurrently")
+            # Records are replaced, never mutated, so identity tells whether anyone committed over us
+            for collection, seen in bases.items():
+                state = self._state[collection]
+                for key, record in seen.items():
+                    if state.get(key) is not record:
+                        raise ConflictError(f"{collection}: {key} was modified concurrently")
+            for collection, updates in changes.items():
+                self._apply(collection, updates)
+
+    def _rollback(self):
+        self._tx.state = self._tx.changes = self._tx.bases = self._tx.absent = None
+
+    # Storage hooks
+    def _get_record(self, collection, key):
+        record = self._records(collection).get(key)
+        return None if record is None else record.to_dict()
+
+    def _all_records(self, collection):
+        return {key: record.to_dict() for key, record in self._records(collection).items()}
+
+    def _find_records(self, collection, field, value):
+        records = self._records(collection)
+        index = self._indexes[collection].get(field)
+        if index is not None:
+            changed = (getattr(self._tx, 'changes', None) or {}).get(collection, ())
+            found = index.lookup(records, value, changed)
+        else:
+            found = [record for record in records.values() if field_value(record, field) == value]
+        return [record.to_dict() for record in found]
+
+    def _page_records(self, collection, field, value, after, limit):
+        index = self._indexes[collection].get(field)
+        if index is None:
+            return super()._page_records(collection, field, value, after, limit)
+        changed = (getattr(self._tx, 'changes', None) or {}).get(collection, ())
+        found = index.page(self._records(collection), value, after, limit, changed)
+        return [(key, record.to_dict()) for key, record in found]
+
+    def _put_record(self, collection, key, record):
+        self._change(collection, key, record)
+
+    def _modify_record(self, collection, key, mutate) -> Optional[Dict]:
+        with self._lock:
+            record = self._get_record(collection, key)
+            if record is None:
+                return None
+            mutate(record)
+            self._change(collection, key, record)
+            return record
+
+    def _delete_record(self, collection, key):
+        with self._lock:
+            if key not in self._records(collection):
+                return False
+            self._change(collection, key, DELETED)
+            return True
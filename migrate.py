@@ -0,0 +1,92 @@
+"""
+Copy FarmConnect data between storage backends
+
+Streams every collection out of the JSON files (or any other backend) into
+the target backend in batched transactions, so memory stays bounded by the
+batch size, then verifies record counts and checksums on both sides.
+
+    python migrate.py [data_dir] [--to sqlite|log] [--batch-size 1000]
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from data_store import BaseDataStore, COLLECTIONS, DataStore, get_data_store
+
+
+def record_digest(key: str, record: Dict) -> int:
+    """64-bit digest of one record, independent of key order inside it"""
+    raw = json.dumps([key, record], sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return int.from_bytes(hashlib.sha256(raw).digest()[:8], 'big')
+
+
+def batches(records: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def checksum(records: Iterable[Tuple[str, Dict]]) -> Tuple[int, int]:
+    """(count, order-independent checksum) of a stream of records"""
+    count, total = 0, 0
+    for key, record in records:
+        count += 1
+        total = (total + record_digest(key, record)) % (1 << 64)
+    return count, total
+
+
+def copy_collection(source: BaseDataStore, dest: BaseDataStore, collection: str,
+                    batch_size: int = 1000) -> Tuple[int, int]:
+    """Stream one collection into dest, one transaction per batch; returns the source (count, checksum)"""
+    count, total = 0, 0
+    for batch in batches(source.iter_records(collection), batch_size):
+        dest.import_records(collection, batch)
+        count += len(batch)
+        for key, record in batch:
+            total = (total + record_digest(key, record)) % (1 << 64)
+    return count, total
+
+
+def migrate(source: BaseDataStore, dest: BaseDataStore, batch_size: int = 1000) -> bool:
+    """Copy every collection and verify it; prints a report and returns True if all match"""
+    ok = True
+    for collection in COLLECTIONS:
+        start = time.perf_counter()
+        expected = copy_collection(source, dest, collection, batch_size)
+        elapsed = time.perf_counter() - start
+        rate = expected[0] / elapsed if elapsed else 0
+        print(f"{collection}: copied {expected[0]} records in {elapsed:.2f}s ({rate:,.0f} records/s)")
+
+        actual = checksum(dest.iter_records(collection))
+        if actual == expected:
+            print(f"{collection}: verified {actual[0]} records, checksum {actual[1]:016x}")
+        else:
+            ok = False
+            print(f"{collection}: MISMATCH - source {expected[0]} records / {expected[1]:016x}, "
+                  f"destination {actual[0]} records / {actual[1]:016x}")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Copy the JSON data files into another storage backend")
+    parser.add_argument('data_dir', nargs='?', default='data')
+    parser.add_argument('--to', default='sqlite', choices=['sqlite', 'log'])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    source = DataStore(args.data_dir)
+    dest = get_data_store(args.data_dir, backend=args.to)
+    try:
+        ok = migrate(source, dest, args.batch_size)
+    finally:
+        if hasattr(dest, 'close'):
+            dest.close()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,21 @@
+"""
+Backfill the per-job application counters
+
+Jobs keep application_counts ({'total': n, '<status>': n, ...}), updated with
+every create_match/update_match. This recomputes them from the matches, for
+jobs created before the counters existed or after data was edited by hand.
+
+    python rebuild_counts.py [data_dir]
+"""
+import sys
+
+from data_store import get_data_store
+
+if __name__ == '__main__':
+    store = get_data_store(sys.argv[1] if len(sys.argv) > 1 else 'data')
+    try:
+        fixed = store.rebuild_application_counts()
+    finally:
+        if hasattr(store, 'close'):
+            store.close()
+    print(f"Updated the application counters of {fixed} jobs")
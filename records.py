@@ -0,0 +1,179 @@
+"""
+Typed records for FarmConnect data
+
+Compact alternatives to the nested dicts the stores return: User (with its
+Profile), Job, Match and ConversationState. They are slotted dataclasses, so a
+record costs one fixed-size object instead of a hash table, and fields are plain
+attributes (job.pay_rate) instead of job.get('pay_rate') lookups.
+
+The stores' caches (the memory and log stores' state, the JSON store's parsed
+files, and the records their indexes point at) hold these rather than dicts,
+and convert at the edge: a write is frozen into a record with from_dict() and a
+read gets a new dict from to_dict(). Both copy nested dicts and lists, so a
+cached record never shares a mutable value with a caller. get() reads a record
+like a dict, which is all the index and conflict checks need.
+
+Fields a record type doesn't know (added by a newer version, or ad hoc keys like
+a job's '_ai_score') are kept in .extra, as are fields stored as an explicit
+None, so to_dict(from_dict(data)) == data. Missing fields are None.
+
+Stores return these instead of dicts when created with record_types=True (or with
+store.record_types set); see BaseDataStore. The bot's store never does.
+"""
+import copy
+from dataclasses import dataclass, fields
+from typing import Dict, Optional
+
+
+# Field values copied on the way in and out, so a record never shares them with a caller
+_CONTAINERS = frozenset((dict, list))
+
+
+def _copied(value):
+    """A nested value the record or caller can own (dicts and lists are deep copied)"""
+    return copy.deepcopy(value) if value.__class__ in _CONTAINERS else value
+
+
+class Record:
+    """Dict codec shared by the record types"""
+
+    __slots__ = ()
+
+    _names = ()         # field names in order, without extra
+    _name_set = frozenset()
+    _nested = ()        # (position, record type) of fields holding another record
+
+    @classmethod
+    def from_dict(cls, data: Dict):
+        """Build a record from a stored dict (nested dicts and lists are copied)"""
+        values = [data.get(name) for name in cls._names]
+        for position, value in enumerate(values):
+            if value.__class__ in _CONTAINERS:
+                values[position] = copy.deepcopy(value)
+        for position, record_type in cls._nested:
+            if values[position] is not None:
+                values[position] = record_type.from_dict(values[position])
+        extra = None
+        if not cls._name_set.issuperset(data):
+            extra = {key: _copied(value) for key, value in data.items() if key not in cls._name_set}
+        if len(data) > len(values) - values.count(None) + len(extra or ()):
+            # Fields stored as an explicit None go in extra, so to_dict() writes them back
+            extra = extra or {}
+            extra.update((name, None) for name in cls._names if name in data and data[name] is None)
+        return cls(*values, extra)
+
+    def to_dict(self) -> Dict:
+        """The dict form the stores write and return (a new dict that shares nothing with the record)"""
+        data = {}
+        for name in self._names:
+            value = getattr(self, name)
+            if value is not None:
+                if value.__class__ in _CONTAINERS:
+                    value = copy.deepcopy(value)
+                elif isinstance(value, Record):
+                    value = value.to_dict()
+                data[name] = value
+        if self.extra:
+            data.update((key, _copied(value)) for key, value in self.extra.items())
+        return data
+
+    def get(self, name: str, default=None):
+        """A field (or extra key) as it would read from to_dict(), without building the dict"""
+        if name in self._name_set:
+            value = getattr(self, name)
+            return default if value is None else value
+        return self.extra.get(name, default) if self.extra else default
+
+
+def _codec(cls):
+    """Precompute the field layout from_dict() and to_dict() use"""
+    cls._names = tuple(f.name for f in fields(cls) if f.name != 'extra')
+    cls._name_set = frozenset(cls._names)
+    cls._nested = tuple((position, f.type) for position, f in enumerate(fields(cls))
+                        if isinstance(f.type, type) and issubclass(f.type, Record))
+    return cls
+
+
+@_codec
+@dataclass(slots=True)
+class Profile(Record):
+    """Registration details and preferences of a farmer or farm owner"""
+    name: Optional[str] = None
+    location: Optional[str] = None
+    farm_name: Optional[str] = None
+    id_verified: Optional[bool] = None
+    id_photo_url: Optional[str] = None
+    work_types: Optional[str] = None
+    min_pay_rate: Optional[float] = None
+    max_distance: Optional[float] = None
+    hours_preference: Optional[str] = None
+    extra: Optional[Dict] = None
+
+
+@_codec
+@dataclass(slots=True)
+class User(Record):
+    """A registered phone number"""
+    phone: Optional[str] = None
+    type: Optional[str] = None
+    created_at: Optional[str] = None
+    registered: Optional[bool] = None
+    profile: Profile = None
+    extra: Optional[Dict] = None
+
+
+@_codec
+@dataclass(slots=True)
+class Job(Record):
+    """A job posting"""
+    job_id: Optional[str] = None
+    created_at: Optional[str] = None
+    status: Optional[str] = None
+    work_type: Optional[str] = None
+    workers_needed: Optional[int] = None
+    work_hours: Optional[str] = None
+    payment_type: Optional[str] = None
+    payment_amount: Optional[float] = None
+    pay_rate: Optional[float] = None
+    hours: Optional[str] = None
+    location: Optional[str] = None
+    transportation: Optional[str] = None
+    meeting_point: Optional[str] = None
+    description: Optional[str] = None
+    owner_phone: Optional[str] = None
+    owner_name: Optional[str] = None
+    farm_name: Optional[str] = None
+    application_counts: Optional[Dict] = None
+    effective_rate: Optional[float] = None
+    extra: Optional[Dict] = None
+
+
+@_codec
+@dataclass(slots=True)
+class Match(Record):
+    """A farmer's application to a job"""
+    match_id: Optional[str] = None
+    job_id: Optional[str] = None
+    farmer_phone: Optional[str] = None
+    status: Optional[str] = None
+    created_at: Optional[str] = None
+    extra: Optional[Dict] = None
+
+
+@_codec
+@dataclass(slots=True)
+class ConversationState(Record):
+    """Where a user is in a multi-step conversation"""
+    state: Optional[str] = None
+    data: Optional[Dict] = None
+    updated_at: Optional[str] = None
+    extra: Optional[Dict] = None
+
+
+# Record type of each collection
+RECORD_TYPES = {
+    'users': User,
+    'jobs': Job,
+    'matches': Match,
+    'conversations': ConversationState,
+}
@@ -1,10 +1,54 @@
 from flask import Flask, request, Response
 from twilio.twiml.messaging_response import MessagingResponse
 from chatbot import FarmConnectBot
+import os
 import sys
+import threading
 
 app = Flask(__name__)
-bot = FarmConnectBot()
+_bot = None
+_bot_lock = threading.Lock()
+
+def get_bot():
+	"""
+	The process's bot, created (with its store and background tasks) on first use.
+
+	Not at import: the debug reloader imports this module in a watcher process that
+	serves nothing, and a store opened there would hold the log backend's lock.
+	"""
+	global _bot
+	with _bot_lock:
+		if _bot is None:
+			bot = FarmConnectBot()
+			bot.store.start_conversation_sweeper()
+			bot.store.start_job_archiver()
+			bot.store.subscribe(bot.on_job_created, ['job_created'])
+			bot.store.subscribe(bot.on_match_created, ['match_created'])
+			_bot = bot
+		return _bot
+
+def route_message(from_number, message_body, media_url):
+	"""Handle special commands and main menu selections, otherwise pass to the chatbot"""
+	bot = get_bot()
+	# Handle special commands
+	if message_body.lower() == 'menu':
+		user = bot.store.get_user(from_number)
+		if user and user.get('registered'):
+			bot.store.clear_conversation_state(from_number)
+			return bot.show_main_menu(from_number, user)
+		return bot.show_welcome_menu(from_number)
+	elif message_body.lower() == 'help':
+		return bot.show_help()
+
+	# Check if user is at main menu and selecting an option
+	user = bot.store.get_user(from_number)
+	conv_state = bot.store.get_conversation_state(from_number)
+
+	if user and user.get('registered') and not conv_state and message_body.isdigit():
+		return bot.handle_menu_selection(from_number, user, message_body)
+
+	# Process message through chatbot
+	return bot.handle_message(from_number, message_body, media_url)
 
 @app.route("/reply_whatsapp", methods=['POST'])
 def reply_whatsapp():
@@ -16,26 +60,8 @@ def reply_whatsapp():
 
 		print(f"📩 Received from {from_number}: {message_body}")
 
-		# Handle special commands
-		if message_body.lower() == 'menu':
-			user = bot.store.get_user(from_number)
-			if user and user.get('registered'):
-				bot.store.clear_conversation_state(from_number)
-				response_text = bot.show_main_menu(from_number, user)
-			else:
-				response_text = bot.show_welcome_menu(from_number)
-		elif message_body.lower() == 'help':
-			response_text = bot.show_help()
-		else:
-			# Check if user is at main menu and selecting an option
-			user = bot.store.get_user(from_number)
-			conv_state = bot.store.get_conversation_state(from_number)
-
-			if user and user.get('registered') and not conv_state and message_body.isdigit():
-				response_text = bot.handle_menu_selection(from_number, user, message_body)
-			else:
-				# Process message through chatbot
-				response_text = bot.handle_message(from_number, message_body, media_url)
+		# One store transaction per inbound message (retried if another worker raced us)
+		response_text = get_bot().store.run_in_transaction(route_message, from_number, message_body, media_url)
 
 		# Create TwiML response
 		resp = MessagingResponse()
@@ -65,4 +91,6 @@ if __name__ == "__main__":
 	print("🌾 FarmConnect Bot starting...")
 	print("📱 Webhook endpoint: http://localhost:3000/reply_whatsapp")
 	print("🌐 Expose with ngrok: ngrok http 3000")
+	if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+		get_bot()  # the reloader's serving process - start the background tasks before the first message
 	app.run(port=3000, debug=True)
\ No newline at end of file
@@ -209,9 +209,8 @@ def create_sample_data():
 
     print("Creating sample jobs...\n")
 
-    for job in jobs:
-        job_id = store.create_job(job)
-        print(f"✅ Created: {job['work_type']} - ${job['pay_rate']}/hr - {job['location']}")
+    for job, job_id in zip(jobs, store.create_jobs_bulk(jobs)):
+        print(f"✅ Created: {job['work_type']} - ${job.get('pay_rate', job.get('payment_amount'))} - {job['location']}")
         print(f"   Job ID: {job_id}\n")
 
     print(f"\n🎉 Sample data created successfully!")
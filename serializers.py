@@ -0,0 +1,184 @@
+"""
+Serialization formats for the JSON storage backend
+
+    json     - indented stdlib JSON (default, easy to read and edit by hand)
+    compact  - stdlib JSON without whitespace
+    orjson   - compact JSON written by orjson (pip install orjson)
+    msgpack  - MessagePack binary (pip install msgpack)
+
+Files are parsed by content, not by name: JSON starts with '{' and a MessagePack
+map never does, so a data directory can be switched between formats at any time.
+
+Convert existing files in place:
+
+    python serializers.py msgpack [data_dir]
+"""
+import codecs
+import json
+import os
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATS = ('json', 'compact', 'orjson', 'msgpack')
+
+
+def dumps(data, fmt: str = 'json') -> bytes:
+    """Serialize data in the given format"""
+    if fmt == 'json':
+        return json.dumps(data, indent=2).encode('utf-8')
+    if fmt == 'compact':
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+    if fmt == 'orjson':
+        if orjson is None:
+            raise ValueError("The orjson format requires the orjson package")
+        return orjson.dumps(data)
+    if fmt == 'msgpack':
+        if msgpack is None:
+            raise ValueError("The msgpack format requires the msgpack package")
+        return msgpack.packb(data, use_bin_type=True)
+    raise ValueError(f"Unknown serialization format: {fmt}")
+
+
+def dumps_indexed(records: dict, fmt: str = 'json'):
+    """
+    dumps() for a dict of records that also returns {key: (start, end)}, the byte
+    range of each record's value, so one record can be decoded without parsing the
+    rest. The output is identical to dumps(). The ranges are None for msgpack.
+    """
+    if fmt == 'msgpack' or not records:
+        return dumps(records, fmt), ({} if fmt != 'msgpack' else None)
+
+    # One encoder for all records - json.dumps() with options builds a new one per call
+    if fmt == 'json':
+        indented = json.JSONEncoder(indent=2).encode
+
+        # Nested values of json.dumps(indent=2) are indented one more level
+        def encode(value):
+            return indented(value).replace('\n', '\n  ').encode('utf-8')
+        start, separator, key_separator, end = b'{\n  ', b',\n  ', b': ', b'\n}'
+    else:
+        if fmt == 'orjson':
+            dumps(None, fmt)  # raises if orjson isn't installed
+            encode = orjson.dumps
+        elif fmt == 'compact':
+            compact = json.JSONEncoder(separators=(',', ':')).encode
+
+            def encode(value):
+                return compact(value).encode('utf-8')
+        else:
+            raise ValueError(f"Unknown serialization format: {fmt}")
+        start, separator, key_separator, end = b'{', b',', b':', b'}'
+
+    parts, offsets, position = [], {}, len(start) - len(separator)
+    for key, record in records.items():
+        head, value = encode(key) + key_separator, encode(record)
+        position += len(separator) + len(head)
+        offsets[key] = (position, position + len(value))
+        position += len(value)
+        parts.append(head + value)
+    return start + separator.join(parts) + end, offsets
+
+
+def loads(raw: bytes):
+    """Parse data written in any supported format (empty input parses as {})"""
+    head = raw.lstrip()[:1]
+    if not head:
+        return {}
+    if head in (b'{', b'['):
+        return orjson.loads(raw) if orjson else json.loads(raw)
+    if msgpack is None:
+        # Not a ValueError - callers treat those as corrupt files and start over empty
+        raise RuntimeError("File is not JSON and the msgpack package is not installed")
+    return msgpack.unpackb(raw, raw=False)
+
+
+def iter_records(filepath: str, chunk_size: int = 64 * 1024):
+    """
+    Yield the (key, record) pairs of a collection file one at a time.
+
+    Memory is bounded by chunk_size plus the largest record, not the file size.
+    Record values must be JSON objects (as every collection's are).
+    """
+    with open(filepath, 'rb') as f:
+        first = f.read(chunk_size)
+        head = first.lstrip()[:1]
+        if not head:
+            return
+        if head != b'{':
+            if msgpack is None:
+                raise RuntimeError("File is not JSON and the msgpack package is not installed")
+            f.seek(0)
+            unpacker = msgpack.Unpacker(f, raw=False)
+            for _ in range(unpacker.read_map_header()):
+                yield unpacker.unpack(), unpacker.unpack()
+            return
+
+        decoder = json.JSONDecoder()
+        text = codecs.getincrementaldecoder('utf-8')()
+        buffer = text.decode(first)
+        pos = buffer.index('{') + 1
+        eof = False
+
+        def refill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + text.decode(chunk, final=eof)
+            pos = 0
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in chars:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                refill()
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, pos = decoder.raw_decode(buffer, pos)
+                    return value
+                except json.JSONDecodeError:
+                    # Value cut off at the end of the buffer (strings and objects can't parse early)
+                    if eof:
+                        raise
+                    refill()
+
+        while True:
+            skip(' \t\r\n,')
+            if pos >= len(buffer) or buffer[pos] == '}':
+                return
+            key = decode()
+            skip(' \t\r\n:')
+            yield key, decode()
+
+
+def convert_data_dir(data_dir: str, fmt: str) -> dict:
+    """Rewrite every collection file of a JSON-backend data directory; returns {file: (old, new) bytes}"""
+    from data_store import DataStore
+
+    store = DataStore(data_dir, serializer=fmt)
+    before = {path: os.path.getsize(path) for path in store.data_files() if os.path.exists(path)}
+    store.rewrite_files()
+    return {path: (size, os.path.getsize(path)) for path, size in before.items()}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in FORMATS:
+        sys.exit(f"Usage: python serializers.py {{{'|'.join(FORMATS)}}} [data_dir]")
+
+    sizes = convert_data_dir(sys.argv[2] if len(sys.argv) > 2 else 'data', sys.argv[1])
+    for path, (old, new) in sizes.items():
+        print(f"{path}: {old} -> {new} bytes")
@@ -0,0 +1,268 @@
+"""
+SQLite storage backend for FarmConnect chatbot
+
+Same method surface as the JSON DataStore, but every record lives in an indexed
+table inside one WAL-mode database, so point lookups and the per-user/per-job
+queries cost O(log n) instead of a full file parse.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from data_store import BaseDataStore, ConflictError
+
+# Seconds a statement waits for another connection's write lock
+BUSY_TIMEOUT = 30
+
+# collection -> (primary key column, extra indexed columns copied out of the record)
+TABLES = {
+    'users': ('phone', ()),
+    'jobs': ('job_id', ('owner_phone', 'status', 'created_at')),
+    'conversations': ('phone', ()),
+    'matches': ('match_id', ('job_id', 'farmer_phone', 'status', 'created_at')),
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_jobs_owner_phone ON jobs (owner_phone)',
+    'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)',
+    'CREATE INDEX IF NOT EXISTS idx_matches_job_id ON matches (job_id)',
+    'CREATE INDEX IF NOT EXISTS idx_matches_status ON matches (status)',
+    # Range scans for pagination, in page order (created_at, then key - see page_position)
+    'CREATE INDEX IF NOT EXISTS idx_jobs_status_page ON jobs (status, created_at, job_id)',
+    'CREATE INDEX IF NOT EXISTS idx_jobs_owner_page ON jobs (owner_phone, created_at, job_id)',
+    'CREATE INDEX IF NOT EXISTS idx_matches_farmer_page ON matches (farmer_phone, created_at, match_id)',
+    # Key-ordered predecessors of the page indexes
+    'DROP INDEX IF EXISTS idx_jobs_status_key',
+    'DROP INDEX IF EXISTS idx_jobs_owner_key',
+    'DROP INDEX IF EXISTS idx_matches_farmer_key',
+]
+
+
+def column_value(record: Dict, column: str):
+    """A record's value for a copied-out column ('' for a missing created_at, so it still sorts first)"""
+    if column == 'created_at':
+        return record.get(column) or ''
+    return record.get(column)
+
+
+class SQLiteDataStore(BaseDataStore):
+    """SQLite backend - one table per collection, WAL journal"""
+
+    def __init__(self, data_dir='data', db_name='farmconnect.db'):
+        super().__init__()
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.db_path = os.path.join(data_dir, db_name)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        for table, (key_column, columns) in TABLES.items():
+            extra = ''.join(f', {column} TEXT' for column in columns)
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} '
+                f'({key_column} TEXT PRIMARY KEY{extra}, record TEXT NOT NULL)'
+            )
+            self._add_columns(conn, table)
+        for statement in INDEXES:
+            conn.execute(statement)
+        self._index_farmer_job(conn)
+
+    def _add_columns(self, conn, table: str):
+        """Add copied-out columns a database from an older version lacks, filled from the records"""
+        key_column, columns = TABLES[table]
+        if set(columns) <= {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            return  # the usual case - no write lock needed
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Again under the lock, in case another process added them meanwhile
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            missing = [column for column in columns if column not in existing]
+            for column in missing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} TEXT')
+            if missing:
+                rows = conn.execute(f'SELECT {key_column}, record FROM {table}').fetchall()
+                assignments = ', '.join(f'{column} = ?' for column in missing)
+                conn.executemany(
+                    f'UPDATE {table} SET {assignments} WHERE {key_column} = ?',
+                    [(*(column_value(json.loads(record), column) for column in missing), key) for key, record in rows]
+                )
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _index_farmer_job(self, conn):
+        """
+        Index (farmer_phone, job_id) as unique - one match per farmer and job, see create_match().
+
+        Databases from before the constraint have a plain index, which is replaced; if they
+        already hold duplicate matches, the plain index is kept.
+        """
+        unique = {name: bool(flag) for _, name, flag, *_ in conn.execute('PRAGMA index_list(matches)')}
+        if unique.get('idx_matches_farmer_job'):
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DROP INDEX IF EXISTS idx_matches_farmer_job')
+            conn.execute('CREATE UNIQUE INDEX idx_matches_farmer_job ON matches (farmer_phone, job_id)')
+        except sqlite3.IntegrityError:
+            conn.execute('ROLLBACK')
+            print("matches has duplicate (farmer_phone, job_id) pairs - one match per farmer and job not enforced")
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_matches_farmer_job ON matches (farmer_phone, job_id)')
+            return
+        conn.execute('COMMIT')
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections can't be shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _write(self, conn, collection: str, key: str, record: Dict):
+        """Upsert a record, keeping rowid (insertion order) stable on update"""
+        key_column, columns = TABLES[collection]
+        names = [key_column, *columns, 'record']
+        values = [key, *(column_value(record, column) for column in columns), json.dumps(record)]
+        updates = ', '.join(f'{name} = excluded.{name}' for name in names[1:])
+        self._execute_write(
+            conn,
+            f'INSERT INTO {collection} ({", ".join(names)}) VALUES ({", ".join("?" * len(names))}) '
+            f'ON CONFLICT({key_column}) DO UPDATE SET {updates}',
+            values
+        )
+
+    def _execute_write(self, conn, sql: str, params) -> sqlite3.Cursor:
+        """
+        Run a write statement. Inside transaction() a write whose reads went stale raises
+        ConflictError, so run_in_transaction retries the whole unit of work.
+
+        SQLite doesn't wait on busy_timeout when a transaction that has already read upgrades
+        to a write. While another connection holds the write lock (SQLITE_BUSY) the statement
+        is retried here; once that connection has committed, this transaction's snapshot is
+        stale (SQLITE_BUSY_SNAPSHOT) and only a retry from the start can succeed.
+        """
+        deadline, delay = time.monotonic() + BUSY_TIMEOUT, 0.001
+        while True:
+            try:
+                return conn.execute(sql, params)
+            except sqlite3.OperationalError as e:
+                if not self.in_transaction or 'locked' not in str(e):
+                    raise
+                if getattr(e, 'sqlite_errorname', None) != 'SQLITE_BUSY' or time.monotonic() > deadline:
+                    raise ConflictError(f"{os.path.basename(self.db_path)}: {e}") from e
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    # Transactions - a real SQLite transaction on this thread's connection.
+    # Deferred: read-only messages never take the write lock, and a message holds it
+    # only from its first write to its commit. Write conflicts surface as ConflictError.
+    def _begin(self):
+        self._conn().execute('BEGIN')
+
+    def _commit(self):
+        self._conn().execute('COMMIT')
+
+    def _rollback(self):
+        self._conn().execute('ROLLBACK')
+
+    def iter_records(self, collection):
+        """Stream a collection from a cursor instead of materializing every row"""
+        key_column = TABLES[collection][0]
+        for key, record in self._conn().execute(f'SELECT {key_column}, record FROM {collection} ORDER BY rowid'):
+            yield key, json.loads(record)
+
+    # Storage hooks
+    def _get_record(self, collection, key):
+        key_column = TABLES[collection][0]
+        row = self._conn().execute(
+            f'SELECT record FROM {collection} WHERE {key_column} = ?', (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _get_records(self, collection, keys):
+        key_column = TABLES[collection][0]
+        keys, found = list(keys), {}
+        # Chunked to stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._conn().execute(
+                f'SELECT {key_column}, record FROM {collection} '
+                f'WHERE {key_column} IN ({", ".join("?" * len(chunk))})', chunk
+            )
+            found.update((key, json.loads(record)) for key, record in rows)
+        return found
+
+    def _all_records(self, collection):
+        key_column = TABLES[collection][0]
+        rows = self._conn().execute(f'SELECT {key_column}, record FROM {collection} ORDER BY rowid')
+        return {key: json.loads(record) for key, record in rows}
+
+    def _find_records(self, collection, field, value) -> List[Dict]:
+        fields, values = (field, value) if isinstance(field, tuple) else ((field,), (value,))
+        if not set(fields).issubset(TABLES[collection][1]):
+            return super()._find_records(collection, field, value)
+        where = ' AND '.join(f'{name} = ?' for name in fields)
+        rows = self._conn().execute(
+            f'SELECT record FROM {collection} WHERE {where} ORDER BY rowid', values
+        )
+        return [json.loads(record) for (record,) in rows]
+
+    def _page_records(self, collection, field, value, after, limit):
+        if field not in TABLES[collection][1]:
+            return super()._page_records(collection, field, value, after, limit)
+        created_at, key = after or ('', '')
+        rows = self._conn().execute(self._page_query(collection, field), (value, created_at, key, limit))
+        return [(key, json.loads(record)) for key, record in rows]
+
+    @staticmethod
+    def _page_query(collection: str, field: str) -> str:
+        """Range scan for one page of a field lookup, past a (created_at, key) position"""
+        key_column = TABLES[collection][0]
+        return (f'SELECT {key_column}, record FROM {collection} WHERE {field} = ? '
+                f'AND (created_at, {key_column}) > (?, ?) ORDER BY created_at, {key_column} LIMIT ?')
+
+    def _put_record(self, collection, key, record):
+        self._write(self._conn(), collection, key, record)
+
+    def _modify_record(self, collection, key, mutate) -> Optional[Dict]:
+        conn = self._conn()
+        key_column = TABLES[collection][0]
+        # Inside transaction() the enclosing transaction provides atomicity
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                f'SELECT record FROM {collection} WHERE {key_column} = ?', (key,)
+            ).fetchone()
+            record = None
+            if row is not None:
+                record = json.loads(row[0])
+                mutate(record)
+                self._write(conn, collection, key, record)
+        except BaseException:
+            if own_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        if own_transaction:
+            conn.execute('COMMIT')
+        return record
+
+    def _delete_record(self, collection, key):
+        key_column = TABLES[collection][0]
+        cursor = self._execute_write(self._conn(), f'DELETE FROM {collection} WHERE {key_column} = ?', (key,))
+        return cursor.rowcount > 0
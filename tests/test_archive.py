@@ -0,0 +1,76 @@
+"""
+Unit tests for the job archive
+"""
+import pytest
+import os
+import sys
+import gzip
+import json
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import JobArchive
+
+
+def create_old_job(store, days, status):
+    """Create a job with a created_at some days in the past"""
+    created_at = (datetime.now() - timedelta(days=days)).isoformat()
+    return store.create_job({"work_type": "Harvesting", "status": status, "created_at": created_at})
+
+
+class TestArchiveJobs:
+    """Tests for moving jobs into the archive"""
+
+    def test_only_old_closed_jobs_move(self, data_store):
+        """Test that open and recent jobs stay live"""
+        old_closed = create_old_job(data_store, 200, "closed")
+        old_open = create_old_job(data_store, 200, "open")
+        new_closed = create_old_job(data_store, 5, "closed")
+
+        assert data_store.archive_jobs(older_than_days=90) == 1
+
+        assert data_store.get_job(old_closed) is None
+        assert data_store.get_job(old_open) is not None
+        assert data_store.get_job(new_closed) is not None
+        assert data_store.get_job(old_closed, include_archived=True)["status"] == "closed"
+
+    def test_matches_move_with_their_job(self, data_store):
+        """Test that a farmer's old applications remain readable through the archive"""
+        job_id = create_old_job(data_store, 200, "filled")
+        old_match = data_store.create_match(job_id, "whatsapp:+15555550101", "accepted")
+        live_job = data_store.create_job({"work_type": "Planting"})
+        live_match = data_store.create_match(live_job, "whatsapp:+15555550101")
+
+        data_store.archive_jobs(older_than_days=90)
+
+        assert [m["match_id"] for m in data_store.get_farmer_matches("whatsapp:+15555550101")] == [live_match]
+        archived = data_store.get_farmer_matches("whatsapp:+15555550101", include_archived=True)
+        assert [m["match_id"] for m in archived] == [old_match, live_match]
+        assert data_store.get_job_matches(job_id) == []
+        assert data_store.archive.get_job_matches(job_id)[0]["status"] == "accepted"
+
+    def test_partitions_are_compressed_by_month(self, data_store):
+        """Test that archived jobs land in a gzip file named after their creation month"""
+        job_id = create_old_job(data_store, 200, "closed")
+        data_store.archive_jobs(older_than_days=90)
+
+        job = data_store.get_job(job_id, include_archived=True)
+        partition = os.path.join(data_store.data_dir, "archive", f"jobs-{job['created_at'][:7]}.json.gz")
+        with gzip.open(partition, "rb") as f:
+            assert job_id in json.loads(f.read())["jobs"]
+
+
+class TestJobArchive:
+    """Tests for JobArchive on its own"""
+
+    def test_readd_replaces(self, temp_data_dir):
+        """Test that archiving the same job twice keeps one copy"""
+        archive = JobArchive(temp_data_dir)
+        job = {"job_id": "JOB_1", "created_at": "2024-06-01T08:00:00", "status": "closed"}
+        archive.add({"JOB_1": job}, {})
+        archive.add({"JOB_1": {**job, "status": "filled"}}, {})
+
+        assert archive.get_job("JOB_1")["status"] == "filled"
+        assert archive.get_job("JOB_2") is None
+        assert archive.get_farmer_matches("whatsapp:+1") == []
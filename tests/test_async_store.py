@@ -0,0 +1,153 @@
+"""
+Unit tests for AsyncDataStore
+"""
+import pytest
+import os
+import sys
+import time
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_store import AsyncDataStore
+from memory_store import MemoryDataStore
+
+
+@pytest.fixture
+def async_store(data_store):
+    """Create an AsyncDataStore over the temporary JSON store"""
+    store = AsyncDataStore(data_store, max_workers=4)
+    yield store
+    store.close()
+
+
+class TestAsyncOperations:
+    """Tests for the coroutine API"""
+
+    def test_roundtrip(self, async_store):
+        """Test writing and reading back through coroutines"""
+        async def scenario():
+            await async_store.create_user("whatsapp:+15555551234", "farmer")
+            job_id = await async_store.create_job({"work_type": "Harvesting"})
+            await async_store.create_match(job_id, "whatsapp:+15555551234")
+            await async_store.set_conversation_state("whatsapp:+15555551234", "main_menu")
+            return (
+                await async_store.get_user("whatsapp:+15555551234"),
+                await async_store.get_open_jobs(),
+                await async_store.get_farmer_matches("whatsapp:+15555551234"),
+                await async_store.get_conversation_state("whatsapp:+15555551234"),
+            )
+
+        user, jobs, matches, state = asyncio.run(scenario())
+        assert user["type"] == "farmer"
+        assert [job["work_type"] for job in jobs] == ["Harvesting"]
+        assert len(matches) == 1
+        assert state["state"] == "main_menu"
+
+    def test_run_in_transaction(self, async_store):
+        """Test running a blocking function as one transaction on the executor"""
+        def register(store, phone):
+            store.create_user(phone, "farmer")
+            store.update_user(phone, {"registered": True})
+            return store.in_transaction
+
+        in_transaction = asyncio.run(
+            async_store.run_in_transaction(register, async_store.store, "whatsapp:+15555551234")
+        )
+        assert in_transaction is True
+        assert async_store.store.get_user("whatsapp:+15555551234")["registered"] is True
+
+
+class TestAsyncConcurrency:
+    """Tests for read coalescing and per-collection write ordering"""
+
+    def test_concurrent_identical_reads_coalesce(self, async_store, monkeypatch):
+        """Test that identical reads in flight together hit the store once"""
+        async_store.store.create_job({"work_type": "Harvesting"})
+        calls = []
+        original = async_store.store.get_open_jobs
+
+        def slow_get_open_jobs():
+            calls.append(1)
+            time.sleep(0.05)
+            return original()
+
+        monkeypatch.setattr(async_store.store, "get_open_jobs", slow_get_open_jobs)
+
+        async def scenario():
+            return await asyncio.gather(*(async_store.get_open_jobs() for _ in range(10)))
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert all(result == results[0] for result in results)
+        results[0][0]["work_type"] = "Changed"
+        assert results[1][0]["work_type"] == "Harvesting"
+
+    def test_read_after_write_sees_it(self, temp_data_dir, monkeypatch):
+        """Test that a read issued after a write completes doesn't join a read from before it"""
+        async_store = AsyncDataStore(MemoryDataStore(temp_data_dir), max_workers=4)
+        original = async_store.store.get_user
+
+        def slow_get_user(phone):
+            user = original(phone)
+            time.sleep(0.05)
+            return user
+
+        monkeypatch.setattr(async_store.store, "get_user", slow_get_user)
+
+        async def scenario():
+            before = asyncio.ensure_future(async_store.get_user("whatsapp:+15555551234"))
+            await asyncio.sleep(0.01)
+            await async_store.create_user("whatsapp:+15555551234", "farmer")
+            after = await async_store.get_user("whatsapp:+15555551234")
+            return await before, after
+
+        try:
+            before, after = asyncio.run(scenario())
+        finally:
+            async_store.close()
+        assert before is None
+        assert after["type"] == "farmer"
+
+    def test_writes_to_one_collection_are_serialized(self, async_store, monkeypatch):
+        """Test that at most one write per collection runs on the executor at a time"""
+        active, peak, lock = [0], [0], threading.Lock()
+        original = async_store.store.create_job
+
+        def tracked_create_job(job_data):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            try:
+                return original(job_data)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        monkeypatch.setattr(async_store.store, "create_job", tracked_create_job)
+
+        async def scenario():
+            return await asyncio.gather(*(async_store.create_job({"work_type": f"Type {i}"}) for i in range(8)))
+
+        job_ids = asyncio.run(scenario())
+        assert peak[0] == 1
+        assert len(async_store.store.get_open_jobs()) == len(set(job_ids)) == 8
+
+    def test_match_writes_queue_behind_job_writes(self, async_store):
+        """Test that create_match, which also updates the job's counters, waits for the jobs lock"""
+        async def scenario():
+            job_id = await async_store.create_job({"work_type": "Harvesting", "workers_needed": 1})
+            async with async_store._write_locks["jobs"]:
+                task = asyncio.ensure_future(async_store.create_match(job_id, "whatsapp:+15555551234", "accepted"))
+                await asyncio.sleep(0.05)
+                assert not task.done()
+            first = await task
+            second = await async_store.create_match(job_id, "whatsapp:+15555555678", "accepted")
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first is not None
+        assert second is None
+
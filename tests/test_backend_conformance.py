@@ -0,0 +1,436 @@
+"""
+Behavioral contract shared by every storage backend
+
+Each test runs against the JSON backend (uncached and cached), the log backend,
+SQLite and the in-memory backend; a backend that passes can replace any other.
+"""
+import pytest
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_store import DataStore
+from log_store import LogDataStore
+from memory_store import MemoryDataStore
+from sqlite_store import SQLiteDataStore
+
+BACKENDS = {
+    "json": lambda data_dir: DataStore(data_dir, cache=False),
+    "json-cached": lambda data_dir: DataStore(data_dir),
+    "log": lambda data_dir: LogDataStore(data_dir, compact_interval=None),
+    "sqlite": lambda data_dir: SQLiteDataStore(data_dir),
+    "memory": lambda data_dir: MemoryDataStore(data_dir),
+}
+
+PHONE = "whatsapp:+15555551234"
+OWNER = "whatsapp:+15555550001"
+
+
+def close(store):
+    """Release a store's files (not every backend holds any)"""
+    if hasattr(store, "close"):
+        store.close()
+
+
+@pytest.fixture(params=list(BACKENDS))
+def store(request, temp_data_dir):
+    """A fresh store of each backend"""
+    store = BACKENDS[request.param](temp_data_dir)
+    store.backend_name = request.param
+    yield store
+    close(store)
+
+
+class TestUsers:
+    """User contract"""
+
+    def test_create_and_get(self, store):
+        """Test that a created user reads back with defaults"""
+        store.create_user(PHONE, "farmer")
+        user = store.get_user(PHONE)
+
+        assert user["phone"] == PHONE
+        assert user["type"] == "farmer"
+        assert user["registered"] is False
+        assert user["profile"] == {}
+        assert store.get_user("whatsapp:+10000000000") is None
+
+    def test_profile_updates_merge(self, store):
+        """Test that profile updates merge and unknown users report False"""
+        store.create_user(PHONE, "farmer")
+
+        assert store.update_user_profile(PHONE, {"name": "Ana"}) is True
+        assert store.update_user_profile(PHONE, {"location": "Fresno, CA"}) is True
+        assert store.update_user_profile("whatsapp:+10000000000", {"name": "X"}) is False
+        store.update_user(PHONE, {"registered": True})
+
+        user = store.get_user(PHONE)
+        assert user["profile"] == {"name": "Ana", "location": "Fresno, CA"}
+        assert user["registered"] is True
+
+    def test_returned_records_are_copies(self, store):
+        """Test that mutating a returned record doesn't change the stored one"""
+        store.create_user(PHONE, "farmer")
+        store.get_user(PHONE)["profile"]["name"] = "Changed"
+
+        assert store.get_user(PHONE)["profile"] == {}
+
+
+class TestJobs:
+    """Job contract"""
+
+    def test_create_and_get(self, store):
+        """Test that a created job gets an ID, a timestamp and status open"""
+        job_id = store.create_job({"work_type": "Harvesting", "owner_phone": OWNER})
+        job = store.get_job(job_id)
+
+        assert job["job_id"] == job_id
+        assert job["status"] == "open"
+        assert job["created_at"]
+        assert store.get_job("JOB_MISSING") is None
+
+    def test_get_jobs_keeps_order_and_skips_unknown(self, store):
+        """Test the batched job read"""
+        first = store.create_job({"work_type": "Harvesting"})
+        second = store.create_job({"work_type": "Planting"})
+
+        jobs = store.get_jobs([second, "JOB_MISSING", first])
+        assert [job["job_id"] for job in jobs] == [second, first]
+
+    def test_open_jobs_and_owner_listing_follow_updates(self, store):
+        """Test that open-job and owner lookups see status and owner changes"""
+        kept = store.create_job({"work_type": "Harvesting", "owner_phone": OWNER})
+        closed = store.create_job({"work_type": "Planting", "owner_phone": OWNER})
+        other = store.create_job({"work_type": "Weeding", "owner_phone": "whatsapp:+15555550002"})
+
+        store.update_job(closed, {"status": "filled"})
+
+        assert {job["job_id"] for job in store.get_open_jobs()} == {kept, other}
+        assert {job["job_id"] for job in store.get_jobs_by_owner(OWNER)} == {kept, closed}
+
+    def test_archive_moves_old_closed_jobs(self, store):
+        """Test that archiving works the same on every backend"""
+        old = (datetime.now() - timedelta(days=200)).isoformat()
+        job_id = store.create_job({"work_type": "Harvesting", "status": "closed", "created_at": old})
+        store.create_match(job_id, PHONE)
+
+        assert store.archive_jobs(older_than_days=90) == 1
+        assert store.get_job(job_id) is None
+        assert store.get_job_matches(job_id) == []
+        assert store.get_job(job_id, include_archived=True)["status"] == "closed"
+        assert len(store.get_farmer_matches(PHONE, include_archived=True)) == 1
+
+
+class TestMatches:
+    """Match contract"""
+
+    def test_lookups_by_farmer_and_job(self, store):
+        """Test that matches are found by farmer and by job, and follow updates"""
+        job_a = store.create_job({"work_type": "Harvesting"})
+        job_b = store.create_job({"work_type": "Planting"})
+        match_a = store.create_match(job_a, PHONE)
+        store.create_match(job_b, PHONE)
+        store.create_match(job_a, "whatsapp:+15555559999", status="accepted")
+
+        store.update_match(match_a, {"status": "accepted"})
+
+        assert len(store.get_farmer_matches(PHONE)) == 2
+        assert {match["farmer_phone"] for match in store.get_job_matches(job_a)} == {
+            PHONE, "whatsapp:+15555559999"}
+        assert all(match["status"] == "accepted" for match in store.get_job_matches(job_a))
+
+    def test_one_match_per_farmer_and_job(self, store):
+        """Test that create_match returns the existing match instead of a duplicate"""
+        job_id = store.create_job({"work_type": "Harvesting", "workers_needed": 2})
+        match_id = store.create_match(job_id, PHONE, "accepted")
+
+        assert store.create_match(job_id, PHONE, "accepted") == match_id
+        assert store.get_match(PHONE, job_id)["match_id"] == match_id
+        assert len(store.get_job_matches(job_id)) == 1
+        job = store.get_job(job_id)
+        assert job["workers_needed"] == 1
+        assert job["application_counts"] == {"total": 1, "accepted": 1}
+
+    def test_match_added_after_lookup_conflicts(self, store):
+        """Test that a duplicate committed between the lookup and the commit makes the retry return it"""
+        if store.backend_name == "sqlite":
+            pytest.skip("SQLite holds the write lock from the first write, so the race can't commit here; "
+                        "a commit before that write is test_stale_write_conflicts")
+        raced = []
+
+        def create():
+            # No job record, so nothing but the (farmer, job) lookup can conflict
+            match_id = store.create_match("JOB_UNKNOWN", PHONE)
+            if not raced:
+                thread = threading.Thread(target=lambda: raced.append(store.create_match("JOB_UNKNOWN", PHONE)))
+                thread.start()
+                thread.join()
+            return match_id
+
+        assert store.run_in_transaction(create) == raced[0]
+        assert len(store.get_farmer_matches(PHONE)) == 1
+
+    def test_threads_do_not_duplicate_matches(self, store):
+        """Test that concurrent creations of one (farmer, job) match all return the same match"""
+        job_id = store.create_job({"work_type": "Harvesting"})
+        outcomes = []
+
+        def apply():
+            outcomes.append(store.run_in_transaction(store.create_match, job_id, PHONE, retries=10))
+
+        threads = [threading.Thread(target=apply) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(outcomes)) == 1
+        assert len(store.get_job_matches(job_id)) == 1
+        assert store.get_job(job_id)["application_counts"] == {"total": 1, "pending": 1}
+
+    def test_application_counts(self, store):
+        """Test that matches keep their job's counters current, and a rebuild agrees"""
+        job_id = store.create_job({"work_type": "Harvesting"})
+        match_id = store.create_match(job_id, PHONE)
+        store.create_match(job_id, "whatsapp:+15555559999")
+        store.update_match(match_id, {"status": "accepted"})
+
+        assert store.get_job(job_id)["application_counts"] == {"total": 2, "pending": 1, "accepted": 1}
+        assert store.rebuild_application_counts() == 0
+
+    def test_threads_do_not_overbook(self, store):
+        """Test that concurrent acceptances take exactly the job's spots"""
+        job_id = store.create_job({"work_type": "Harvesting", "workers_needed": 3})
+        outcomes = []
+
+        def apply(n):
+            outcomes.append(store.run_in_transaction(
+                store.create_match, job_id, f"whatsapp:+1555555010{n}", "accepted", retries=10))
+
+        threads = [threading.Thread(target=apply, args=(n,)) for n in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sum(match_id is not None for match_id in outcomes) == 3
+        assert len(store.get_job_matches(job_id)) == 3
+        job = store.get_job(job_id)
+        assert job["workers_needed"] == 0
+        assert job["status"] == "filled"
+
+
+class TestConversations:
+    """Conversation state contract"""
+
+    def test_set_get_clear(self, store):
+        """Test the conversation state lifecycle"""
+        store.set_conversation_state(PHONE, "farmer_reg_name", {"step": 1})
+
+        state = store.get_conversation_state(PHONE)
+        assert state["state"] == "farmer_reg_name"
+        assert state["data"] == {"step": 1}
+
+        store.clear_conversation_state(PHONE)
+        store.clear_conversation_state(PHONE)
+        assert store.get_conversation_state(PHONE) is None
+
+    def test_expiry_and_sweep(self, store):
+        """Test that expired states read as None and are swept"""
+        store.conversation_ttl = 60
+        store.set_conversation_state(PHONE, "farmer_reg_name")
+        store.set_conversation_state("whatsapp:+15555559999", "viewing_jobs")
+        store._modify_record("conversations", PHONE, lambda state: state.update(
+            updated_at=(datetime.now() - timedelta(hours=1)).isoformat()))
+
+        assert store.get_conversation_state(PHONE) is None
+        assert store.get_conversation_state(PHONE, include_expired=True) is not None
+        assert store.sweep_conversations() == 1
+        assert store.get_conversation_state("whatsapp:+15555559999") is not None
+
+
+class TestPagination:
+    """Pagination contract"""
+
+    def test_pages_cover_everything_once(self, store):
+        """Test that following cursors returns every record once, in creation order"""
+        job_ids = [store.create_job({"work_type": f"Type {i}", "owner_phone": OWNER}) for i in range(7)]
+
+        seen, cursor = [], None
+        for _ in range(3):
+            page, cursor = store.get_jobs_by_owner_page(OWNER, cursor, limit=3)
+            seen.extend(job["job_id"] for job in page)
+            if cursor is None:
+                break
+
+        assert seen == job_ids
+        assert cursor is None
+
+    def test_pages_follow_creation_time(self, store):
+        """Test that records page by created_at, so legacy IDs don't sort after new ones"""
+        for job_id, day in (("JOB_10_2024", 10), ("JOB_2_2024", 2)):
+            store._put_record("jobs", job_id, {"job_id": job_id, "status": "open", "owner_phone": OWNER,
+                                               "created_at": f"2024-01-{day:02d}T08:00:00"})
+        new = store.create_job({"work_type": "Harvesting", "owner_phone": OWNER})
+
+        page, cursor = store.get_jobs_by_owner_page(OWNER, limit=2)
+        rest, _ = store.get_jobs_by_owner_page(OWNER, cursor, limit=2)
+        assert [job["job_id"] for job in page + rest] == ["JOB_2_2024", "JOB_10_2024", new]
+
+    def test_exact_fit_has_no_next_page(self, store):
+        """Test that a page ending on the last record returns no cursor"""
+        for i in range(3):
+            store.create_job({"work_type": f"Type {i}"})
+
+        page, cursor = store.get_open_jobs_page(limit=3)
+        assert len(page) == 3
+        assert cursor is None
+
+    def test_pages_follow_changes(self, store):
+        """Test that closed jobs drop out of open-job pages"""
+        job_ids = [store.create_job({"work_type": f"Type {i}"}) for i in range(4)]
+        store.update_job(job_ids[1], {"status": "filled"})
+
+        page, cursor = store.get_open_jobs_page(limit=2)
+        rest, _ = store.get_open_jobs_page(cursor, limit=2)
+        assert [job["job_id"] for job in page + rest] == [job_ids[0], job_ids[2], job_ids[3]]
+
+    def test_pages_see_own_transaction(self, store):
+        """Test that a page inside a transaction includes its uncommitted writes"""
+        first = store.create_match("JOB_A", PHONE)
+        with store.transaction():
+            second = store.create_match("JOB_B", PHONE)
+            page, _ = store.get_farmer_matches_page(PHONE)
+            assert [match["match_id"] for match in page] == [first, second]
+
+    def test_archived_matches_come_first(self, store):
+        """Test that a farmer's archived applications page before live ones"""
+        old = (datetime.now() - timedelta(days=200)).isoformat()
+        job_id = store.create_job({"work_type": "Harvesting", "status": "closed", "created_at": old})
+        archived = store.create_match(job_id, PHONE)
+        store.archive_jobs(older_than_days=90)
+        live = [store.create_match(store.create_job({"work_type": "Planting"}), PHONE) for _ in range(2)]
+
+        page, cursor = store.get_farmer_matches_page(PHONE, limit=2, include_archived=True)
+        rest, _ = store.get_farmer_matches_page(PHONE, cursor, limit=2, include_archived=True)
+        assert [match["match_id"] for match in page + rest] == [archived] + live
+        assert store.get_farmer_matches_page(PHONE)[0][0]["match_id"] == live[0]
+
+
+class TestTransactionContract:
+    """Transaction contract"""
+
+    def test_reads_see_own_writes(self, store):
+        """Test that reads inside a transaction see its uncommitted writes"""
+        with store.transaction():
+            job_id = store.create_job({"work_type": "Harvesting", "owner_phone": OWNER})
+            store.create_match(job_id, PHONE)
+
+            assert store.get_job(job_id) is not None
+            assert [job["job_id"] for job in store.get_open_jobs()] == [job_id]
+            assert len(store.get_job_matches(job_id)) == 1
+
+    def test_after_commit_calls(self, store):
+        """Test that after_commit calls run once the transaction commits, and never for a rolled-back one"""
+        calls = []
+        with store.transaction():
+            store.after_commit(calls.append, "committed")
+            assert calls == []
+        assert calls == ["committed"]
+
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.after_commit(calls.append, "rolled back")
+                raise RuntimeError("boom")
+        store.after_commit(calls.append, "now")
+        assert calls == ["committed", "now"]
+
+    def test_rollback_discards_everything(self, store):
+        """Test that an exception discards every change in the block"""
+        store.create_user(PHONE, "farmer")
+
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.update_user_profile(PHONE, {"name": "Ana"})
+                store.create_job({"work_type": "Harvesting"})
+                store.set_conversation_state(PHONE, "viewing_jobs")
+                raise RuntimeError("boom")
+
+        assert store.get_user(PHONE)["profile"] == {}
+        assert store.get_open_jobs() == []
+        assert store.get_conversation_state(PHONE) is None
+
+    def test_nested_transactions_join(self, store):
+        """Test that an inner transaction commits with the outer one"""
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                with store.transaction():
+                    store.create_user(PHONE, "farmer")
+                assert store.in_transaction
+                raise RuntimeError("boom")
+
+        assert store.get_user(PHONE) is None
+        assert not store.in_transaction
+
+    def test_threads_do_not_lose_updates(self, store):
+        """Test concurrent read-modify-writes from threads"""
+        store.create_user(PHONE, "farmer")
+
+        def worker(prefix):
+            for i in range(10):
+                store.update_user_profile(PHONE, {f"{prefix}_{i}": i})
+
+        threads = [threading.Thread(target=worker, args=(f"t{n}",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(store.get_user(PHONE)["profile"]) == 40
+
+    def test_events_only_after_commit(self, store):
+        """Test that change events are published on commit only"""
+        events = []
+        store.subscribe(events.append)
+
+        with store.transaction():
+            store.create_job({"work_type": "Harvesting"})
+            assert events == []
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.create_job({"work_type": "Planting"})
+                raise RuntimeError("boom")
+
+        assert [event["record"]["work_type"] for event in events] == ["Harvesting"]
+
+
+class TestBulkContract:
+    """Bulk access and persistence contract"""
+
+    def test_import_then_iterate(self, store):
+        """Test that imported records come back unchanged from iter_records"""
+        records = {f"JOB_{i}": {"job_id": f"JOB_{i}", "status": "open", "pay_rate": i} for i in range(50)}
+        store.import_records("jobs", records.items())
+
+        assert dict(store.iter_records("jobs")) == records
+        assert len(store.get_open_jobs()) == 50
+
+    def test_data_survives_reopen(self, store, temp_data_dir):
+        """Test that persistent backends reload what was written"""
+        if store.backend_name == "memory":
+            pytest.skip("the memory backend persists nothing")
+        store.create_user(PHONE, "farmer")
+        job_id = store.create_job({"work_type": "Harvesting"})
+        store.create_match(job_id, PHONE)
+        close(store)
+
+        reopened = BACKENDS[store.backend_name](temp_data_dir)
+        try:
+            assert reopened.get_user(PHONE)["type"] == "farmer"
+            assert reopened.get_job(job_id)["work_type"] == "Harvesting"
+            assert len(reopened.get_farmer_matches(PHONE)) == 1
+        finally:
+            close(reopened)
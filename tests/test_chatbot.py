@@ -6,12 +6,13 @@ import os
 import sys
 import tempfile
 import shutil
+from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from chatbot import FarmConnectBot
-from data_store import DataStore
+from data_store import ConflictError, DataStore
 
 
 class TestRuleBasedMatching:
@@ -146,6 +147,29 @@ class TestRuleBasedMatching:
         work_types = [job["work_type"] for job in matched]
         assert "Harvesting" in work_types
 
+    def test_per_task_ranked_by_amount(self, bot_with_temp_store):
+        """Test that per-task jobs rank by their amount instead of as unpaid"""
+        bot = bot_with_temp_store
+        jobs = [
+            {"job_id": "DAY", "work_type": "Harvesting", "payment_type": "per day", "payment_amount": 120.0},
+            {"job_id": "TASK", "work_type": "Harvesting", "payment_type": "per task", "payment_amount": 16.0},
+            {"job_id": "LEGACY", "work_type": "Harvesting", "pay_rate": 14.0},
+        ]
+
+        matched = bot._rule_based_match(jobs, {"work_types": "Harvesting"})
+
+        assert [job["job_id"] for job in matched] == ["TASK", "DAY", "LEGACY"]
+
+    def test_top_k_same_as_full_sort(self, bot_with_temp_store):
+        """Test that the heap selection returns what sorting everything would, ties in input order"""
+        bot = bot_with_temp_store
+        jobs = [{"job_id": f"JOB_{i}", "work_type": "Harvesting", "pay_rate": float(i % 7),
+                 "effective_rate": float(i % 7)} for i in range(40)]
+
+        matched = bot._rule_based_match(jobs, {"work_types": "All types of work"})
+
+        assert matched == sorted(jobs, key=lambda job: job["effective_rate"], reverse=True)[:5]
+
 
 class TestAIMatcherIntegration:
     """Tests for AI matcher integration with chatbot"""
@@ -216,7 +240,7 @@ class TestFarmerRegistration:
     @pytest.fixture
     def bot(self, temp_data_dir):
         """Create a bot with temporary data directory"""
-        with patch('chatbot.DataStore') as MockStore:
+        with patch('chatbot.get_data_store') as MockStore:
             store_instance = DataStore(data_dir=temp_data_dir)
             MockStore.return_value = store_instance
 
@@ -256,6 +280,19 @@ class TestFarmerRegistration:
 
         assert "location" in response.lower() or "city" in response.lower()
 
+    def test_id_step_writes_each_file_once(self, bot):
+        """Test that one message rewrites each touched data file at most once"""
+        phone = "whatsapp:+15555559999"
+        for message in ["Hi", "1", "John Doe", "Sacramento, CA"]:
+            bot.handle_message(phone, message)
+
+        with patch.object(bot.store, "_write_json", wraps=bot.store._write_json) as write_json:
+            bot.handle_message(phone, "Here's my ID", "https://example.com/id.jpg")
+
+        written = [call.args[0] for call in write_json.call_args_list]
+        assert len(written) == len(set(written)) == 2
+        assert bot.store.get_user(phone)["registered"] is True
+
 
 class TestFarmOwnerRegistration:
     """Tests for farm owner registration flow"""
@@ -263,7 +300,7 @@ class TestFarmOwnerRegistration:
     @pytest.fixture
     def bot(self, temp_data_dir):
         """Create a bot with temporary data directory"""
-        with patch('chatbot.DataStore') as MockStore:
+        with patch('chatbot.get_data_store') as MockStore:
             store_instance = DataStore(data_dir=temp_data_dir)
             MockStore.return_value = store_instance
 
@@ -292,7 +329,7 @@ class TestMenuHandling:
     @pytest.fixture
     def bot(self, temp_data_dir):
         """Create a bot with temporary data directory"""
-        with patch('chatbot.DataStore') as MockStore:
+        with patch('chatbot.get_data_store') as MockStore:
             store_instance = DataStore(data_dir=temp_data_dir)
             MockStore.return_value = store_instance
 
@@ -309,13 +346,103 @@ class TestMenuHandling:
 
         assert "Welcome" in response
 
+    def test_expired_state_falls_back_to_main_menu(self, bot):
+        """Test that a registered user returning to an abandoned flow gets the main menu"""
+        phone = "whatsapp:+15555557777"
+        bot.store.create_user(phone, "farmer")
+        bot.store.update_user(phone, {"registered": True})
+        bot.store.set_conversation_state(phone, "farmer_reg_id")
+        bot.store.conversation_ttl = 60
+
+        with patch("data_store.datetime") as mock_datetime:
+            mock_datetime.now.return_value = datetime.now() + timedelta(minutes=5)
+            mock_datetime.fromisoformat = datetime.fromisoformat
+            response = bot.handle_message(phone, "Hello")
+
+        assert "Farmer Menu" in response
+        assert bot.store.get_conversation_state(phone) is None
+
+
+class TestPagedListings:
+    """Tests for listings shown a page at a time"""
+
+    @pytest.fixture
+    def bot(self, temp_data_dir):
+        """Create a bot with temporary data directory"""
+        with patch('chatbot.get_data_store') as MockStore:
+            store_instance = DataStore(data_dir=temp_data_dir)
+            MockStore.return_value = store_instance
+
+            with patch('chatbot.get_ai_matcher', return_value=None):
+                bot = FarmConnectBot()
+                bot.store = store_instance
+
+        return bot
+
+    def test_more_pages_through_applications(self, bot):
+        """Test that 'more' shows the next applications and the last page has no prompt"""
+        phone = "whatsapp:+15555557777"
+        bot.store.create_user(phone, "farmer")
+        bot.store.update_user(phone, {"registered": True})
+        for i in range(7):
+            bot.store.create_match(bot.store.create_job({"work_type": f"Type {i}"}), phone)
+
+        first = bot.handle_menu_selection(phone, bot.store.get_user(phone), "3")
+        assert "Type 0" in first and "Type 4" in first and "Type 5" not in first
+        assert "'more'" in first
+
+        second = bot.handle_message(phone, "more")
+        assert "Type 5" in second and "Type 6" in second and "Type 4" not in second
+        assert "'more'" not in second
+        assert bot.store.get_conversation_state(phone) is None
+
+    def test_menu_choice_after_listing(self, bot):
+        """Test that a menu number instead of 'more' leaves the listing"""
+        phone = "whatsapp:+15555557777"
+        bot.store.create_user(phone, "farmer")
+        bot.store.update_user(phone, {"registered": True})
+        for i in range(6):
+            bot.store.create_match(bot.store.create_job({"work_type": f"Type {i}"}), phone)
+
+        bot.handle_menu_selection(phone, bot.store.get_user(phone), "3")
+        response = bot.handle_message(phone, "5")
+
+        assert "Help" in response
+        assert bot.store.get_conversation_state(phone) is None
+
+    def test_owner_jobs_paged(self, bot):
+        """Test that an owner's postings are listed a page at a time"""
+        phone = "whatsapp:+15555556666"
+        bot.store.create_user(phone, "farm_owner")
+        bot.store.update_user(phone, {"registered": True})
+        for i in range(6):
+            bot.store.create_job({"work_type": f"Type {i}", "owner_phone": phone, "pay_rate": 15})
+
+        first = bot.view_owner_jobs(phone)
+        second = bot.handle_message(phone, "more")
+
+        assert "Type 4" in first and "Type 5" not in first
+        assert "Type 5" in second
+
+    def test_owner_jobs_use_counters(self, bot):
+        """Test that application counts come from the jobs, without scanning matches"""
+        phone = "whatsapp:+15555556666"
+        job_id = bot.store.create_job({"work_type": "Harvesting", "owner_phone": phone, "pay_rate": 15})
+        bot.store.create_match(job_id, "whatsapp:+15555550101")
+        bot.store.create_match(job_id, "whatsapp:+15555550102", "accepted")
+
+        with patch.object(bot.store, 'get_job_matches', side_effect=AssertionError("scanned matches")):
+            response = bot.view_owner_jobs(phone)
+
+        assert "Applications: 2 (1 accepted, 1 pending)" in response
+
 
 class TestEdgeCases:
     """Tests for edge cases and error handling"""
 
     def test_empty_message(self, temp_data_dir):
         """Test handling empty message"""
-        with patch('chatbot.DataStore') as MockStore:
+        with patch('chatbot.get_data_store') as MockStore:
             store_instance = DataStore(data_dir=temp_data_dir)
             MockStore.return_value = store_instance
 
@@ -332,7 +459,7 @@ class TestEdgeCases:
 
     def test_very_long_message(self, temp_data_dir):
         """Test handling very long message"""
-        with patch('chatbot.DataStore') as MockStore:
+        with patch('chatbot.get_data_store') as MockStore:
             store_instance = DataStore(data_dir=temp_data_dir)
             MockStore.return_value = store_instance
 
@@ -346,3 +473,83 @@ class TestEdgeCases:
 
         # Should not crash
         assert response is not None
+
+    def test_applying_to_filled_job(self, temp_data_dir):
+        """Test that accepting a job whose last spot was just taken says so"""
+        with patch('chatbot.get_data_store') as MockStore:
+            store_instance = DataStore(data_dir=temp_data_dir)
+            MockStore.return_value = store_instance
+
+            with patch('chatbot.get_ai_matcher', return_value=None):
+                bot = FarmConnectBot()
+                bot.store = store_instance
+
+        phone = "whatsapp:+15555557777"
+        job_id = bot.store.create_job({"work_type": "Harvesting", "workers_needed": 1})
+        bot.store.create_match(job_id, "whatsapp:+15555550101", "accepted")
+        bot.store.set_conversation_state(phone, 'job_action', {'job_id': job_id})
+
+        response = bot.handle_message(phone, "1")
+
+        assert "just been filled" in response
+        assert bot.store.get_farmer_matches(phone) == []
+        assert bot.store.get_conversation_state(phone) is None
+
+    def test_applying_twice(self, temp_data_dir):
+        """Test that a repeated application neither duplicates the match nor notifies the owner again"""
+        with patch('chatbot.get_data_store') as MockStore:
+            store_instance = DataStore(data_dir=temp_data_dir)
+            MockStore.return_value = store_instance
+
+            with patch('chatbot.get_ai_matcher', return_value=None):
+                bot = FarmConnectBot()
+                bot.store = store_instance
+
+        phone = "whatsapp:+15555557777"
+        bot.store.create_user(phone, "farmer")
+        job_id = bot.store.create_job({"work_type": "Harvesting", "owner_phone": "whatsapp:+15555550001"})
+        bot.store.subscribe(bot.on_match_created, ['match_created'])
+
+        with patch.object(bot, 'send_message') as send_message:
+            for _ in range(2):
+                bot.store.set_conversation_state(phone, 'job_action', {'job_id': job_id})
+                response = bot.handle_message(phone, "1")
+
+        assert "already applied" in response
+        assert len(bot.store.get_farmer_matches(phone)) == 1
+        assert send_message.call_count == 1
+
+    def test_retried_application_notifies_owner_once(self, temp_data_dir):
+        """Test that the owner is notified after the commit, not on each attempt of a retried message"""
+        with patch('chatbot.get_data_store') as MockStore:
+            store_instance = DataStore(data_dir=temp_data_dir)
+            MockStore.return_value = store_instance
+
+            with patch('chatbot.get_ai_matcher', return_value=None):
+                bot = FarmConnectBot()
+                bot.store = store_instance
+
+        phone = "whatsapp:+15555557777"
+        owner = "whatsapp:+15555550001"
+        bot.store.create_user(phone, "farmer")
+        bot.store.update_user_profile(phone, {"name": "Maria"})
+        job_id = bot.store.create_job({"work_type": "Harvesting", "owner_phone": owner})
+        bot.store.subscribe(bot.on_match_created, ['match_created'])
+        bot.store.set_conversation_state(phone, 'job_action', {'job_id': job_id})
+        attempts = []
+
+        def route(from_number, message_body):
+            response = bot.handle_message(from_number, message_body)
+            attempts.append(send_message.call_count)
+            if len(attempts) == 1:
+                raise ConflictError("raced by another worker")
+            return response
+
+        with patch.object(bot, 'send_message') as send_message:
+            response = bot.store.run_in_transaction(route, phone, "1")
+
+        assert "Application Submitted" in response
+        assert attempts == [0, 0]
+        send_message.assert_called_once()
+        assert send_message.call_args[0][0] == owner
+        assert "Maria has applied" in send_message.call_args[0][1]
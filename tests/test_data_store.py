@@ -4,10 +4,15 @@ Unit tests for DataStore
 import pytest
 import os
 import sys
+import threading
+import time
+import multiprocessing
+from datetime import datetime, timedelta
+from unittest.mock import patch
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from data_store import DataStore
+from data_store import ConflictError, DataStore, FieldIndex, get_data_store
 
 
 class TestUserOperations:
@@ -99,6 +104,15 @@ class TestJobOperations:
         assert job["job_id"] == job_id
         assert job["work_type"] == "Harvesting"
 
+    def test_effective_rate_stored(self, data_store):
+        """Test that jobs carry their hourly-equivalent pay, kept current by updates"""
+        job_id = data_store.create_job({"work_type": "Harvesting", "payment_type": "per day",
+                                        "payment_amount": 160.0})
+        assert data_store.get_job(job_id)["effective_rate"] == 20.0
+
+        data_store.update_job(job_id, {"payment_type": "per hour", "payment_amount": 18.0})
+        assert data_store.get_job(job_id)["effective_rate"] == 18.0
+
     def test_get_open_jobs(self, populated_store):
         """Test getting all open jobs"""
         jobs = populated_store.get_open_jobs()
@@ -107,6 +121,34 @@ class TestJobOperations:
         for job in jobs:
             assert job["status"] == "open"
 
+    def test_get_jobs_by_owner(self, populated_store):
+        """Test getting the jobs posted by one owner"""
+        jobs = populated_store.get_jobs_by_owner("whatsapp:+15555550001")
+
+        assert len(jobs) == 3
+        assert all(job["owner_phone"] == "whatsapp:+15555550001" for job in jobs)
+
+    def test_closed_jobs_leave_open_index(self, data_store):
+        """Test that get_open_jobs follows status changes"""
+        job_ids = [data_store.create_job({"work_type": work_type}) for work_type in ("Harvesting", "Planting")]
+        data_store.update_job(job_ids[0], {"status": "closed"})
+
+        assert [job["job_id"] for job in data_store.get_open_jobs()] == [job_ids[1]]
+
+        data_store.update_job(job_ids[0], {"status": "open"})
+        assert len(data_store.get_open_jobs()) == 2
+
+    def test_create_jobs_bulk_writes_once_per_batch(self, data_store):
+        """Test that bulk creation commits one jobs.json write per batch"""
+        jobs = ({"work_type": f"Type {i}", "status": "open"} for i in range(25))
+
+        with patch.object(data_store, "_write_json", wraps=data_store._write_json) as write_json:
+            job_ids = data_store.create_jobs_bulk(jobs, batch_size=10)
+
+        jobs_writes = [call for call in write_json.call_args_list if call.args[0] == data_store.jobs_file]
+        assert len(jobs_writes) == 3
+        assert [job["work_type"] for job in data_store.get_jobs(job_ids)] == [f"Type {i}" for i in range(25)]
+
     def test_job_default_status(self, data_store):
         """Test that new jobs default to open status"""
         job_id = data_store.create_job({"work_type": "Test"})
@@ -142,6 +184,19 @@ class TestMatchOperations:
 
         assert len(matches) == 2
 
+    def test_create_match_is_idempotent(self, populated_store):
+        """Test that applying twice to a job returns the first match"""
+        job_id = populated_store.get_open_jobs()[0]["job_id"]
+        farmer_phone = "whatsapp:+15555550101"
+
+        first = populated_store.create_match(job_id, farmer_phone, "pending")
+        second = populated_store.create_match(job_id, farmer_phone, "pending")
+
+        assert second == first
+        assert len(populated_store.get_job_matches(job_id)) == 1
+        assert populated_store.get_match(farmer_phone, job_id)["match_id"] == first
+        assert populated_store.get_match(farmer_phone, "JOB_MISSING") is None
+
     def test_get_job_matches(self, populated_store):
         """Test getting all matches for a job"""
         jobs = populated_store.get_open_jobs()
@@ -156,6 +211,165 @@ class TestMatchOperations:
         assert len(matches) == 2
 
 
+class TestApplicationCounts:
+    """Tests for the per-job application counters"""
+
+    def test_counts_follow_matches(self, data_store):
+        """Test that creating and updating matches keeps the job's counters current"""
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+        assert data_store.get_job(job_id)["application_counts"] == {"total": 0}
+
+        match_id = data_store.create_match(job_id, "whatsapp:+15555550101")
+        data_store.create_match(job_id, "whatsapp:+15555550102", "accepted")
+        assert data_store.get_job(job_id)["application_counts"] == {"total": 2, "pending": 1, "accepted": 1}
+
+        data_store.update_match(match_id, {"status": "accepted"})
+        assert data_store.get_job(job_id)["application_counts"] == {"total": 2, "accepted": 2}
+
+    def test_match_for_unknown_job(self, data_store):
+        """Test that a match whose job doesn't exist is still created"""
+        match_id = data_store.create_match("JOB_MISSING", "whatsapp:+15555550101")
+
+        assert data_store.get_farmer_matches("whatsapp:+15555550101")[0]["match_id"] == match_id
+
+    def test_rebuild_backfills_legacy_jobs(self, data_store):
+        """Test that rebuild_application_counts() counts jobs created before the counters"""
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+        other_id = data_store.create_job({"work_type": "Planting"})
+        data_store._modify_record("jobs", job_id, lambda job: job.pop("application_counts"))
+        data_store.create_match(job_id, "whatsapp:+15555550101")
+        data_store.create_match(job_id, "whatsapp:+15555550102", "accepted")
+        assert "application_counts" not in data_store.get_job(job_id)
+
+        assert data_store.rebuild_application_counts() == 1
+        assert data_store.get_job(job_id)["application_counts"] == {"total": 2, "pending": 1, "accepted": 1}
+        assert data_store.get_job(other_id)["application_counts"] == {"total": 0}
+        assert data_store.rebuild_application_counts() == 0
+
+
+class TestCapacity:
+    """Tests for workers_needed counting down as matches are accepted"""
+
+    def test_accepting_fills_and_closes_job(self, data_store):
+        """Test that each accepted match takes a spot and the last one closes the job"""
+        job_id = data_store.create_job({"work_type": "Harvesting", "workers_needed": 2})
+
+        data_store.create_match(job_id, "whatsapp:+15555550101", "pending")
+        assert data_store.get_job(job_id)["workers_needed"] == 2
+
+        data_store.create_match(job_id, "whatsapp:+15555550102", "accepted")
+        data_store.create_match(job_id, "whatsapp:+15555550103", "accepted")
+        job = data_store.get_job(job_id)
+        assert job["workers_needed"] == 0
+        assert job["status"] == "filled"
+        assert job_id not in [open_job["job_id"] for open_job in data_store.get_open_jobs()]
+
+    def test_no_match_once_filled(self, data_store):
+        """Test that accepting into a filled job creates nothing"""
+        job_id = data_store.create_job({"work_type": "Harvesting", "workers_needed": 1})
+        pending_id = data_store.create_match(job_id, "whatsapp:+15555550101", "pending")
+        data_store.create_match(job_id, "whatsapp:+15555550102", "accepted")
+
+        assert data_store.create_match(job_id, "whatsapp:+15555550103", "accepted") is None
+        assert data_store.update_match(pending_id, {"status": "accepted"}) is False
+        assert len(data_store.get_job_matches(job_id)) == 2
+        assert data_store.get_job(job_id)["application_counts"] == {"total": 2, "pending": 1, "accepted": 1}
+
+    def test_withdrawal_reopens_job(self, data_store):
+        """Test that an accepted match leaving 'accepted' gives its spot back"""
+        job_id = data_store.create_job({"work_type": "Harvesting", "workers_needed": 1})
+        match_id = data_store.create_match(job_id, "whatsapp:+15555550101", "accepted")
+
+        assert data_store.update_match(match_id, {"status": "withdrawn"}) is True
+        job = data_store.get_job(job_id)
+        assert job["workers_needed"] == 1
+        assert job["status"] == "open"
+
+    def test_jobs_without_capacity_stay_open(self, data_store):
+        """Test that jobs with no numeric workers_needed never fill"""
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+
+        for i in range(3):
+            assert data_store.create_match(job_id, f"whatsapp:+1555555010{i}", "accepted")
+        assert data_store.get_job(job_id)["status"] == "open"
+
+
+class TestMatchIndexes:
+    """Tests for the farmer_phone / job_id secondary indexes"""
+
+    def test_index_follows_updates(self, data_store):
+        """Test that changing a match's job moves it between index entries"""
+        match_id = data_store.create_match("JOB_1", "whatsapp:+15555550101")
+        assert [m["match_id"] for m in data_store.get_job_matches("JOB_1")] == [match_id]
+
+        data_store.update_match(match_id, {"job_id": "JOB_2"})
+
+        assert data_store.get_job_matches("JOB_1") == []
+        assert [m["match_id"] for m in data_store.get_job_matches("JOB_2")] == [match_id]
+        assert data_store.get_farmer_matches("whatsapp:+15555550101")[0]["job_id"] == "JOB_2"
+
+    def test_index_not_rebuilt_after_own_writes(self, data_store):
+        """Test that writes carry the index forward instead of rebuilding it"""
+        data_store.create_match("JOB_1", "whatsapp:+15555550101")
+        data_store.get_farmer_matches("whatsapp:+15555550101")
+
+        with patch("data_store.FieldIndex") as field_index:
+            data_store.create_match("JOB_2", "whatsapp:+15555550101")
+            matches = data_store.get_farmer_matches("whatsapp:+15555550101")
+
+        assert field_index.call_count == 0
+        assert [m["job_id"] for m in matches] == ["JOB_1", "JOB_2"]
+
+    def test_index_rebuilt_after_external_edit(self, data_store):
+        """Test that matches written by another process are found"""
+        data_store.get_farmer_matches("whatsapp:+15555550101")
+
+        other = DataStore(data_dir=data_store.data_dir)
+        other.create_match("JOB_1", "whatsapp:+15555550101")
+
+        assert len(data_store.get_farmer_matches("whatsapp:+15555550101")) == 1
+
+    def test_transaction_sees_own_matches(self, data_store):
+        """Test that indexed lookups include uncommitted matches of the transaction"""
+        data_store.create_match("JOB_1", "whatsapp:+15555550101")
+
+        with data_store.transaction():
+            data_store.create_match("JOB_2", "whatsapp:+15555550101")
+            assert len(data_store.get_farmer_matches("whatsapp:+15555550101")) == 2
+            assert data_store.get_job_matches("JOB_2")[0]["farmer_phone"] == "whatsapp:+15555550101"
+
+
+class TestPagination:
+    """Tests for index-backed pages"""
+
+    def test_page_examines_only_what_it_returns(self):
+        """Test that a page reads about limit records, not the whole collection"""
+        class CountingDict(dict):
+            reads = 0
+
+            def get(self, key, default=None):
+                CountingDict.reads += 1
+                return super().get(key, default)
+
+        records = CountingDict((f"JOB_{i:05d}", {"status": "open"}) for i in range(10000))
+        index = FieldIndex("status", records)
+
+        page = index.page(records, "open", ("", "JOB_05000"), 5)
+        assert [key for key, _ in page] == [f"JOB_{i:05d}" for i in range(5001, 5006)]
+        assert CountingDict.reads == 5
+
+    def test_index_keeps_keys_sorted(self):
+        """Test that updates keep each value's keys in page order"""
+        index = FieldIndex("status")
+        for key in ["JOB_3", "JOB_1", "JOB_2"]:
+            index.update(key, None, {"status": "open"})
+        index.update("JOB_2", {"status": "open"}, {"status": "filled"})
+        index.update("JOB_1", {"status": "open"}, {"status": "open"})
+
+        records = {key: {"status": "open"} for key in ["JOB_1", "JOB_3"]}
+        assert [key for key, _ in index.page(records, "open", None, 10)] == ["JOB_1", "JOB_3"]
+
+
 class TestConversationState:
     """Tests for conversation state management"""
 
@@ -181,6 +395,88 @@ class TestConversationState:
         assert retrieved is None
 
 
+class TestConversationShards:
+    """Tests for the sharded conversation state files"""
+
+    def test_write_touches_only_own_shard(self, data_store):
+        """Test that setting a state rewrites just the user's shard"""
+        phones = [f"whatsapp:+155555500{i:02d}" for i in range(20)]
+        for phone in phones:
+            data_store.set_conversation_state(phone, "main_menu")
+
+        with patch.object(data_store, "_write_json", wraps=data_store._write_json) as write_json:
+            data_store.set_conversation_state(phones[0], "farmer_registration")
+
+        assert [call.args[0] for call in write_json.call_args_list] == [
+            data_store._record_file("conversations", phones[0])
+        ]
+        assert len(os.listdir(data_store.conversations_dir)) > 2
+        assert data_store.get_conversation_state(phones[0])["state"] == "farmer_registration"
+
+    def test_legacy_file_migrated(self, temp_data_dir):
+        """Test that states in an old conversations.json move into the shards"""
+        with open(os.path.join(temp_data_dir, "conversations.json"), "w") as f:
+            f.write('{"whatsapp:+15555551234": {"state": "main_menu", "data": {}}}')
+
+        store = DataStore(data_dir=temp_data_dir)
+
+        assert store.get_conversation_state("whatsapp:+15555551234")["state"] == "main_menu"
+        assert not os.path.exists(os.path.join(temp_data_dir, "conversations.json"))
+
+    def test_shard_count_change_migrates(self, temp_data_dir):
+        """Test that reopening with another shard count keeps every state"""
+        phones = [f"whatsapp:+155555500{i:02d}" for i in range(20)]
+        store = DataStore(data_dir=temp_data_dir, conversation_shards=4)
+        for phone in phones:
+            store.set_conversation_state(phone, "main_menu")
+
+        resharded = DataStore(data_dir=temp_data_dir, conversation_shards=8)
+
+        assert all(resharded.get_conversation_state(phone) for phone in phones)
+        assert len(os.listdir(resharded.conversations_dir)) <= 16  # 8 shards + lock files
+
+
+class TestConversationExpiry:
+    """Tests for conversation state TTL"""
+
+    def put_stale_state(self, store, phone, hours):
+        """Store a conversation state last updated some hours ago"""
+        updated_at = (datetime.now() - timedelta(hours=hours)).isoformat()
+        store._put_record("conversations", phone, {"state": "job_description", "data": {}, "updated_at": updated_at})
+
+    def test_expired_state_reads_as_none(self, data_store):
+        """Test that a state older than the TTL is ignored on read"""
+        data_store.conversation_ttl = 60 * 60
+        self.put_stale_state(data_store, "whatsapp:+1", hours=2)
+        data_store.set_conversation_state("whatsapp:+2", "job_description")
+
+        assert data_store.get_conversation_state("whatsapp:+1") is None
+        assert data_store.get_conversation_state("whatsapp:+1", include_expired=True) is not None
+        assert data_store.get_conversation_state("whatsapp:+2") is not None
+
+    def test_ttl_can_be_disabled(self, data_store):
+        """Test that a TTL of 0 keeps states forever"""
+        data_store.conversation_ttl = 0
+        self.put_stale_state(data_store, "whatsapp:+1", hours=24 * 365)
+
+        assert data_store.get_conversation_state("whatsapp:+1") is not None
+
+    def test_sweep_removes_expired_in_one_write_per_shard(self, data_store):
+        """Test that the sweeper deletes only stale states, writing each shard once"""
+        data_store.conversation_ttl = 60 * 60
+        stale = [f"whatsapp:+155555500{i:02d}" for i in range(10)]
+        for phone in stale:
+            self.put_stale_state(data_store, phone, hours=2)
+        data_store.set_conversation_state("whatsapp:+15555559999", "main_menu")
+
+        with patch.object(data_store, "_write_json", wraps=data_store._write_json) as write_json:
+            assert data_store.sweep_conversations() == 10
+
+        written = [call.args[0] for call in write_json.call_args_list]
+        assert len(written) == len(set(written))
+        assert data_store._all_records("conversations").keys() == {"whatsapp:+15555559999"}
+
+
 class TestDataPersistence:
     """Tests for data persistence"""
 
@@ -198,3 +494,354 @@ class TestDataPersistence:
 
         assert user is not None
         assert user["profile"]["name"] == "Persistent User"
+
+
+class TestCaching:
+    """Tests for the in-memory collection cache"""
+
+    def test_reads_served_from_memory(self, data_store):
+        """Test that repeated reads don't re-parse an unchanged file"""
+        phone = "whatsapp:+15555551234"
+        data_store.create_user(phone, "farmer")
+
+        with patch.object(data_store, "_read_json", wraps=data_store._read_json) as read_json:
+            for _ in range(5):
+                data_store.get_user(phone)
+            data_store.update_user(phone, {"registered": True})
+            assert data_store.get_user(phone)["registered"] is True
+
+        assert read_json.call_count == 0
+
+    def test_external_edit_invalidates_cache(self, data_store):
+        """Test that a change made by another process is picked up"""
+        phone = "whatsapp:+15555551234"
+        data_store.create_user(phone, "farmer")
+        data_store.get_user(phone)
+
+        other = DataStore(data_dir=data_store.data_dir)
+        other.update_user_profile(phone, {"name": "Edited Elsewhere"})
+
+        assert data_store.get_user(phone)["profile"]["name"] == "Edited Elsewhere"
+
+    def test_returned_records_are_copies(self, data_store):
+        """Test that mutating a returned record doesn't leak into the cache"""
+        phone = "whatsapp:+15555551234"
+        data_store.create_user(phone, "farmer")
+        data_store.get_user(phone)["registered"] = True
+
+        assert data_store.get_user(phone)["registered"] is False
+
+    def test_concurrent_misses_share_one_parse(self, data_store):
+        """Test that threads reading an uncached collection together parse it once"""
+        data_store.create_job({"work_type": "Harvesting"})
+        data_store.invalidate_cache()
+        original = data_store._read_json
+
+        def slow_read_json(filepath):
+            time.sleep(0.05)
+            return original(filepath)
+
+        with patch.object(data_store, "_read_json", side_effect=slow_read_json) as read_json:
+            threads = [threading.Thread(target=data_store.get_open_jobs) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert read_json.call_count == 1
+
+    def test_cache_can_be_disabled(self, temp_data_dir):
+        """Test that cache=False reads the file every time"""
+        store = DataStore(data_dir=temp_data_dir, cache=False)
+        store.create_match("JOB_1", "whatsapp:+15555551234")
+
+        with patch.object(store, "_read_json", wraps=store._read_json) as read_json:
+            store.get_farmer_matches("whatsapp:+15555551234")
+            store.get_farmer_matches("whatsapp:+15555551234")
+
+        assert read_json.call_count == 2
+
+
+class TestLazyReads:
+    """Tests for single-record reads through the offset index"""
+
+    def test_point_read_skips_full_parse(self, data_store):
+        """Test that a store that hasn't loaded jobs.json decodes only the requested job"""
+        job_ids = [data_store.create_job({"work_type": f"Type {i}"}) for i in range(5)]
+        other = DataStore(data_dir=data_store.data_dir)
+
+        with patch.object(other, "_read_json", wraps=other._read_json) as read_json:
+            assert other.get_job(job_ids[3])["work_type"] == "Type 3"
+            assert other.get_job("JOB_MISSING") is None
+            with other.transaction():
+                assert other.get_jobs(job_ids[:2])[1]["work_type"] == "Type 1"
+
+        assert read_json.call_count == 0
+
+    def test_stale_index_falls_back_to_full_parse(self, data_store):
+        """Test that a file edited without updating its index is still read correctly"""
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+        with open(data_store.jobs_file, "w") as f:
+            f.write('{"%s": {"job_id": "%s", "work_type": "Edited by hand"}}' % (job_id, job_id))
+
+        assert DataStore(data_dir=data_store.data_dir).get_job(job_id)["work_type"] == "Edited by hand"
+
+    def test_point_read_counts_for_conflicts(self, data_store):
+        """Test that a job decoded on its own still conflicts if changed before the transaction writes it"""
+        job_id = data_store.create_job({"work_type": "Harvesting", "workers_needed": 1})
+        reader = DataStore(data_dir=data_store.data_dir)
+
+        with pytest.raises(ConflictError):
+            with reader.transaction():
+                spots = reader.get_job(job_id)["workers_needed"]
+                data_store.update_job(job_id, {"workers_needed": 0})
+                reader.update_job(job_id, {"workers_needed": spots - 1})
+
+        assert data_store.get_job(job_id)["workers_needed"] == 0
+
+    def test_get_jobs_batches_in_order(self, data_store):
+        """Test that get_jobs returns the requested jobs in order and skips unknown IDs"""
+        job_ids = [data_store.create_job({"work_type": f"Type {i}"}) for i in range(4)]
+        other = DataStore(data_dir=data_store.data_dir)
+
+        jobs = other.get_jobs([job_ids[2], "JOB_MISSING", job_ids[0]])
+
+        assert [job["job_id"] for job in jobs] == [job_ids[2], job_ids[0]]
+
+
+class TestTransactions:
+    """Tests for unit-of-work transactions"""
+
+    def test_commit_writes_each_file_once(self, data_store):
+        """Test that several mutations are flushed with one write per collection"""
+        phone = "whatsapp:+15555551234"
+        data_store.create_user(phone, "farmer")
+
+        with patch.object(data_store, "_write_json", wraps=data_store._write_json) as write_json:
+            with data_store.transaction():
+                data_store.update_user_profile(phone, {"id_verified": True})
+                data_store.update_user(phone, {"registered": True})
+                data_store.set_conversation_state(phone, "farmer_pref_work_type")
+                assert write_json.call_count == 0
+
+        written = [call.args[0] for call in write_json.call_args_list]
+        assert sorted(written) == sorted([data_store.users_file, data_store._record_file("conversations", phone)])
+
+    def test_reads_see_own_writes(self, data_store):
+        """Test that reads inside a transaction see its buffered changes"""
+        phone = "whatsapp:+15555551234"
+        with data_store.transaction():
+            data_store.create_user(phone, "farmer")
+            assert data_store.get_user(phone)["type"] == "farmer"
+            assert DataStore(data_dir=data_store.data_dir).get_user(phone) is None
+
+        assert DataStore(data_dir=data_store.data_dir).get_user(phone) is not None
+
+    def test_rollback_on_exception(self, data_store):
+        """Test that an exception discards all buffered changes"""
+        phone = "whatsapp:+15555551234"
+        data_store.set_conversation_state(phone, "farmer_reg_name")
+
+        with pytest.raises(RuntimeError):
+            with data_store.transaction():
+                data_store.create_user(phone, "farmer")
+                data_store.clear_conversation_state(phone)
+                raise RuntimeError("handler failed")
+
+        assert data_store.get_user(phone) is None
+        assert data_store.get_conversation_state(phone)["state"] == "farmer_reg_name"
+
+    def test_nested_transactions_join_outer(self, data_store):
+        """Test that an inner transaction commits with the outer one"""
+        phone = "whatsapp:+15555551234"
+        with data_store.transaction():
+            with data_store.transaction():
+                data_store.create_user(phone, "farmer")
+            assert data_store.in_transaction
+            assert DataStore(data_dir=data_store.data_dir).get_user(phone) is None
+
+        assert not data_store.in_transaction
+        assert DataStore(data_dir=data_store.data_dir).get_user(phone) is not None
+
+
+def _update_profile_many(data_dir, prefix, count):
+    """Worker for the multi-process test: write count distinct profile keys"""
+    store = DataStore(data_dir=data_dir)
+    for i in range(count):
+        store.update_user_profile("whatsapp:+15555551234", {f"{prefix}_{i}": i})
+
+
+def _accept_job(data_dir, job_id, phone, results):
+    """Worker for the multi-process capacity test: apply to a job and report the outcome"""
+    store = DataStore(data_dir=data_dir)
+    results.put(store.run_in_transaction(store.create_match, job_id, phone, 'accepted', retries=10))
+
+
+def _apply_twice(data_dir, job_id, results):
+    """Worker for the multi-process dedupe test: create the same match twice"""
+    store = DataStore(data_dir=data_dir)
+    for _ in range(2):
+        results.put(store.run_in_transaction(store.create_match, job_id, "whatsapp:+15555550101", retries=10))
+
+
+class TestConcurrency:
+    """Tests for locking and optimistic concurrency"""
+
+    def test_threads_do_not_lose_updates(self, data_store):
+        """Test concurrent read-modify-writes from threads"""
+        phone = "whatsapp:+15555551234"
+        data_store.create_user(phone, "farmer")
+
+        def worker(prefix):
+            for i in range(25):
+                data_store.update_user_profile(phone, {f"{prefix}_{i}": i})
+
+        threads = [threading.Thread(target=worker, args=(f"t{n}",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(data_store.get_user(phone)["profile"]) == 100
+
+    def test_processes_do_not_lose_updates(self, data_store):
+        """Test concurrent read-modify-writes from worker processes"""
+        data_store.create_user("whatsapp:+15555551234", "farmer")
+
+        processes = [
+            multiprocessing.Process(target=_update_profile_many, args=(data_store.data_dir, f"p{n}", 25))
+            for n in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        assert len(data_store.get_user("whatsapp:+15555551234")["profile"]) == 100
+
+    def test_processes_do_not_overbook(self, data_store):
+        """Test that concurrent applications from worker processes never take more spots than the job has"""
+        job_id = data_store.create_job({"work_type": "Harvesting", "workers_needed": 3})
+        results = multiprocessing.Queue()
+
+        processes = [
+            multiprocessing.Process(target=_accept_job,
+                                    args=(data_store.data_dir, job_id, f"whatsapp:+1555555010{n}", results))
+            for n in range(6)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get(timeout=30) for _ in processes]
+        for process in processes:
+            process.join()
+
+        assert sum(match_id is not None for match_id in outcomes) == 3
+        assert len(data_store.get_job_matches(job_id)) == 3
+        job = data_store.get_job(job_id)
+        assert job["workers_needed"] == 0
+        assert job["status"] == "filled"
+
+    def test_processes_do_not_duplicate_matches(self, data_store):
+        """Test that worker processes creating the same (farmer, job) match end up with one"""
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+        results = multiprocessing.Queue()
+
+        processes = [multiprocessing.Process(target=_apply_twice, args=(data_store.data_dir, job_id, results))
+                     for _ in range(8)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get(timeout=30) for _ in range(16)]
+        for process in processes:
+            process.join()
+
+        assert len(set(outcomes)) == 1
+        assert len(data_store.get_job_matches(job_id)) == 1
+
+    def test_generation_counts_writes(self, data_store):
+        """Test that every committed write bumps the file generation"""
+        before = data_store.generation("users")
+        data_store.create_user("whatsapp:+1", "farmer")
+        with data_store.transaction():
+            data_store.create_user("whatsapp:+2", "farmer")
+            data_store.update_user("whatsapp:+1", {"registered": True})
+
+        assert data_store.generation("users") == before + 2
+
+    def test_conflicting_transaction_raises(self, data_store):
+        """Test that a transaction loses if another writer changed its record"""
+        phone = "whatsapp:+15555551234"
+        data_store.create_user(phone, "farmer")
+        other = DataStore(data_dir=data_store.data_dir)
+
+        with pytest.raises(ConflictError):
+            with data_store.transaction():
+                data_store.update_user(phone, {"registered": True})
+                other.update_user_profile(phone, {"name": "Other Worker"})
+
+        assert other.get_user(phone)["registered"] is False
+
+    def test_unrelated_concurrent_write_merges(self, data_store):
+        """Test that writes to different records in the same file both survive"""
+        data_store.create_user("whatsapp:+1", "farmer")
+        data_store.create_user("whatsapp:+2", "farmer")
+        other = DataStore(data_dir=data_store.data_dir)
+
+        with data_store.transaction():
+            data_store.update_user("whatsapp:+1", {"registered": True})
+            other.update_user("whatsapp:+2", {"registered": True})
+
+        assert data_store.get_user("whatsapp:+1")["registered"] is True
+        assert data_store.get_user("whatsapp:+2")["registered"] is True
+
+    def test_run_in_transaction_retries(self, data_store):
+        """Test that run_in_transaction re-runs the function after a conflict"""
+        phone = "whatsapp:+15555551234"
+        data_store.create_user(phone, "farmer")
+        other = DataStore(data_dir=data_store.data_dir)
+        attempts = []
+
+        def register():
+            attempts.append(1)
+            data_store.update_user(phone, {"registered": True})
+            if len(attempts) == 1:
+                other.update_user_profile(phone, {"name": "Raced"})
+            return "done"
+
+        assert data_store.run_in_transaction(register) == "done"
+        assert len(attempts) == 2
+        user = data_store.get_user(phone)
+        assert user["registered"] is True
+        assert user["profile"]["name"] == "Raced"
+
+
+class TestBackendSelection:
+    """Tests for the get_data_store factory"""
+
+    def test_json_is_default(self, temp_data_dir, monkeypatch):
+        """Test that the JSON backend is used when nothing is configured"""
+        monkeypatch.delenv("FARMCONNECT_STORAGE", raising=False)
+        store = get_data_store(temp_data_dir)
+        assert type(store) is DataStore
+
+    def test_backend_from_environment(self, temp_data_dir, monkeypatch):
+        """Test that FARMCONNECT_STORAGE selects the backend"""
+        monkeypatch.setenv("FARMCONNECT_STORAGE", "sqlite")
+        store = get_data_store(temp_data_dir)
+        assert type(store).__name__ == "SQLiteDataStore"
+        store.close()
+
+    def test_log_backend(self, temp_data_dir):
+        """Test that 'log' selects the append-only log backend"""
+        store = get_data_store(temp_data_dir, backend="log")
+        assert type(store).__name__ == "LogDataStore"
+        store.close()
+
+    def test_memory_backend(self, temp_data_dir):
+        """Test that 'memory' selects the in-memory backend"""
+        store = get_data_store(temp_data_dir, backend="memory")
+        assert type(store).__name__ == "MemoryDataStore"
+
+    def test_unknown_backend_raises(self, temp_data_dir):
+        """Test that an unknown backend name is rejected"""
+        with pytest.raises(ValueError):
+            get_data_store(temp_data_dir, backend="csv")
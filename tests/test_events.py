@@ -0,0 +1,217 @@
+"""
+Unit tests for change events
+"""
+import pytest
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import EventLog
+from log_store import LogDataStore
+from memory_store import MemoryDataStore
+from sqlite_store import SQLiteDataStore
+
+
+class TestSubscribers:
+    """Tests for in-process event delivery"""
+
+    def test_mutations_emit_typed_events(self, data_store):
+        """Test that each tracked mutation emits its event with the record"""
+        events = []
+        data_store.subscribe(events.append)
+
+        data_store.create_user("+15551234567", "farmer")
+        data_store.update_user_profile("+15551234567", {"name": "Ana"})
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+        data_store.update_job(job_id, {"status": "filled"})
+        match_id = data_store.create_match(job_id, "+15551234567")
+
+        assert [event["type"] for event in events] == [
+            "user_profile_updated", "job_created", "job_updated", "match_created"]
+        assert events[0]["record"]["profile"]["name"] == "Ana"
+        assert events[1]["key"] == job_id and events[1]["record"]["status"] == "open"
+        assert events[2]["changes"] == {"status": "filled"}
+        assert events[2]["record"]["work_type"] == "Harvesting"
+        assert events[3]["key"] == match_id
+
+    def test_event_type_filter(self, data_store):
+        """Test that a subscriber only receives the types it asked for"""
+        events = []
+        data_store.subscribe(events.append, ["job_created"])
+
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+        data_store.update_job(job_id, {"status": "filled"})
+
+        assert [event["type"] for event in events] == ["job_created"]
+
+        with pytest.raises(ValueError):
+            data_store.subscribe(events.append, ["job_deleted"])
+
+    def test_events_wait_for_commit(self, data_store):
+        """Test that events inside a transaction are delivered only after it commits"""
+        events = []
+        data_store.subscribe(events.append)
+
+        with data_store.transaction():
+            data_store.create_job({"work_type": "Harvesting"})
+            assert events == []
+        assert len(events) == 1
+
+    def test_rolled_back_changes_emit_nothing(self, data_store):
+        """Test that a failed transaction's events are dropped"""
+        events = []
+        data_store.subscribe(events.append)
+
+        with pytest.raises(RuntimeError):
+            with data_store.transaction():
+                data_store.create_job({"work_type": "Harvesting"})
+                raise RuntimeError("boom")
+
+        assert events == []
+        assert list(data_store.event_log.read()) == []
+
+    def test_failing_subscriber_does_not_fail_write(self, data_store):
+        """Test that a subscriber exception doesn't reach the caller or other subscribers"""
+        events = []
+
+        def broken(event):
+            raise KeyError("oops")
+
+        data_store.subscribe(broken)
+        data_store.subscribe(events.append)
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+
+        assert data_store.get_job(job_id) is not None
+        assert len(events) == 1
+
+    def test_unsubscribe(self, data_store):
+        """Test that an unsubscribed callback is no longer called"""
+        events = []
+        data_store.subscribe(events.append)
+        data_store.unsubscribe(events.append)
+
+        data_store.create_job({"work_type": "Harvesting"})
+
+        assert events == []
+
+    @pytest.mark.parametrize("backend", [SQLiteDataStore, LogDataStore])
+    def test_other_backends_emit(self, temp_data_dir, backend):
+        """Test that events come from every backend"""
+        store = backend(temp_data_dir)
+        events = []
+        store.subscribe(events.append)
+
+        with store.transaction():
+            job_id = store.create_job({"work_type": "Harvesting"})
+            store.update_job(job_id, {"status": "filled"})
+
+        assert [event["type"] for event in events] == ["job_created", "job_updated"]
+
+
+class TestEventLog:
+    """Tests for the durable event log"""
+
+    def test_events_are_logged_with_offsets(self, data_store):
+        """Test that committed events are appended and offsets increase"""
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+        data_store.create_match(job_id, "+15551234567")
+
+        entries = list(data_store.event_log.read())
+        assert [event["type"] for _, event in entries] == ["job_created", "match_created"]
+        assert entries[0][0] < entries[1][0] == os.path.getsize(data_store.event_log.path)
+
+        # Reading from an offset resumes after that event
+        assert [event["type"] for _, event in data_store.event_log.read(entries[0][0])] == ["match_created"]
+
+    def test_consumer_resumes_from_saved_offset(self, data_store, temp_data_dir):
+        """Test that a consumer only sees events it hasn't processed"""
+        data_store.create_job({"work_type": "Harvesting"})
+        seen = []
+
+        assert EventLog(temp_data_dir).consume("notifier", seen.append) == 1
+        data_store.create_job({"work_type": "Weeding"})
+
+        # A fresh EventLog (e.g. after a restart) picks up where the consumer left off
+        assert EventLog(temp_data_dir).consume("notifier", seen.append) == 1
+        assert [event["record"]["work_type"] for event in seen] == ["Harvesting", "Weeding"]
+        assert EventLog(temp_data_dir).consume("other", lambda event: None) == 2
+
+    def test_torn_tail_is_not_read(self, temp_data_dir):
+        """Test that a partially written last line waits for the rest"""
+        log = EventLog(temp_data_dir)
+        log.append([{"type": "job_created", "key": "JOB_1"}])
+        with open(log.path, "ab") as f:
+            f.write(b'{"type":"job_upd')
+
+        assert [event["key"] for _, event in log.read()] == ["JOB_1"]
+
+    def test_missing_log_reads_empty(self, temp_data_dir):
+        """Test that reading before any event was written yields nothing"""
+        assert list(EventLog(temp_data_dir).read()) == []
+        assert EventLog(temp_data_dir).load_offset("notifier") == 0
+
+
+def job_events(start, count):
+    """count job_created events with keys JOB_<start>... (40 bytes each in the log)"""
+    return [{"type": "job_created", "key": f"JOB_{i:04d}"} for i in range(start, start + count)]
+
+
+class TestEventLogRetention:
+    """Tests for trimming the event log"""
+
+    def test_trim_drops_processed_events(self, temp_data_dir):
+        """Test that events every consumer has processed are dropped and offsets stay valid"""
+        log = EventLog(temp_data_dir, max_bytes=4000)
+        log.append(job_events(0, 60))
+        seen = []
+        log.consume("notifier", lambda event: seen.append(event["key"]))
+        log.append(job_events(60, 45))
+
+        assert os.path.getsize(log.path) < 4000
+        assert log.consume("notifier", lambda event: seen.append(event["key"])) == 45
+        assert seen == [f"JOB_{i:04d}" for i in range(105)]
+        # A consumer that never ran starts at the oldest event kept
+        assert [event["key"] for _, event in log.read()][0] == "JOB_0060"
+
+    def test_lagging_consumer_does_not_pin_log(self, temp_data_dir):
+        """Test that the log stays bounded when a consumer stops, and the consumer resumes at the oldest event kept"""
+        log = EventLog(temp_data_dir, max_bytes=4000)
+        log.save_offset("stalled", 0)
+        for start in range(0, 1000, 50):
+            log.append(job_events(start, 50))
+
+        assert os.path.getsize(log.path) <= 4000
+        kept = [event["key"] for _, event in log.read(log.load_offset("stalled"))]
+        assert kept[-1] == "JOB_0999"
+        assert kept == [f"JOB_{i:04d}" for i in range(1000 - len(kept), 1000)]
+
+    def test_concurrent_appends_survive_trims(self, temp_data_dir):
+        """Test that no append is lost to a trim replacing the file, and offsets count every event"""
+        logs = [EventLog(temp_data_dir, max_bytes=4000) for _ in range(4)]
+
+        def append(log, thread):
+            for i in range(50):
+                log.append([{"type": "job_created", "key": f"JOB_{thread}_{i:03d}"}])
+
+        threads = [threading.Thread(target=append, args=(log, n)) for n, log in enumerate(logs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = sum(len(f'{{"type":"job_created","key":"JOB_{n}_{i:03d}"}}\n') for n in range(4) for i in range(50))
+        offset, _ = list(EventLog(temp_data_dir).read())[-1]
+        assert offset == expected
+
+    def test_memory_store_keeps_no_log(self, temp_data_dir):
+        """Test that the memory backend, which persists nothing, writes no events.log"""
+        store = MemoryDataStore(temp_data_dir)
+        events = []
+        store.subscribe(events.append)
+        store.create_job({"work_type": "Harvesting"})
+
+        assert len(events) == 1
+        assert not os.path.exists(os.path.join(temp_data_dir, "events.log"))
+
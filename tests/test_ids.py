@@ -0,0 +1,56 @@
+"""
+Unit tests for record ID allocation
+"""
+import pytest
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ids import new_id
+
+
+class TestNewId:
+    """Tests for new_id"""
+
+    def test_format(self):
+        """Test the prefix and fixed length"""
+        job_id = new_id("JOB")
+
+        assert job_id.startswith("JOB_")
+        assert len(job_id) == len("JOB_") + 26
+
+    def test_ids_increase_within_a_millisecond(self):
+        """Test that IDs allocated in the same millisecond are unique and ordered"""
+        with patch("ids.time.time_ns", return_value=1_700_000_000_000_000_000):
+            ids = [new_id("MATCH") for _ in range(1000)]
+
+        assert ids == sorted(ids)
+        assert len(set(ids)) == 1000
+
+    def test_unique_across_threads(self):
+        """Test that concurrent allocation never hands out the same ID"""
+        ids = []
+
+        def allocate():
+            ids.extend(new_id("JOB") for _ in range(500))
+
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(ids)) == 4000
+
+    def test_store_ids_do_not_depend_on_count(self, data_store):
+        """Test that deleting a job can't make the next ID collide"""
+        first = data_store.create_job({"work_type": "Harvesting"})
+        data_store._delete_record("jobs", first)
+        second = data_store.create_job({"work_type": "Planting"})
+        third = data_store.create_job({"work_type": "Irrigation"})
+
+        assert len({first, second, third}) == 3
+        assert data_store.get_job(second)["work_type"] == "Planting"
@@ -0,0 +1,112 @@
+"""
+Unit tests for bulk job ingest
+"""
+import pytest
+import os
+import sys
+import csv
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import ingest, normalize_job, normalize_rows, read_feed
+
+FEED_ROW = {
+    "work_type": "Tomato Harvest",
+    "workers_needed": "5",
+    "payment_type": "Daily",
+    "payment_amount": "$150",
+    "location": "Sacramento, CA",
+    "owner_phone": "whatsapp:+15555550001",
+    "description": "",
+}
+
+
+def write_csv(path, rows):
+    """Write rows to a CSV feed with a header"""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class TestNormalize:
+    """Tests for validating feed rows"""
+
+    def test_row_normalized_to_bot_format(self):
+        """Test that values are typed and the payment type is canonical"""
+        job = normalize_job(FEED_ROW)
+
+        assert job["workers_needed"] == 5
+        assert job["payment_amount"] == 150.0
+        assert job["payment_type"] == "per day"
+        assert job["hours"] == "full-time"
+        assert "description" not in job
+
+    def test_legacy_pay_rate_accepted(self):
+        """Test that feeds with an hourly pay_rate are accepted"""
+        row = {key: value for key, value in FEED_ROW.items() if not key.startswith("payment")}
+        job = normalize_job({**row, "pay_rate": "17.5"})
+
+        assert job["pay_rate"] == 17.5
+        assert job["hours"] == "flexible"
+
+    @pytest.mark.parametrize("changes, reason", [
+        ({"location": " "}, "missing location"),
+        ({"workers_needed": "a few"}, "workers_needed is not a number"),
+        ({"workers_needed": "0"}, "workers_needed must be positive"),
+        ({"payment_type": "weekly"}, "unknown payment_type"),
+        ({"payment_amount": None}, "missing payment_amount or pay_rate"),
+    ])
+    def test_invalid_rows_rejected(self, changes, reason):
+        """Test that invalid rows raise ValueError with the reason"""
+        with pytest.raises(ValueError, match=reason):
+            normalize_job({**FEED_ROW, **changes})
+
+    def test_reserved_fields_ignored(self):
+        """Test that a feed can't choose job IDs or status"""
+        job = normalize_job({**FEED_ROW, "job_id": "JOB_X", "status": "filled"})
+
+        assert "job_id" not in job and "status" not in job
+
+    def test_bad_json_line_reported(self):
+        """Test that unparseable JSONL lines are rejected, not fatal"""
+        results = normalize_rows([(1, json.dumps(FEED_ROW)), (2, "{not json")])
+
+        assert results[0][2] is None
+        assert results[1][1] is None and results[1][2].startswith("invalid JSON")
+
+
+class TestIngest:
+    """Tests for the ingest pipeline"""
+
+    def test_csv_feed(self, data_store, temp_data_dir):
+        """Test that valid CSV rows become open jobs and bad rows are reported by line"""
+        path = os.path.join(temp_data_dir, "feed.csv")
+        write_csv(path, [FEED_ROW, {**FEED_ROW, "workers_needed": "x"}, {**FEED_ROW, "work_type": "Planting"}])
+
+        job_ids, rejected = ingest(data_store, path, workers=1)
+
+        assert [data_store.get_job(job_id)["work_type"] for job_id in job_ids] == ["Tomato Harvest", "Planting"]
+        assert len(data_store.get_open_jobs()) == 2
+        assert rejected == [(3, "workers_needed is not a number: 'x'")]
+
+    def test_jsonl_feed_in_worker_pool(self, data_store, temp_data_dir):
+        """Test that a JSONL feed validated by worker processes keeps feed order"""
+        path = os.path.join(temp_data_dir, "feed.jsonl")
+        with open(path, "w") as f:
+            for i in range(25):
+                f.write(json.dumps({**FEED_ROW, "work_type": f"Type {i}"}) + "\n")
+            f.write("\n")
+
+        job_ids, rejected = ingest(data_store, path, workers=2, batch_size=10, chunk_size=4)
+
+        assert rejected == []
+        assert [job["work_type"] for job in data_store.get_jobs(job_ids)] == [f"Type {i}" for i in range(25)]
+
+    def test_read_feed_line_numbers(self, temp_data_dir):
+        """Test that CSV line numbers count the header"""
+        path = os.path.join(temp_data_dir, "feed.csv")
+        write_csv(path, [FEED_ROW, FEED_ROW])
+
+        assert [line for line, _ in read_feed(path)] == [2, 3]
@@ -0,0 +1,227 @@
+"""
+Unit tests for LogDataStore
+"""
+import pytest
+import os
+import sys
+import json
+import subprocess
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_store import LogDataStore
+
+
+@pytest.fixture
+def log_store(temp_data_dir):
+    """Create a LogDataStore with temporary directory"""
+    store = LogDataStore(data_dir=temp_data_dir)
+    yield store
+    store.close()
+
+
+def read_log(store, collection):
+    """Return the parsed entries of a collection log"""
+    with open(store._log_file(collection)) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestLogAppends:
+    """Tests for the append-only write path"""
+
+    def test_each_mutation_appends_one_entry(self, log_store):
+        """Test that every mutation writes exactly one compact log line"""
+        phone = "whatsapp:+15555551234"
+        log_store.create_user(phone, "farmer")
+        log_store.update_user_profile(phone, {"name": "Test Farmer"})
+        log_store.update_user(phone, {"registered": True})
+
+        entries = read_log(log_store, "users")
+        assert len(entries) == 3
+        assert entries[-1]["record"]["registered"] is True
+        with open(log_store._log_file("users")) as f:
+            assert ", " not in f.readline()
+
+    def test_clear_appends_delete(self, log_store):
+        """Test that clearing conversation state logs a delete"""
+        phone = "whatsapp:+15555551234"
+        log_store.set_conversation_state(phone, "farmer_reg_name")
+        log_store.clear_conversation_state(phone)
+        log_store.clear_conversation_state(phone)  # no-op, nothing logged
+
+        assert [e["op"] for e in read_log(log_store, "conversations")] == ["put", "del"]
+        assert log_store.get_conversation_state(phone) is None
+
+    def test_returned_records_are_copies(self, log_store):
+        """Test that mutating a returned record does not change stored state"""
+        phone = "whatsapp:+15555551234"
+        log_store.create_user(phone, "farmer")
+        log_store.get_user(phone)["registered"] = True
+
+        assert log_store.get_user(phone)["registered"] is False
+
+
+class TestLogTransactions:
+    """Tests for transaction() on the log backend"""
+
+    def test_commit_appends_once(self, log_store):
+        """Test that buffered changes are logged together at commit"""
+        phone = "whatsapp:+15555551234"
+        with log_store.transaction():
+            log_store.create_user(phone, "farmer")
+            log_store.update_user(phone, {"registered": True})
+            assert log_store.get_user(phone)["registered"] is True
+            assert read_log(log_store, "users") == []
+
+        entries = read_log(log_store, "users")
+        assert len(entries) == 1
+        assert entries[0]["record"]["registered"] is True
+
+    def test_rollback(self, log_store):
+        """Test that an exception leaves state and log untouched"""
+        phone = "whatsapp:+15555551234"
+        log_store.set_conversation_state(phone, "farmer_reg_name")
+
+        with pytest.raises(RuntimeError):
+            with log_store.transaction():
+                log_store.clear_conversation_state(phone)
+                raise RuntimeError("handler failed")
+
+        assert log_store.get_conversation_state(phone)["state"] == "farmer_reg_name"
+        assert len(read_log(log_store, "conversations")) == 1
+
+
+class TestLogReplay:
+    """Tests for rebuilding state from the logs"""
+
+    def test_state_rebuilt_on_startup(self, temp_data_dir):
+        """Test that a new instance replays the logs"""
+        store1 = LogDataStore(data_dir=temp_data_dir)
+        job_id = store1.create_job({"work_type": "Harvesting"})
+        store1.update_job(job_id, {"status": "closed"})
+        store1.set_conversation_state("whatsapp:+1", "job_description")
+        store1.clear_conversation_state("whatsapp:+1")
+        store1.close()
+
+        store2 = LogDataStore(data_dir=temp_data_dir)
+        assert store2.get_job(job_id)["status"] == "closed"
+        assert store2.get_open_jobs() == []
+        assert store2.get_conversation_state("whatsapp:+1") is None
+        store2.close()
+
+    def test_match_indexes_rebuilt_on_startup(self, temp_data_dir):
+        """Test that match lookups work after replay and follow later updates"""
+        store1 = LogDataStore(data_dir=temp_data_dir)
+        match_id = store1.create_match("JOB_1", "whatsapp:+1")
+        store1.close()
+
+        store2 = LogDataStore(data_dir=temp_data_dir)
+        assert [m["match_id"] for m in store2.get_farmer_matches("whatsapp:+1")] == [match_id]
+        store2.update_match(match_id, {"job_id": "JOB_2"})
+        assert store2.get_job_matches("JOB_1") == []
+        assert len(store2.get_job_matches("JOB_2")) == 1
+        store2.close()
+
+    def test_data_dir_is_single_process(self, log_store):
+        """Test that a second store can't open a directory that is in use"""
+        with pytest.raises(RuntimeError):
+            LogDataStore(data_dir=log_store.data_dir, compact_interval=None)
+
+    def test_torn_tail_is_dropped(self, temp_data_dir):
+        """Test that a partially written last entry is ignored and truncated"""
+        store1 = LogDataStore(data_dir=temp_data_dir)
+        store1.create_user("whatsapp:+1", "farmer")
+        store1.close()
+        with open(os.path.join(temp_data_dir, "users.log"), "a") as f:
+            f.write('{"op":"put","key":"whatsapp:+2","rec')
+
+        store2 = LogDataStore(data_dir=temp_data_dir)
+        store2.create_user("whatsapp:+3", "farm_owner")
+        store2.close()
+
+        store3 = LogDataStore(data_dir=temp_data_dir)
+        assert store3.get_user("whatsapp:+1") is not None
+        assert store3.get_user("whatsapp:+2") is None
+        assert store3.get_user("whatsapp:+3")["type"] == "farm_owner"
+        store3.close()
+
+
+class TestLogCompaction:
+    """Tests for snapshots and log truncation"""
+
+    def test_compact_writes_snapshot_and_truncates_log(self, log_store):
+        """Test that compaction folds the log into a snapshot"""
+        for i in range(5):
+            log_store.set_conversation_state("whatsapp:+1", f"step_{i}")
+
+        log_store.compact()
+
+        assert os.path.getsize(log_store._log_file("conversations")) == 0
+        with open(log_store._snapshot_file("conversations")) as f:
+            snapshot = json.load(f)
+        assert snapshot["seq"] == 5
+        assert snapshot["records"]["whatsapp:+1"]["state"] == "step_4"
+
+    def test_startup_replays_only_tail(self, temp_data_dir):
+        """Test that restart loads the snapshot plus entries written after it"""
+        store1 = LogDataStore(data_dir=temp_data_dir, compact_interval=None)
+        store1.create_user("whatsapp:+1", "farmer")
+        store1.compact()
+        store1.update_user("whatsapp:+1", {"registered": True})
+        store1.close()
+
+        assert len(read_log(store1, "users")) == 1
+
+        store2 = LogDataStore(data_dir=temp_data_dir, compact_interval=None)
+        assert store2.get_user("whatsapp:+1")["registered"] is True
+        store2.close()
+
+    def test_stale_log_entries_skipped(self, temp_data_dir):
+        """Test recovery when a crash left the log untruncated after a snapshot"""
+        store1 = LogDataStore(data_dir=temp_data_dir, compact_interval=None)
+        store1.set_conversation_state("whatsapp:+1", "farmer_reg_name")
+        store1.clear_conversation_state("whatsapp:+1")
+        store1.close()
+        with open(os.path.join(temp_data_dir, "conversations.snapshot.json"), "w") as f:
+            json.dump({"seq": 1, "records": {"whatsapp:+1": {"state": "farmer_reg_name"}}}, f)
+
+        store2 = LogDataStore(data_dir=temp_data_dir, compact_interval=None)
+        assert store2.get_conversation_state("whatsapp:+1") is None
+        store2.close()
+
+    def test_background_compactor(self, temp_data_dir):
+        """Test that the background thread compacts without explicit calls"""
+        store = LogDataStore(data_dir=temp_data_dir, compact_interval=0.05)
+        store.create_job({"work_type": "Harvesting"})
+
+        snapshot_file = store._snapshot_file("jobs")
+        for _ in range(100):
+            if os.path.exists(snapshot_file):
+                break
+            time.sleep(0.02)
+        store.close()
+
+        assert os.path.exists(snapshot_file)
+
+
+class TestWebhookStartup:
+    """Tests for running the webhook on the log backend"""
+
+    def test_import_opens_no_store(self, temp_data_dir):
+        """Test that importing the webhook leaves the data directory free (the debug reloader imports it twice)"""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = (
+            "import reply_whatsapp\n"
+            "from log_store import LogDataStore\n"
+            "LogDataStore('data').close()\n"
+            "response = reply_whatsapp.app.test_client().post(\n"
+            "    '/reply_whatsapp', data={'From': 'whatsapp:+15555551234', 'Body': 'hi'})\n"
+            "print('Welcome to FarmConnect' in response.get_data(as_text=True))\n"
+        )
+        env = {**os.environ, "FARMCONNECT_STORAGE": "log", "PYTHONPATH": root}
+        result = subprocess.run([sys.executable, "-c", script], cwd=temp_data_dir, env=env,
+                                capture_output=True, text=True, timeout=60)
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip().endswith("True")
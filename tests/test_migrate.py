@@ -0,0 +1,64 @@
+"""
+Unit tests for the backend migration tool
+"""
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrate
+from sqlite_store import SQLiteDataStore
+
+
+@pytest.fixture
+def sqlite_dest(temp_data_dir):
+    """Empty SQLite store in its own subdirectory"""
+    store = SQLiteDataStore(data_dir=os.path.join(temp_data_dir, "sqlite"))
+    yield store
+    store.close()
+
+
+class TestMigrate:
+    """Tests for copying JSON data into SQLite"""
+
+    def test_copies_and_verifies_everything(self, populated_store, sqlite_dest, capsys):
+        """Test that every collection arrives intact and the report says so"""
+        populated_store.create_user("whatsapp:+15555551234", "farmer")
+        populated_store.set_conversation_state("whatsapp:+15555551234", "main_menu")
+        job_id = populated_store.create_job({"work_type": "Pruning", "owner_phone": "whatsapp:+1"})
+        populated_store.create_match(job_id, "whatsapp:+15555551234")
+
+        assert migrate.migrate(populated_store, sqlite_dest, batch_size=2) is True
+
+        assert sqlite_dest.get_job(job_id)["work_type"] == "Pruning"
+        assert len(sqlite_dest.get_open_jobs()) == len(populated_store.get_open_jobs())
+        assert sqlite_dest.get_conversation_state("whatsapp:+15555551234")["state"] == "main_menu"
+        assert "verified" in capsys.readouterr().out
+
+    def test_batches_are_separate_transactions(self, data_store, sqlite_dest):
+        """Test that records are written in batch_size chunks"""
+        for i in range(5):
+            data_store.create_job({"work_type": f"Type {i}"})
+
+        with patch.object(sqlite_dest, "import_records", wraps=sqlite_dest.import_records) as import_records:
+            migrate.copy_collection(data_store, sqlite_dest, "jobs", batch_size=2)
+
+        assert [len(call.args[1]) for call in import_records.call_args_list] == [2, 2, 1]
+
+    def test_source_is_streamed(self, data_store, sqlite_dest):
+        """Test that the JSON source is read record by record, not parsed whole"""
+        data_store.create_job({"work_type": "Harvesting"})
+
+        with patch.object(data_store, "_read_json") as read_json:
+            migrate.copy_collection(data_store, sqlite_dest, "jobs")
+
+        assert read_json.call_count == 0
+
+    def test_mismatch_is_reported(self, data_store, sqlite_dest, capsys):
+        """Test that extra records in the destination fail verification"""
+        sqlite_dest.create_job({"work_type": "Already there"})
+
+        assert migrate.migrate(data_store, sqlite_dest) is False
+        assert "MISMATCH" in capsys.readouterr().out
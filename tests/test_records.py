@@ -0,0 +1,168 @@
+"""
+Unit tests for typed records
+"""
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_store import DataStore
+from log_store import LogDataStore
+from memory_store import MemoryDataStore
+from records import ConversationState, Job, Match, Profile, User
+
+
+class TestCodecs:
+    """Tests for converting records to and from dicts"""
+
+    def test_job_round_trip(self, sample_jobs):
+        """Test that a stored job survives from_dict/to_dict unchanged"""
+        job = Job.from_dict(sample_jobs[0])
+
+        assert job.pay_rate == 18.5
+        assert job.owner_phone == "whatsapp:+15555550001"
+        assert job.to_dict() == sample_jobs[0]
+
+    def test_unknown_fields_kept_in_extra(self):
+        """Test that fields the type doesn't declare are preserved"""
+        job = Job.from_dict({"job_id": "JOB_1", "_ai_score": 87})
+
+        assert job.extra == {"_ai_score": 87}
+        assert job.to_dict() == {"job_id": "JOB_1", "_ai_score": 87}
+        assert Job.from_dict({"job_id": "JOB_1"}).extra is None
+
+    def test_user_profile_is_nested_record(self, sample_farmer_profile):
+        """Test that a user's profile decodes to a Profile"""
+        data = {"phone": "+15551234567", "type": "farmer", "registered": True,
+                "profile": sample_farmer_profile}
+        user = User.from_dict(data)
+
+        assert isinstance(user.profile, Profile)
+        assert user.profile.min_pay_rate == 15.0
+        assert user.to_dict() == data
+
+    def test_missing_fields_are_none(self):
+        """Test that absent fields read as None and are not written back"""
+        match = Match.from_dict({"match_id": "MATCH_1", "status": "pending"})
+
+        assert match.farmer_phone is None
+        assert match.to_dict() == {"match_id": "MATCH_1", "status": "pending"}
+
+    def test_explicit_none_kept(self):
+        """Test that a field stored as None is written back as None"""
+        data = {"match_id": "MATCH_1", "status": None}
+
+        assert Match.from_dict(data).status is None
+        assert Match.from_dict(data).to_dict() == data
+
+    def test_nested_values_not_shared(self):
+        """Test that from_dict and to_dict copy nested dicts, so neither side can change the other"""
+        data = {"state": "viewing_jobs", "data": {"jobs": ["JOB_1"]}}
+        state = ConversationState.from_dict(data)
+        data["data"]["jobs"].append("JOB_2")
+        out = state.to_dict()
+        out["data"]["jobs"].append("JOB_3")
+
+        assert state.data == {"jobs": ["JOB_1"]}
+
+    def test_get_reads_like_the_dict(self):
+        """Test that get() matches get() on to_dict(), extra keys included"""
+        job = Job.from_dict({"job_id": "JOB_1", "status": "open", "_ai_score": 87})
+
+        assert job.get("status") == "open"
+        assert job.get("_ai_score") == 87
+        assert job.get("pay_rate") is None
+        assert job.get("missing", "default") == "default"
+
+    def test_records_are_slotted(self):
+        """Test that records have no per-instance __dict__"""
+        for record in (Job(), Match(), User(), Profile(), ConversationState()):
+            assert not hasattr(record, "__dict__")
+        with pytest.raises(AttributeError):
+            Job().pay = 1
+
+
+class TestTypedStore:
+    """Tests for stores returning typed records"""
+
+    def test_reads_return_records(self, temp_data_dir):
+        """Test that every read returns its collection's record type"""
+        store = DataStore(temp_data_dir, record_types=True)
+        user = store.create_user("+15551234567", "farmer")
+        store.update_user_profile("+15551234567", {"name": "Ana"})
+        job_id = store.create_job({"work_type": "Harvesting", "owner_phone": "+15550000000"})
+        store.create_match(job_id, "+15551234567")
+        store.set_conversation_state("+15551234567", "viewing_jobs", {"current_index": 1})
+
+        assert isinstance(user, User)
+        assert store.get_user("+15551234567").profile.name == "Ana"
+        assert store.get_job(job_id).status == "open"
+        assert [job.job_id for job in store.get_jobs([job_id])] == [job_id]
+        assert isinstance(store.get_open_jobs()[0], Job)
+        assert isinstance(store.get_jobs_by_owner("+15550000000")[0], Job)
+        assert store.get_farmer_matches("+15551234567")[0].job_id == job_id
+        assert isinstance(store.get_job_matches(job_id)[0], Match)
+        assert store.get_conversation_state("+15551234567").data == {"current_index": 1}
+        assert store.get_job("JOB_MISSING") is None
+
+    def test_dicts_by_default(self, data_store):
+        """Test that stores return dicts unless record types are enabled"""
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+
+        assert isinstance(data_store.get_job(job_id), dict)
+
+    def test_typed_conversation_expiry(self, temp_data_dir):
+        """Test that an expired ConversationState is recognised like its dict form"""
+        store = DataStore(temp_data_dir, record_types=True)
+        store.conversation_ttl = 60
+        store._put_record("conversations", "+15551234567", {
+            "state": "viewing_jobs", "data": {}, "updated_at": "2024-06-01T08:00:00"})
+
+        state = store.get_conversation_state("+15551234567", include_expired=True)
+        assert isinstance(state, ConversationState)
+        assert store.conversation_expired(state)
+        assert store.get_conversation_state("+15551234567") is None
+
+
+class TestCachedRecords:
+    """Tests that the stores cache slotted records and hand out dicts"""
+
+    def test_memory_state_holds_records(self, temp_data_dir):
+        """Test that the memory store keeps records and reads copy them out"""
+        store = MemoryDataStore(temp_data_dir)
+        job_id = store.create_job({"work_type": "Harvesting", "owner_phone": "+15550000000"})
+
+        assert isinstance(store._state["jobs"][job_id], Job)
+        job = store.get_job(job_id)
+        job["status"] = "filled"
+        assert store.get_job(job_id)["status"] == "open"
+        assert isinstance(store.get_jobs_by_owner("+15550000000")[0], dict)
+
+    def test_log_state_holds_records(self, temp_data_dir):
+        """Test that the log store replays and snapshots into records"""
+        store = LogDataStore(temp_data_dir)
+        job_id = store.create_job({"work_type": "Harvesting"})
+        store.compact()
+        store.close()
+
+        store = LogDataStore(temp_data_dir)
+        assert isinstance(store._state["jobs"][job_id], Job)
+        assert store.get_job(job_id)["work_type"] == "Harvesting"
+        store.close()
+
+    def test_json_cache_holds_records(self, data_store):
+        """Test that the JSON store caches parsed files as records and reads copy them out"""
+        job_id = data_store.create_job({"work_type": "Harvesting"})
+        data_store.set_conversation_state("+15551234567", "viewing_jobs", {"current_index": 1})
+        data_store.invalidate_cache()
+        data_store.get_open_jobs()
+        data_store.get_conversation_state("+15551234567")
+
+        signature, records = data_store._cache[data_store.jobs_file]
+        assert isinstance(records[job_id], Job)
+        assert all(isinstance(record, ConversationState) for filepath, (_, states) in data_store._cache.items()
+                   if filepath.startswith(data_store.conversations_dir) for record in states.values())
+        state = data_store.get_conversation_state("+15551234567")
+        state["data"]["current_index"] = 5
+        assert data_store.get_conversation_state("+15551234567")["data"] == {"current_index": 1}
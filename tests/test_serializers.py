@@ -0,0 +1,78 @@
+"""
+Unit tests for the storage serialization formats
+"""
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serializers
+from data_store import DataStore
+
+
+RECORDS = {"JOB_1": {"job_id": "JOB_1", "pay_rate": 18.5, "location": "Fresno, CA", "notes": "café"}}
+
+
+def available_formats():
+    """Formats whose optional package is installed"""
+    formats = ["json", "compact"]
+    if serializers.orjson is not None:
+        formats.append("orjson")
+    if serializers.msgpack is not None:
+        formats.append("msgpack")
+    return formats
+
+
+class TestFormats:
+    """Tests for dumps/loads"""
+
+    @pytest.mark.parametrize("fmt", available_formats())
+    def test_round_trip(self, fmt):
+        """Test that every format reads back what it wrote"""
+        assert serializers.loads(serializers.dumps(RECORDS, fmt)) == RECORDS
+
+    def test_compact_is_smaller(self):
+        """Test that compact JSON drops the indentation"""
+        assert len(serializers.dumps(RECORDS, "compact")) < len(serializers.dumps(RECORDS, "json"))
+
+    def test_empty_input_is_empty_collection(self):
+        """Test that an empty file parses as no records"""
+        assert serializers.loads(b"") == {}
+
+    def test_unknown_format_raises(self):
+        """Test that an unknown format name is rejected"""
+        with pytest.raises(ValueError):
+            serializers.dumps(RECORDS, "yaml")
+
+
+class TestDataStoreFormats:
+    """Tests for DataStore with a configured serializer"""
+
+    @pytest.mark.parametrize("fmt", available_formats())
+    def test_store_round_trip(self, temp_data_dir, fmt):
+        """Test that a store in any format persists across instances"""
+        store = DataStore(data_dir=temp_data_dir, serializer=fmt)
+        job_id = store.create_job({"work_type": "Harvesting"})
+
+        assert DataStore(data_dir=temp_data_dir).get_job(job_id)["work_type"] == "Harvesting"
+
+    def test_format_from_environment(self, temp_data_dir, monkeypatch):
+        """Test that FARMCONNECT_FORMAT selects the serializer"""
+        monkeypatch.setenv("FARMCONNECT_FORMAT", "compact")
+        store = DataStore(data_dir=temp_data_dir)
+        store.create_user("whatsapp:+15555551234", "farmer")
+
+        with open(os.path.join(temp_data_dir, "users.json"), "rb") as f:
+            assert b"\n" not in f.read()
+
+    def test_convert_data_dir(self, temp_data_dir):
+        """Test that the converter rewrites existing files and keeps their records"""
+        store = DataStore(data_dir=temp_data_dir)
+        store.create_user("whatsapp:+15555551234", "farmer")
+
+        sizes = serializers.convert_data_dir(temp_data_dir, "compact")
+
+        old, new = sizes[os.path.join(temp_data_dir, "users.json")]
+        assert new < old
+        assert store.get_user("whatsapp:+15555551234")["type"] == "farmer"
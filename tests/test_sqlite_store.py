@@ -0,0 +1,240 @@
+"""
+Unit tests for SQLiteDataStore
+"""
+import pytest
+import os
+import sys
+import json
+import sqlite3
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_store import ConflictError, get_data_store
+from sqlite_store import SQLiteDataStore
+
+
+@pytest.fixture
+def sqlite_store(temp_data_dir):
+    """Create a SQLiteDataStore with temporary directory"""
+    store = SQLiteDataStore(data_dir=temp_data_dir)
+    yield store
+    store.close()
+
+
+class TestSQLiteSetup:
+    """Tests for database creation"""
+
+    def test_uses_wal_journal(self, sqlite_store):
+        """Test that the database runs in WAL mode"""
+        mode = sqlite_store._conn().execute('PRAGMA journal_mode').fetchone()[0]
+        assert mode == 'wal'
+
+    def test_lookup_columns_are_indexed(self, sqlite_store):
+        """Test that the hot lookup columns have indexes"""
+        conn = sqlite3.connect(sqlite_store.db_path)
+        indexed = {
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        }
+        conn.close()
+
+        assert {'idx_jobs_owner_phone', 'idx_jobs_status',
+                'idx_matches_job_id', 'idx_matches_farmer_job'} <= indexed
+
+    def test_farmer_job_index_is_unique(self, sqlite_store):
+        """Test that the database rejects a second match for the same farmer and job"""
+        sqlite_store._put_record('matches', 'MATCH_1', {'job_id': 'JOB_1', 'farmer_phone': '+1'})
+
+        with pytest.raises(sqlite3.IntegrityError):
+            sqlite_store._put_record('matches', 'MATCH_2', {'job_id': 'JOB_1', 'farmer_phone': '+1'})
+
+    def test_duplicates_keep_plain_index(self, temp_data_dir):
+        """Test that a database already holding duplicate matches still opens, without the constraint"""
+        store = SQLiteDataStore(data_dir=temp_data_dir)
+        conn = store._conn()
+        conn.execute('DROP INDEX idx_matches_farmer_job')
+        for match_id in ('MATCH_1', 'MATCH_2'):
+            store._put_record('matches', match_id, {'job_id': 'JOB_1', 'farmer_phone': '+1'})
+        store.close()
+
+        reopened = SQLiteDataStore(data_dir=temp_data_dir)
+        index = {name: unique for _, name, unique, *_ in reopened._conn().execute('PRAGMA index_list(matches)')}
+        reopened.close()
+
+        assert index['idx_matches_farmer_job'] == 0
+
+    def test_factory_selects_sqlite(self, temp_data_dir):
+        """Test that get_data_store returns the SQLite backend"""
+        store = get_data_store(temp_data_dir, backend='sqlite')
+        assert isinstance(store, SQLiteDataStore)
+        store.close()
+
+
+class TestSQLiteOperations:
+    """Tests for CRUD operations against SQLite"""
+
+    def test_user_roundtrip(self, sqlite_store, sample_farmer_profile):
+        """Test creating, updating and reading a user"""
+        phone = "whatsapp:+15555551234"
+        sqlite_store.create_user(phone, "farmer")
+        assert sqlite_store.update_user_profile(phone, sample_farmer_profile) is True
+        sqlite_store.update_user(phone, {"registered": True})
+
+        user = sqlite_store.get_user(phone)
+        assert user["registered"] is True
+        assert user["profile"]["name"] == sample_farmer_profile["name"]
+        assert sqlite_store.update_user_profile("whatsapp:+19999999999", {}) is False
+
+    def test_open_jobs_follow_status(self, sqlite_store, sample_jobs):
+        """Test that closing a job removes it from the open jobs query"""
+        job_ids = [sqlite_store.create_job(job) for job in sample_jobs]
+        sqlite_store.update_job(job_ids[0], {"status": "closed"})
+
+        work_types = [job["work_type"] for job in sqlite_store.get_open_jobs()]
+        assert work_types == ["Planting", "Irrigation", "General Labor"]
+
+    def test_get_jobs_batch(self, sqlite_store):
+        """Test fetching several jobs with one query"""
+        job_ids = [sqlite_store.create_job({"work_type": f"Type {i}"}) for i in range(3)]
+
+        jobs = sqlite_store.get_jobs([job_ids[2], "JOB_MISSING", job_ids[1]])
+        assert [job["work_type"] for job in jobs] == ["Type 2", "Type 1"]
+
+    def test_pages_use_range_scan(self, sqlite_store):
+        """Test that page queries are answered from an index without sorting"""
+        plan = sqlite_store._conn().execute(
+            "EXPLAIN QUERY PLAN " + sqlite_store._page_query("jobs", "status"), ("open", "", "", 6)
+        ).fetchall()
+        details = " ".join(row[-1] for row in plan)
+
+        assert "idx_jobs_status_page" in details
+        assert "TEMP B-TREE" not in details
+
+    def test_page_columns_added_to_old_database(self, temp_data_dir):
+        """Test that a database without the created_at column gets it, filled from the records"""
+        conn = sqlite3.connect(os.path.join(temp_data_dir, "farmconnect.db"))
+        conn.execute("CREATE TABLE jobs (job_id TEXT PRIMARY KEY, owner_phone TEXT, status TEXT, record TEXT NOT NULL)")
+        for job_id, created_at in (("JOB_2_legacy", "2024-01-02T00:00:00"), ("JOB_10_legacy", "2024-01-10T00:00:00")):
+            conn.execute("INSERT INTO jobs VALUES (?, ?, ?, ?)", (job_id, "+1", "open", json.dumps(
+                {"job_id": job_id, "owner_phone": "+1", "status": "open", "created_at": created_at})))
+        conn.commit()
+        conn.close()
+
+        store = SQLiteDataStore(data_dir=temp_data_dir)
+        new_id = store.create_job({"work_type": "Harvesting", "owner_phone": "+1"})
+        page, _ = store.get_jobs_by_owner_page("+1")
+        store.close()
+
+        assert [job["job_id"] for job in page] == ["JOB_2_legacy", "JOB_10_legacy", new_id]
+
+    def test_jobs_by_owner(self, sqlite_store, sample_jobs):
+        """Test looking up jobs by owner phone"""
+        for job in sample_jobs:
+            sqlite_store.create_job(job)
+
+        jobs = sqlite_store.get_jobs_by_owner("whatsapp:+15555550002")
+        assert [job["work_type"] for job in jobs] == ["Irrigation"]
+
+    def test_match_queries(self, sqlite_store):
+        """Test match lookups by farmer and by job"""
+        sqlite_store.create_match("JOB_1", "whatsapp:+15555550101")
+        match_id = sqlite_store.create_match("JOB_2", "whatsapp:+15555550101")
+        sqlite_store.create_match("JOB_2", "whatsapp:+15555550102")
+        sqlite_store.update_match(match_id, {"status": "accepted"})
+
+        assert len(sqlite_store.get_farmer_matches("whatsapp:+15555550101")) == 2
+        job_matches = sqlite_store.get_job_matches("JOB_2")
+        assert [m["status"] for m in job_matches] == ["accepted", "pending"]
+
+    def test_conversation_state(self, sqlite_store):
+        """Test setting and clearing conversation state"""
+        phone = "whatsapp:+15555551234"
+        sqlite_store.set_conversation_state(phone, "farmer_reg_name", {"step": 1})
+        assert sqlite_store.get_conversation_state(phone)["data"] == {"step": 1}
+
+        sqlite_store.clear_conversation_state(phone)
+        assert sqlite_store.get_conversation_state(phone) is None
+
+    def test_data_persists_after_reload(self, temp_data_dir):
+        """Test that data persists across store instances"""
+        store1 = SQLiteDataStore(data_dir=temp_data_dir)
+        store1.create_user("whatsapp:+15555551234", "farm_owner")
+        store1.close()
+
+        store2 = SQLiteDataStore(data_dir=temp_data_dir)
+        assert store2.get_user("whatsapp:+15555551234")["type"] == "farm_owner"
+        store2.close()
+
+
+class TestSQLiteTransactions:
+    """Tests for transaction() on SQLite"""
+
+    def test_commit(self, sqlite_store):
+        """Test that changes become visible to other connections at commit"""
+        phone = "whatsapp:+15555551234"
+        sqlite_store.create_user(phone, "farmer")
+
+        with sqlite_store.transaction():
+            sqlite_store.update_user(phone, {"registered": True})
+            sqlite_store.set_conversation_state(phone, "farmer_pref_work_type")
+            other = SQLiteDataStore(data_dir=os.path.dirname(sqlite_store.db_path))
+            assert other.get_user(phone)["registered"] is False
+            other.close()
+
+        assert sqlite_store.get_user(phone)["registered"] is True
+
+    def test_reads_do_not_take_write_lock(self, sqlite_store):
+        """Test that a transaction that only reads doesn't block writers on other connections"""
+        phone = "whatsapp:+15555551234"
+        sqlite_store.create_user(phone, "farmer")
+
+        with sqlite_store.transaction():
+            sqlite_store.get_user(phone)
+            other = SQLiteDataStore(data_dir=os.path.dirname(sqlite_store.db_path))
+            other._conn().execute("PRAGMA busy_timeout = 0")
+            other.update_user(phone, {"registered": True})
+            other.close()
+
+        assert sqlite_store.get_user(phone)["registered"] is True
+
+    def test_stale_write_conflicts(self, sqlite_store):
+        """Test that writing after another connection committed raises ConflictError, so the message is retried"""
+        phone = "whatsapp:+15555551234"
+        sqlite_store.create_user(phone, "farmer")
+
+        with pytest.raises(ConflictError):
+            with sqlite_store.transaction():
+                sqlite_store.get_user(phone)
+                other = SQLiteDataStore(data_dir=os.path.dirname(sqlite_store.db_path))
+                other.update_user(phone, {"registered": True})
+                other.close()
+                sqlite_store.update_user(phone, {"type": "farm_owner"})
+
+        assert sqlite_store.get_user(phone)["registered"] is True
+        assert sqlite_store.get_user(phone)["type"] == "farmer"
+
+    def test_write_waits_for_lock_holder(self, sqlite_store):
+        """Test that a write waits while another connection holds the write lock, then goes through"""
+        phone = "whatsapp:+15555551234"
+        sqlite_store.create_user(phone, "farmer")
+        holder = sqlite3.connect(sqlite_store.db_path, isolation_level=None, check_same_thread=False)
+        holder.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.1, holder.execute, ["ROLLBACK"]).start()
+
+        with sqlite_store.transaction():
+            sqlite_store.get_user(phone)
+            sqlite_store.update_user(phone, {"registered": True})
+        holder.close()
+
+        assert sqlite_store.get_user(phone)["registered"] is True
+
+    def test_rollback(self, sqlite_store):
+        """Test that an exception rolls everything back"""
+        phone = "whatsapp:+15555551234"
+        with pytest.raises(RuntimeError):
+            with sqlite_store.transaction():
+                sqlite_store.create_user(phone, "farmer")
+                sqlite_store.update_user(phone, {"registered": True})
+                raise RuntimeError("handler failed")
+
+        assert sqlite_store.get_user(phone) is None